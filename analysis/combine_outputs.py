@@ -46,43 +46,29 @@ def _():
 
 @app.cell
 def _(os, pd):
-    from Bio.PDB import PDBParser, PPBuilder
+    from pdb_sequences import extract_sequences, find_accepted_pdbs
 
     def extract_sequences_from_accepted_folders(parent_folder):
         """
         Searches for PDB files directly in 'Accepted' folders within the given parent folder and extracts sequences.
         Ignores subdirectories inside 'Accepted' folders.
-    
+
+        Reads only the SEQRES or CA records of each file, across a process pool, and
+        caches the sequences by path, modification time and size (see pdb_sequences.py),
+        so only new or changed files are parsed.
+
         Args:
             parent_folder (str): The path to the parent folder to search for PDB files.
-        
+
         Returns:
             dict: A dictionary where keys are filenames and values are sequences by chain.
         """
-        parser = PDBParser(QUIET=True)
-        sequences = {}  # Initialize the PDB parser
-        for root, dirs, files in os.walk(parent_folder):
-            if os.path.basename(root) == 'Accepted':
-                for file in files:  # Dictionary to store sequences by file
-                    if file.endswith('.pdb'):
-                        file_path = os.path.join(root, file)
-                        print(f'Processing file: {file_path}')  # Walk through the parent folder and all its subdirectories
-                        try:
-                            structure = parser.get_structure('Protein', file_path)  # Check if the current directory is an 'Accepted' folder
-                            ppb = PPBuilder()
-                            file_sequences = {}
-                            for model in structure:  # Check if the file is a PDB file
-                                for chain in model:
-                                    chain_id = chain.id
-                                    peptides = ppb.build_peptides(chain)
-                                    chain_sequences = [str(peptide.get_sequence()) for peptide in peptides]
-                                    if chain_sequences:  # Parse the PDB structure
-                                        file_sequences[chain_id] = chain_sequences
-                                    else:
-                                        file_sequences[chain_id] = ['No sequence found']  # Use the Polypeptide builder to extract sequences for each chain
-                            sequences[file_path] = file_sequences
-                        except Exception as e:
-                            print(f'Error processing file {file_path}: {e}')
+        sequences = {}
+        for file_path, chains in extract_sequences(find_accepted_pdbs(parent_folder)).items():
+            sequences[file_path] = {
+                chain_id: [sequence] if sequence else ['No sequence found']
+                for chain_id, sequence in chains.items()
+            }
         return sequences
 
     def extract_sequences_to_dataframe(sequences):
@@ -3,143 +3,237 @@ This script processes a CSV file ('combined_data.csv'), generates FASTA files
 for each entry, runs AlphaFold (via Modal) if results don't already exist,
 and then extracts the Interface Predicted Aligned Error (ipae) score from
 the AlphaFold results. Finally, it saves these scores into 'results_ipae.csv'.
+
+All missing designs are predicted in a single Modal app run, in batches
+of BATCH_SIZE designs per container (see modal_alphafold.predict_queue).
+Scores are appended to 'results_ipae.csv' as batches complete, and the job
+states are kept in the results catalog, so an interrupted run resumes.
+Designs with the same target, binder and settings are predicted once and
+share the result; the duplicates are listed in 'duplicate_designs.csv'.
+
+`score_ipae` does the same for any table of designs, e.g. the designs of one
+run folder (see incremental_pipeline.py).
 """
+import asyncio
 import os
-import glob
-import subprocess
 import sys # For sys.exit
+from datetime import datetime
 import pandas as pd
 
-# Ensure the script is run from the 'analysis' directory or adjust paths accordingly
-# Assuming 'combined_data.csv' and 'modal_alphafold.py' are in the same directory
-# or paths are adjusted.
+from results_catalog import (
+    DEFAULT_MSA_MODE, LEGACY_SETTINGS, ResultsCatalog, add_zip_settings, group_jobs,
+    report_duplicate_jobs, settings_key,
+)
+os.environ.setdefault("GPU", "H100") # read by modal_alphafold on import
+import modal_alphafold # pylint: disable=wrong-import-position
+
+# Number of designs predicted per container
+BATCH_SIZE = 8
+# Number of batches predicted at once, and attempts per batch
+MAX_IN_FLIGHT = modal_alphafold.MAX_CONTAINERS
+MAX_ATTEMPTS = 3
+# Prediction settings; designs with the same sequences and settings are predicted once.
+# 1 recycle, as `modal run modal_alphafold.py` ran, keeps the scores comparable with
+# the results of earlier runs
+MODELS = [1]
+NUM_RECYCLES = 1
+# MSA mode, one of results_catalog.MSA_MODES; the paired one of `modal run` by default.
+# "unpaired_target+single_sequence_binders" skips the MSA server for seen targets, but
+# its scores differ, so switching to it predicts all designs again once
+MSA_MODE = DEFAULT_MSA_MODE
+SETTINGS = settings_key(models=MODELS, num_recycles=NUM_RECYCLES, msa_mode=MSA_MODE)
+# Adaptive validation instead: designs are escalated through the stages of
+# modal_alphafold.VALIDATION_STAGES only while their iPAE is borderline
+ADAPTIVE = False
+THRESHOLDS = {
+    "ipae_accept": modal_alphafold.IPAE_ACCEPT,
+    "ipae_reject": modal_alphafold.IPAE_REJECT,
+    "stop_at_score": modal_alphafold.VALIDATION_STOP_AT_SCORE,
+}
+if ADAPTIVE:
+    SETTINGS = settings_key(
+        stages=modal_alphafold.VALIDATION_STAGES, msa_mode=MSA_MODE, **THRESHOLDS
+    )
+VALIDATION_COMPUTE_CSV = "validation_compute.csv"
+
+RESULTS_CSV = "results_ipae.csv"
+
 
-try:
-    combined_df = pd.read_csv("./combined_data.csv")
-except FileNotFoundError:
-    print("Error: 'combined_data.csv' not found. Make sure it's in the correct directory.")
-    sys.exit(1) # Exit if the crucial input file is missing
+def ipae_rows(job_designs, catalogued):
+    """Returns the results_ipae.csv rows of the designs sharing a job."""
+    ipae = catalogued["ipae"] if catalogued else None
+    return [{"Design": name, "ipae_score": ipae} for name, _ in job_designs]
 
 
-def check_existing_result(fasta_file_name_param):
+# pylint: disable=too-many-locals, too-many-statements
+def score_ipae(combined_df, results_csv=RESULTS_CSV, duplicates_csv="duplicate_designs.csv"):
     """
-    Checks if an AlphaFold result file already exists for the given FASTA file name.
+    Predicts the designs of a combined_data.csv table that have no result yet and
+    returns the iPAE score of every design.
 
     Args:
-        fasta_file_name_param (str): The base name of the FASTA file (without .fasta).
+        combined_df (pd.DataFrame): Designs, with Design, Sequence and TargetSequence.
+        results_csv (str, optional): CSV filled with the scores as batches complete.
+        duplicates_csv (str, optional): CSV listing the designs sharing a job.
 
     Returns:
-        bool: True if a result file exists, False otherwise.
+        pd.DataFrame: Design and ipae_score, in the order of `combined_df`.
     """
-    # Adjusted glob pattern to be more specific if results are in a subdir of fasta_file_name
-    pattern = f"./alphafold_results/**/{fasta_file_name_param}.result.zip"
-    existing_files = glob.glob(pattern, recursive=True)
-    return bool(existing_files)
-
-# Define a directory for FASTA files
-FASTA_OUTPUT_DIR = "./fasta_files_for_alphafold"
-os.makedirs(FASTA_OUTPUT_DIR, exist_ok=True)
-
-# Initialize a dictionary to store the results
-results = {}
-# Iterate over each row of the DataFrame
-for _, row in combined_df.iterrows(): # index is not used
-    fasta_file_name = row["Design"]
-    binder_sequence = row["Sequence"]
-    target_seq = row["TargetSequence"]
-    print(f"Processing: {fasta_file_name}")
-
-    # Create the FASTA file content
-    COMBINED_SEQ_STR = f"{target_seq}:{binder_sequence}" # Renamed variable
-    FASTA_CONTENT_STR = f">{fasta_file_name}\n{COMBINED_SEQ_STR}\n" # Renamed variable
-
-    # Write the FASTA file
-    fasta_file_path = os.path.join(FASTA_OUTPUT_DIR, f"{fasta_file_name}.fasta")
-    try:
-        with open(fasta_file_path, "w", encoding='utf-8') as fasta_file:
-            fasta_file.write(FASTA_CONTENT_STR)
-    except IOError as e:
-        print(f"Error writing FASTA file {fasta_file_path}: {e}")
-        continue # Skip to the next design
-
-    # Before running command, check if result exists
-    if check_existing_result(fasta_file_name):
-        print(f"Result for {fasta_file_name} already exists, skipping computation.")
-    else:
-        # Ensure paths are correctly specified for modal run
-        MODAL_SCRIPT_PATH_LOCAL = "./modal_alphafold.py" # Renamed variable
-        ALPHAFOLD_RESULTS_DIR_LOCAL = "./alphafold_results" # Renamed variable
-        # Breaking down the command string for readability
-        COMMAND_RUN_ALPHAFOLD_STR = (
-            f'GPU="H100" modal run {MODAL_SCRIPT_PATH_LOCAL} '
-            f'--input-fasta "{fasta_file_path}" --out-dir "{ALPHAFOLD_RESULTS_DIR_LOCAL}"'
-        )
+    # Rows multiplied by the merge that built combined_data.csv
+    num_rows = len(combined_df)
+    combined_df = combined_df.drop_duplicates(subset=["Design", "TargetSequence", "Sequence"])
+    if len(combined_df) < num_rows:
+        print(f"Dropped {num_rows - len(combined_df)} duplicated rows of combined_data.csv")
+
+    # Catalog of the existing results, indexing zips added since the last run
+    catalog = ResultsCatalog("./alphafold_results")
+    catalog.sync(settings=LEGACY_SETTINGS)
+
+    # Define a directory for FASTA files
+    fasta_output_dir = "./fasta_files_for_alphafold"
+    os.makedirs(fasta_output_dir, exist_ok=True)
+
+    # Write the FASTA files and collect the complex sequence of each design
+    design_sequences = []
+    for _, row in combined_df.iterrows(): # index is not used
+        fasta_file_name = row["Design"]
+        binder_sequence = row["Sequence"]
+        target_seq = row["TargetSequence"]
+        print(f"Processing: {fasta_file_name}")
+
+        # Create the FASTA file content
+        combined_seq = f"{target_seq}:{binder_sequence}"
+        fasta_content = f">{fasta_file_name}\n{combined_seq}\n"
+
+        # Write the FASTA file
+        fasta_file_path = os.path.join(fasta_output_dir, f"{fasta_file_name}.fasta")
         try:
-            subprocess.run(COMMAND_RUN_ALPHAFOLD_STR, shell=True, check=True, text=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error running AlphaFold for {fasta_file_name}: {e}")
-            continue # Skip to the next design if AlphaFold fails
-        except FileNotFoundError:
-            print("Error: 'modal' command not found. Is Modal installed and in PATH?")
-            continue
-
-    # Capture the ipae score from the result
-    result_zip_files = glob.glob(
-        f"./alphafold_results/**/{fasta_file_name}.result.zip", recursive=True
-    )
-    if not result_zip_files:
-        print(f"No result zip file found for {fasta_file_name}. "
-              "Skipping IPAE extraction.")
-        results[fasta_file_name] = None
-        continue
-    result_zip = result_zip_files[0]
-
-    # Command to unzip and filter JSON using jq
-    COMMAND_EXTRACT_IPAE_STR = ( # Renamed variable
-        f'unzip -p "{result_zip}" "*.json" | '
-        f'jq -r \'select(.ipae != null) | .ipae."0"\''
+            with open(fasta_file_path, "w", encoding='utf-8') as fasta_file:
+                fasta_file.write(fasta_content)
+        except IOError as e:
+            print(f"Error writing FASTA file {fasta_file_path}: {e}")
+            continue # Skip to the next design
+        design_sequences.append((fasta_file_name, combined_seq))
+
+    # Predict each unique (target, binder, settings) job once, under its first design
+    jobs = group_jobs(design_sequences, SETTINGS)
+    report_duplicate_jobs(jobs, duplicates_csv)
+
+    # Start the results CSV with the scores that already exist; the predicted
+    # ones are appended as their batches complete
+    fastas_to_predict = []
+    job_of_design = {}
+    known_rows = []
+    for job, job_designs in jobs.items():
+        fasta_file_name, combined_seq = job_designs[0]
+        # Before running command, check if result exists, under any name of the job
+        catalogued = next(
+            filter(None, (catalog.lookup(name, combined_seq, SETTINGS) for name, _ in job_designs)),
+            None,
+        ) or catalog.lookup_sequence(combined_seq, SETTINGS)
+        if catalogued:
+            print(f"Result for {fasta_file_name} already exists, skipping computation.")
+            known_rows += ipae_rows(job_designs, catalogued)
+        else:
+            fastas_to_predict.append((fasta_file_name, f">{fasta_file_name}\n{combined_seq}\n"))
+            job_of_design[fasta_file_name] = job
+    pd.DataFrame(known_rows, columns=["Design", "ipae_score"]).to_csv(results_csv, index=False)
+
+    # Jobs left queued, running or failed by an earlier run are simply queued again
+    previous_states = catalog.job_states()
+    resumed = [
+        job for job in job_of_design.values()
+        if previous_states.get(job, {}).get("state") in ("queued", "running", "failed")
+    ]
+    if resumed:
+        num_failed = sum(previous_states[job]["state"] == "failed" for job in resumed)
+        print(f"Resuming {len(resumed)} unfinished jobs of an earlier run ({num_failed} had failed)")
+    for fasta_file_name, job in job_of_design.items():
+        catalog.set_job_state(job, fasta_file_name, "queued")
+
+    alphafold_results_dir = os.path.join(
+        "./alphafold_results", datetime.now().strftime("%Y%m%d%H%M")[2:]
     )
 
-    IPAE_SCORE_VAL = None # Renamed variable
-    try:
-        process_result = subprocess.run(
-            COMMAND_EXTRACT_IPAE_STR,
-            shell=True, # shell=True is needed here because of the pipe |
-            text=True,
-            capture_output=True,
-            check=False
+    def on_state(fasta_file_name, state, error):
+        """Persists the state of a job, so that a rerun resumes it."""
+        catalog.set_job_state(job_of_design[fasta_file_name], fasta_file_name, state, error)
+        if state == "failed":
+            print(f"Error running AlphaFold for {fasta_file_name}: {error}")
+
+    def on_result(fasta_file_name, zip_content, scores):
+        """Stores a result zip and appends the scores of its designs to the results CSV."""
+        if scores is not None and "validation" in scores:
+            pd.DataFrame([{"Design": fasta_file_name, **scores["validation"]}]).to_csv(
+                VALIDATION_COMPUTE_CSV,
+                mode="a",
+                header=not os.path.exists(VALIDATION_COMPUTE_CSV),
+                index=False,
+            )
+        result_zip_path = os.path.join(alphafold_results_dir, f"{fasta_file_name}.result.zip")
+        with open(result_zip_path, "wb") as zip_file:
+            zip_file.write(add_zip_settings(zip_content, fasta_file_name, SETTINGS))
+        job_designs = jobs[job_of_design[fasta_file_name]]
+        catalog.add(fasta_file_name, result_zip_path, job_designs[0][1], SETTINGS)
+        rows = ipae_rows(job_designs, catalog.lookup(fasta_file_name, job_designs[0][1], SETTINGS))
+        pd.DataFrame(rows).to_csv(results_csv, mode="a", header=False, index=False)
+        print(f"Extracted IPAE score for {fasta_file_name}: {rows[0]['ipae_score']}")
+
+    # Predict all missing designs in one Modal app run, BATCH_SIZE designs per call
+    # and at most MAX_IN_FLIGHT calls at once, retrying failed calls
+    if fastas_to_predict:
+        print(f"Running AlphaFold for {len(fastas_to_predict)} designs...")
+        os.makedirs(alphafold_results_dir, exist_ok=True)
+        asyncio.run(
+            modal_alphafold.predict_queue(
+                fastas_to_predict,
+                on_result,
+                on_state,
+                batch_size=BATCH_SIZE,
+                max_in_flight=MAX_IN_FLIGHT,
+                max_attempts=MAX_ATTEMPTS,
+                models=MODELS,
+                num_recycles=NUM_RECYCLES,
+                stages=modal_alphafold.VALIDATION_STAGES if ADAPTIVE else None,
+                thresholds=THRESHOLDS,
+                msa_mode=MSA_MODE,
+            )
         )
-        if process_result.returncode == 0:
-            output = process_result.stdout.strip()
-            if output:
-                try:
-                    IPAE_SCORE_VAL = float(output)
-                    print(f"Extracted IPAE score for {fasta_file_name}: {IPAE_SCORE_VAL}")
-                except ValueError:
-                    print(f"Could not convert IPAE score to float for "
-                          f"{fasta_file_name}: '{output}'")
-            else:
-                print(f"No IPAE score found in JSON for {fasta_file_name} "
-                      "(jq output was empty).")
-        elif process_result.returncode == 4:
-            print(f"No IPAE score found (jq code 4) for {fasta_file_name}.")
-        else:
-            print(f"Error extracting IPAE for {fasta_file_name} "
-                  f"(return code {process_result.returncode}): "
-                  f"{process_result.stderr.strip()}")
 
-    except subprocess.CalledProcessError as e:
-        print(f"Subprocess error during IPAE extraction for {fasta_file_name}: {e}")
+    # Read the iPAE score of each design from the catalog, fanning the result of
+    # each job out to all designs sharing it
+    results = {}
+    for fasta_file_name, combined_seq in design_sequences:
+        catalogued = catalog.lookup(fasta_file_name, combined_seq, SETTINGS) \
+            or catalog.lookup_sequence(combined_seq, SETTINGS)
+        if catalogued is None:
+            print(f"No result zip file found for {fasta_file_name}. "
+                  "Skipping IPAE extraction.")
+            results[fasta_file_name] = None
+            continue
+        results[fasta_file_name] = catalogued["ipae"]
+
+    # Rewrite the results CSV complete and in the order of combined_df
+    results_df = pd.DataFrame(list(results.items()), columns=["Design", "ipae_score"])
+    results_df.to_csv(results_csv, index=False)
+    return results_df
+
+
+def main():
+    """Scores the designs of combined_data.csv into results_ipae.csv."""
+    # Ensure the script is run from the 'analysis' directory or adjust paths accordingly
+    # Assuming 'combined_data.csv' and 'modal_alphafold.py' are in the same directory
+    # or paths are adjusted.
+    try:
+        combined_df = pd.read_csv("./combined_data.csv")
     except FileNotFoundError:
-        print("Error: 'unzip' or 'jq' command not found. "
-              "Please ensure they are installed and in PATH.")
-    except Exception as e: # Catch any other unexpected error during this block
-        print(f"An unexpected error occurred during IPAE extraction for "
-              f"{fasta_file_name}: {type(e).__name__} - {e}")
-
-    results[fasta_file_name] = IPAE_SCORE_VAL
-
-print("Final IPAE results:", results)
-results_df = pd.DataFrame(list(results.items()), columns=["Design", "ipae_score"])
-results_df.to_csv("results_ipae.csv", index=False)
-print(results_df)
+        print("Error: 'combined_data.csv' not found. Make sure it's in the correct directory.")
+        sys.exit(1) # Exit if the crucial input file is missing
+
+    results_df = score_ipae(combined_df)
+    print("Final IPAE results:", dict(zip(results_df["Design"], results_df["ipae_score"])))
+    print(results_df)
+
+
+if __name__ == "__main__":
+    main()
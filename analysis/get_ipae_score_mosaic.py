@@ -10,16 +10,27 @@ Key differences from BindCraft pipeline:
 - Design names include loss values: >design{idx}_{loss_value}
 """
 import os
-import glob
-import subprocess
+import importlib.util
 import sys
 import pandas as pd
 import argparse
+from datetime import datetime
 from pathlib import Path
 
+from results_catalog import (
+    DEFAULT_MSA_MODE, LEGACY_SETTINGS, MSA_MODES, ResultsCatalog, add_zip_settings,
+    group_jobs, report_duplicate_jobs, settings_key,
+)
+
 # Target sequence from modal_mosaic.py (line 34)
 DEFAULT_TARGET_SEQUENCE = "MICYNQQSSQPPTTKTCSETSCYKKTWRDHRGTIIERGCGCPKVKPGIKLHCCRTDKCNN"
 
+# Prediction settings; designs with the same sequences and settings are predicted once.
+# 1 recycle, as `modal run modal_alphafold.py` ran, keeps the scores comparable with
+# the results of earlier runs
+MODELS = [1]
+NUM_RECYCLES = 1
+
 
 def parse_designs_txt(designs_file_path, target_sequence):
     """
@@ -73,70 +84,22 @@ def parse_designs_txt(designs_file_path, target_sequence):
     return pd.DataFrame(designs)
 
 
-def check_existing_result(fasta_file_name_param, alphafold_results_dir):
+def load_modal_alphafold(modal_script, gpu):
     """
-    Checks if an AlphaFold result file already exists for the given FASTA file name.
+    Imports modal_alphafold.py from its path, with the GPU type it reads on import.
 
     Args:
-        fasta_file_name_param (str): The base name of the FASTA file (without .fasta).
-        alphafold_results_dir (str): Directory where AlphaFold results are stored.
+        modal_script (str): Path to modal_alphafold.py
+        gpu (str): GPU type for Modal
 
     Returns:
-        bool: True if a result file exists, False otherwise.
-    """
-    pattern = f"{alphafold_results_dir}/**/{fasta_file_name_param}.result.zip"
-    existing_files = glob.glob(pattern, recursive=True)
-    return bool(existing_files)
-
-
-def extract_ipae_score(result_zip, fasta_file_name):
+        module: The imported modal_alphafold module
     """
-    Extracts iPAE score from AlphaFold result ZIP file.
-
-    Args:
-        result_zip (str): Path to the result ZIP file
-        fasta_file_name (str): Name of the design for logging
-
-    Returns:
-        float or None: iPAE score if found, None otherwise
-    """
-    command_extract_ipae = (
-        f'unzip -p "{result_zip}" "*.json" | '
-        f'jq -r \'select(.ipae != null) | .ipae."0"\''
-    )
-
-    ipae_score = None
-    try:
-        process_result = subprocess.run(
-            command_extract_ipae,
-            shell=True,
-            text=True,
-            capture_output=True,
-            check=False
-        )
-        if process_result.returncode == 0:
-            output = process_result.stdout.strip()
-            if output:
-                try:
-                    ipae_score = float(output)
-                    print(f"Extracted iPAE score for {fasta_file_name}: {ipae_score}")
-                except ValueError:
-                    print(f"Could not convert iPAE score to float for "
-                          f"{fasta_file_name}: '{output}'")
-            else:
-                print(f"No iPAE score found in JSON for {fasta_file_name} "
-                      "(jq output was empty).")
-        elif process_result.returncode == 4:
-            print(f"No iPAE score found (jq code 4) for {fasta_file_name}.")
-        else:
-            print(f"Error extracting iPAE for {fasta_file_name} "
-                  f"(return code {process_result.returncode}): "
-                  f"{process_result.stderr.strip()}")
-    except Exception as e:
-        print(f"An unexpected error occurred during iPAE extraction for "
-              f"{fasta_file_name}: {type(e).__name__} - {e}")
-
-    return ipae_score
+    os.environ["GPU"] = gpu
+    spec = importlib.util.spec_from_file_location("modal_alphafold", modal_script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
 
 
 def main():
@@ -185,6 +148,25 @@ def main():
         default='H100',
         help='GPU type for Modal (default: H100)'
     )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=8,
+        help='Number of designs predicted per Modal container (default: 8)'
+    )
+    parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        help='Validate adaptively: start with the cheapest model and recycles and escalate '
+             'only designs with a borderline iPAE (see modal_alphafold.VALIDATION_STAGES)'
+    )
+    parser.add_argument(
+        '--msa-mode',
+        choices=MSA_MODES,
+        default=DEFAULT_MSA_MODE,
+        help='MSA mode of the predictions; results of another mode are not reused, so '
+             'switching it predicts all designs again (default: %(default)s)'
+    )
     parser.add_argument(
         '--skip-alphafold',
         action='store_true',
@@ -211,10 +193,25 @@ def main():
     # Create FASTA output directory
     os.makedirs(args.fasta_dir, exist_ok=True)
 
-    # Initialize results dictionary
-    results = {}
+    # Catalog of the existing results, indexing zips added since the last run
+    catalog = ResultsCatalog(args.alphafold_results_dir)
+    catalog.sync(settings=LEGACY_SETTINGS)
+
+    modal_alphafold, stages = None, None
+    settings = settings_key(models=MODELS, num_recycles=NUM_RECYCLES, msa_mode=args.msa_mode)
+    if args.adaptive:
+        modal_alphafold = load_modal_alphafold(args.modal_script, args.gpu)
+        stages = modal_alphafold.VALIDATION_STAGES
+        settings = settings_key(
+            stages=stages,
+            ipae_accept=modal_alphafold.IPAE_ACCEPT,
+            ipae_reject=modal_alphafold.IPAE_REJECT,
+            stop_at_score=modal_alphafold.VALIDATION_STOP_AT_SCORE,
+            msa_mode=args.msa_mode,
+        )
 
-    # Process each design
+    # Write the FASTA files and collect the complex sequence of each design
+    design_sequences = []
     for _, row in designs_df.iterrows():
         design_name = row["Design"]
         binder_sequence = row["Sequence"]
@@ -235,39 +232,65 @@ def main():
         except IOError as e:
             print(f"Error writing FASTA file {fasta_file_path}: {e}")
             continue
-
-        # Check if result already exists
-        if check_existing_result(design_name, args.alphafold_results_dir):
+        design_sequences.append((design_name, combined_seq))
+
+    # Predict each unique (target, binder, settings) job once, under its first design
+    jobs = group_jobs(design_sequences, settings)
+    report_duplicate_jobs(jobs)
+
+    fastas_to_predict = []
+    for job_designs in jobs.values():
+        design_name, combined_seq = job_designs[0]
+        # Check if result already exists, under any name of the job
+        if any(catalog.lookup(name, combined_seq, settings) for name, _ in job_designs) \
+                or catalog.lookup_sequence(combined_seq, settings):
             print(f"Result for {design_name} already exists, skipping AlphaFold run.")
         elif not args.skip_alphafold:
-            # Run AlphaFold via Modal
-            command_run_alphafold = (
-                f'GPU="{args.gpu}" modal run {args.modal_script} '
-                f'--input-fasta "{fasta_file_path}" --out-dir "{args.alphafold_results_dir}"'
-            )
-            try:
-                print(f"Running AlphaFold for {design_name}...")
-                subprocess.run(command_run_alphafold, shell=True, check=True, text=True)
-            except subprocess.CalledProcessError as e:
-                print(f"Error running AlphaFold for {design_name}: {e}")
-                continue
-            except FileNotFoundError:
-                print("Error: 'modal' command not found. Is Modal installed and in PATH?")
-                continue
-
-        # Extract iPAE score
-        result_zip_files = glob.glob(
-            f"{args.alphafold_results_dir}/**/{design_name}.result.zip",
-            recursive=True
+            fastas_to_predict.append((design_name, f">{design_name}\n{combined_seq}\n"))
+
+    # Run AlphaFold via Modal for all missing designs in one app run
+    if fastas_to_predict:
+        print(f"\nRunning AlphaFold for {len(fastas_to_predict)} designs...")
+        if modal_alphafold is None:
+            modal_alphafold = load_modal_alphafold(args.modal_script, args.gpu)
+        run_dir = os.path.join(
+            args.alphafold_results_dir, datetime.now().strftime("%Y%m%d%H%M")[2:]
+        )
+        os.makedirs(run_dir, exist_ok=True)
+        predictions = modal_alphafold.predict_batch(
+            fastas_to_predict,
+            batch_size=args.batch_size,
+            models=MODELS,
+            num_recycles=NUM_RECYCLES,
+            stages=stages,
+            msa_mode=args.msa_mode,
         )
-        if not result_zip_files:
+        combined_seqs = {name: fasta.splitlines()[1] for name, fasta in fastas_to_predict}
+        for design_name, (zip_content, scores) in predictions.items():
+            if zip_content is None:
+                print(f"Error running AlphaFold for {design_name}")
+                continue
+            result_zip_path = os.path.join(run_dir, f"{design_name}.result.zip")
+            with open(result_zip_path, "wb") as zip_file:
+                zip_file.write(add_zip_settings(zip_content, design_name, settings))
+            catalog.add(design_name, result_zip_path, combined_seqs[design_name], settings)
+            if scores is not None and "validation" in scores:
+                print(f"Compute used for {design_name}: {scores['validation']}")
+
+    # Look up the iPAE scores in the catalog, fanning the result of each job
+    # out to all designs sharing it
+    results = {}
+    for _, row in designs_df.iterrows():
+        design_name = row['Design']
+        combined_seq = f"{row['TargetSequence']}:{row['Sequence']}"
+        catalogued = catalog.lookup(design_name, combined_seq, settings) \
+            or catalog.lookup_sequence(combined_seq, settings)
+        if catalogued is None:
             print(f"No result zip file found for {design_name}. Skipping iPAE extraction.")
-            results[design_name] = {'ipae_score': None, 'loss_value': loss_value}
-            continue
-
-        result_zip = result_zip_files[0]
-        ipae_score = extract_ipae_score(result_zip, design_name)
-        results[design_name] = {'ipae_score': ipae_score, 'loss_value': loss_value}
+        results[design_name] = {
+            'ipae_score': catalogued['ipae'] if catalogued else None,
+            'loss_value': row.get('LossValue', None)
+        }
 
     # Create results DataFrame
     results_data = [
@@ -0,0 +1,238 @@
+"""
+Incremental ingestion of BindCraft run folders.
+
+Each stage takes a list of run folders and writes one parquet partial per folder
+to PARTIALS_DIR/<stage>/<folder>.parquet. A folder whose partial is newer than its
+inputs is skipped, so a new run folder costs parsing and scoring its own designs
+only. The partials of all folders are then merged into the global tables the
+analysis reads, 'combined_data.csv' and 'results_ipae.csv'; every local run
+folder gets its partials first, so the merged tables cover the whole tree.
+
+Stages:
+- combined: final_design_stats.csv joined on Sequence with the sequences of the
+  Accepted/*.pdb files, as combine_outputs.py does for the whole tree
+- ipae: the iPAE score of each design, with one get_ipae_score.score_ipae call
+  for all pending folders; a partial with unscored designs is retried
+
+Usage:
+    python incremental_pipeline.py 2502152323 2503011200
+    python incremental_pipeline.py --all --force
+"""
+import argparse
+import glob
+import os
+
+import pandas as pd
+
+import pdb_sequences
+
+BASE_PATH = './../out/bindcraft/snake-venom-binder'
+PARTIALS_DIR = "./partials"
+COMBINED_CSV = "combined_data.csv"
+RESULTS_IPAE_CSV = "results_ipae.csv"
+STAGES = ("combined", "ipae")
+
+
+def partial_path(stage, folder):
+    """
+    Returns the path of the parquet partial of a stage for a run folder.
+    """
+    return os.path.join(PARTIALS_DIR, stage, f"{folder}.parquet")
+
+
+def stage_input_path(stage, folder, base_path=BASE_PATH):
+    """
+    Returns the path of the input whose changes invalidate a stage's partial.
+    """
+    if stage == "combined":
+        return os.path.join(base_path, folder, 'final_design_stats.csv')
+    return partial_path("combined", folder)
+
+
+def is_up_to_date(stage, folder, base_path=BASE_PATH):
+    """
+    Checks whether a folder has a partial of a stage newer than the stage's input.
+    """
+    output_path = partial_path(stage, folder)
+    input_path = stage_input_path(stage, folder, base_path)
+    if not os.path.exists(output_path) or (
+        os.path.exists(input_path) and os.path.getmtime(output_path) < os.path.getmtime(input_path)
+    ):
+        return False
+    # designs whose prediction failed or was interrupted are scored again
+    return stage != "ipae" or pd.read_parquet(output_path)["ipae_score"].notna().all()
+
+
+def local_folders(base_path=BASE_PATH):
+    """
+    Returns the names of the run folders under `base_path`.
+    """
+    if not os.path.isdir(base_path):
+        return []
+    return sorted(f for f in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, f)))
+
+
+def extract_accepted_sequences(folder_path):
+    """
+    Extracts the target (chain A) and binder (chain B) sequences of the PDB files
+    directly in the 'Accepted' folders of a run folder.
+
+    Returns:
+        pd.DataFrame: DesignModel, TargetSequence and Sequence of each PDB file.
+    """
+    sequences = pdb_sequences.extract_sequences(pdb_sequences.find_accepted_pdbs(folder_path))
+    data = [
+        [os.path.splitext(os.path.basename(file_path))[0], chains.get('A'), chains.get('B')]
+        for file_path, chains in sequences.items()
+    ]
+    return pd.DataFrame(data, columns=['DesignModel', 'TargetSequence', 'Sequence'])
+
+
+def combine_folder(folder, base_path=BASE_PATH):
+    """
+    Builds the combined_data.csv rows of one run folder.
+
+    Returns:
+        pd.DataFrame or None: The rows, None if the folder has no final_design_stats.csv yet.
+    """
+    csv_path = os.path.join(base_path, folder, 'final_design_stats.csv')
+    if not os.path.exists(csv_path):
+        print(f"No final_design_stats.csv in {folder}, skipping it.")
+        return None
+
+    final_design_stats_df = pd.read_csv(csv_path)
+    final_design_stats_df['Folder'] = folder
+    accepted_df = extract_accepted_sequences(os.path.join(base_path, folder))
+    combined_df = pd.merge(final_design_stats_df, accepted_df, on='Sequence')
+    combined_df['TargetSequenceLength'] = combined_df['TargetSequence'].apply(len)
+    return combined_df
+
+
+def score_folders(folders):
+    """
+    Scores the designs of run folders from their combined partials, with a single
+    `score_ipae` call, so the results catalog is synced and Modal started once.
+
+    Returns:
+        dict: Folder name to the Design and ipae_score of each of its designs.
+    """
+    import get_ipae_score # pylint: disable=import-outside-toplevel
+
+    combined_dfs = {folder: pd.read_parquet(partial_path("combined", folder)) for folder in folders}
+    progress_csv = os.path.join(PARTIALS_DIR, "ipae", "progress.csv")
+    results_df = get_ipae_score.score_ipae(
+        pd.concat(combined_dfs.values(), ignore_index=True),
+        results_csv=progress_csv,
+        duplicates_csv=os.path.join(PARTIALS_DIR, "ipae", "duplicates.csv"),
+    )
+    os.remove(progress_csv)
+
+    scores = dict(zip(results_df["Design"], results_df["ipae_score"]))
+    folder_results = {}
+    for folder, combined_df in combined_dfs.items():
+        designs = combined_df["Design"].drop_duplicates()
+        folder_results[folder] = pd.DataFrame(
+            {"Design": designs, "ipae_score": designs.map(scores)}
+        ).reset_index(drop=True)
+    return folder_results
+
+
+def run_stage(stage, folders, base_path=BASE_PATH, forced=()):
+    """
+    Runs a stage for the folders whose partial is missing or outdated.
+
+    Args:
+        stage (str): One of STAGES.
+        folders (Iterable[str]): Run folder names under `base_path`.
+        base_path (str, optional): Directory with the run folders.
+        forced (Iterable[str], optional): Folders to reprocess even if up to date.
+
+    Returns:
+        list[str]: The folders the stage wrote a partial for.
+    """
+    os.makedirs(os.path.join(PARTIALS_DIR, stage), exist_ok=True)
+    forced = set(forced)
+    pending = [
+        folder for folder in folders
+        if folder in forced or not is_up_to_date(stage, folder, base_path)
+    ]
+    if stage == "combined":
+        partials = {folder: combine_folder(folder, base_path) for folder in pending}
+    else:
+        scorable = [
+            folder for folder in pending if os.path.exists(partial_path("combined", folder))
+        ]
+        partials = score_folders(scorable) if scorable else {}
+
+    processed = []
+    for folder, partial_df in partials.items():
+        if partial_df is None:
+            continue
+
+        # write then rename, so an interrupted stage leaves no partial behind
+        output_path = partial_path(stage, folder)
+        partial_df.to_parquet(f"{output_path}.tmp", index=False)
+        os.replace(f"{output_path}.tmp", output_path)
+        processed.append(folder)
+        print(f"{stage}: {len(partial_df)} rows for {folder}")
+    return processed
+
+
+def merge_partials(stage, output_csv):
+    """
+    Merges the partials of all folders of a stage into its global table.
+
+    Returns:
+        pd.DataFrame: The merged table, as written to `output_csv`.
+    """
+    partial_paths = sorted(glob.glob(os.path.join(PARTIALS_DIR, stage, "*.parquet")))
+    if not partial_paths:
+        return pd.DataFrame()
+    merged_df = pd.concat([pd.read_parquet(path) for path in partial_paths], ignore_index=True)
+    merged_df.to_csv(output_csv, index=False)
+    print(f"Merged {len(partial_paths)} {stage} partials into {output_csv} ({len(merged_df)} rows)")
+    return merged_df
+
+
+def ingest_folders(folders, base_path=BASE_PATH, force=False):
+    """
+    Runs all stages for the given run folders, then rebuilds the global tables.
+
+    The stages also run for the other local run folders whose partials are missing
+    or outdated, as the global tables are merged from the partials and would
+    otherwise leave out the folders processed before the partials existed.
+
+    Args:
+        folders (Iterable[str]): Run folder names under `base_path`.
+        base_path (str, optional): Directory with the run folders.
+        force (bool, optional): Reprocess the given folders even if their partials
+            are up to date.
+    """
+    folders = list(folders)
+    all_folders = sorted(set(folders) | set(local_folders(base_path)))
+    for stage in STAGES:
+        run_stage(stage, all_folders, base_path, forced=folders if force else ())
+    merge_partials("combined", COMBINED_CSV)
+    merge_partials("ipae", RESULTS_IPAE_CSV)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Process BindCraft run folders incrementally into the global results tables'
+    )
+    parser.add_argument('folders', nargs='*', help='Run folder names to process')
+    parser.add_argument('--all', action='store_true', help='Process all folders of --base-path')
+    parser.add_argument('--force', action='store_true',
+                        help='Reprocess the folders even if their partials are up to date')
+    parser.add_argument('--base-path', default=BASE_PATH,
+                        help=f'Directory with the run folders (default: {BASE_PATH})')
+    args = parser.parse_args()
+
+    folders = args.folders
+    if args.all:
+        folders = local_folders(args.base_path)
+    ingest_folders(folders, args.base_path, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Reads the binding scores of AlphaFold result zips into a DataFrame.
+
+modal_alphafold.py stores the `score_af2m_binding` scores of each multimer
+prediction as a '*.af2m_scores.json' member of its '.result.zip'. This module
+reads only that member of each zip, in-process and across a thread pool, and
+returns one row per design with all score fields:
+- plddt_target, pae_target
+- plddt_binder_{n}, pae_binder_{n}, ipae_{n} for each binder n
+- ipsae_{n}, n_contacts_{n}, ipae_contacts_{n}, pdockq_{n} for each binder n, if scored
+- ipae_binder_{n}: per-residue interface PAE of binder n, as a list, only for older
+  zips; newer zips store it in '*.af2m_residues.npz', see `read_af2m_residues`
+
+Usage:
+    python ipae_scorer.py ./alphafold_results results_af2m_scores.csv
+"""
+import argparse
+import glob
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import pdb_sequences
+
+try:
+    import orjson as json_reader # type: ignore
+except ImportError:
+    import json as json_reader
+
+
+def find_result_zips(results_dir, names=None):
+    """
+    Finds the result zip of each design under a results directory.
+
+    Args:
+        results_dir (str): Directory searched recursively for '*.result.zip' files.
+        names (Iterable[str], optional): Only return these designs.
+
+    Returns:
+        dict: Design name to the path of its result zip; the first match wins.
+    """
+    result_zips = {}
+    for result_zip in sorted(glob.glob(f"{results_dir}/**/*.result.zip", recursive=True)):
+        name = os.path.basename(result_zip)[:-len(".result.zip")]
+        result_zips.setdefault(name, result_zip)
+    if names is not None:
+        result_zips = {name: result_zips[name] for name in names if name in result_zips}
+    return result_zips
+
+
+def read_af2m_scores(result_zip):
+    """
+    Reads the af2m scores member of a result zip, without extracting other members.
+
+    Args:
+        result_zip (str): Path to the result zip.
+
+    Returns:
+        dict or None: The `score_af2m_binding` scores, None if the zip has none.
+    """
+    with zipfile.ZipFile(result_zip) as zip_ref:
+        for member in zip_ref.namelist():
+            if member.endswith(".af2m_scores.json"):
+                return json_reader.loads(zip_ref.read(member))
+    return None
+
+
+def read_af2m_residues(result_zip):
+    """
+    Reads the per-residue interface PAE of each binder of a result zip.
+
+    Args:
+        result_zip (str): Path to the result zip.
+
+    Returns:
+        dict: Binder index to its float32 per-residue interface PAE, empty if the
+            zip has no scores.
+    """
+    with zipfile.ZipFile(result_zip) as zip_ref:
+        for member in zip_ref.namelist():
+            if member.endswith(".af2m_residues.npz"):
+                with np.load(io.BytesIO(zip_ref.read(member))) as residues:
+                    return {
+                        int(key[len("ipae_binder_"):]): residues[key] for key in residues.files
+                    }
+
+    # older zips keep them as lists in the scores JSON
+    scores = read_af2m_scores(result_zip) or {}
+    return {
+        int(binder_n): np.asarray(ipae_binder, dtype=np.float32)
+        for binder_n, ipae_binder in scores.get("ipae_binder", {}).items()
+    }
+
+
+def read_complex_sequence(result_zip):
+    """
+    Reads the sequence a result zip was predicted for from its predicted structure.
+
+    Args:
+        result_zip (str): Path to the result zip.
+
+    Returns:
+        str or None: The chain sequences joined by ":", e.g. "TARGET:BINDER", None if
+            the zip has no structure.
+    """
+    with zipfile.ZipFile(result_zip) as zip_ref:
+        pdb_members = sorted(member for member in zip_ref.namelist() if member.endswith(".pdb"))
+        if not pdb_members:
+            return None
+        pdb_lines = zip_ref.read(pdb_members[0]).decode(errors="replace").splitlines()
+    return ":".join(pdb_sequences.parse_chain_sequences(pdb_lines).values()) or None
+
+
+def flatten_af2m_scores(scores):
+    """
+    Flattens `score_af2m_binding` scores into one column per field and binder.
+
+    Args:
+        scores (dict): Scores as read from an af2m scores JSON.
+
+    Returns:
+        dict: Column name to value.
+    """
+    row = {
+        "plddt_target": scores["plddt_target"],
+        "pae_target": scores["pae_target"],
+    }
+    for field in [
+        "plddt_binder",
+        "pae_binder",
+        "ipae",
+        "ipsae",
+        "n_contacts",
+        "ipae_contacts",
+        "pdockq",
+        "ipae_binder",
+    ]:
+        for binder_n, value in scores.get(field, {}).items():
+            row[f"{field}_{binder_n}"] = value
+    return row
+
+
+def score_result_zip(name, result_zip):
+    """
+    Reads the scores of one design into a DataFrame row.
+
+    Args:
+        name (str): Design name.
+        result_zip (str): Path to its result zip.
+
+    Returns:
+        dict: The row, with only Design and result_zip if no scores could be read.
+    """
+    row = {"Design": name, "result_zip": result_zip}
+    try:
+        scores = read_af2m_scores(result_zip)
+    except (zipfile.BadZipFile, OSError, ValueError) as e:
+        print(f"Error reading scores of {name} from {result_zip}: {e}")
+        return row
+
+    if scores is None:
+        print(f"No af2m scores found in {result_zip}")
+        return row
+    row.update(flatten_af2m_scores(scores))
+    return row
+
+
+def score_result_zips(result_zips, max_workers=16):
+    """
+    Reads the scores of many result zips across a thread pool.
+
+    Args:
+        result_zips (dict): Design name to the path of its result zip,
+            e.g. from `find_result_zips`.
+        max_workers (int, optional): Number of threads reading zips.
+
+    Returns:
+        pd.DataFrame: One row per design, in the order of `result_zips`.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(score_result_zip, result_zips.keys(), result_zips.values()))
+    return pd.DataFrame(rows, columns=None if rows else ["Design", "result_zip"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Collect the af2m binding scores of AlphaFold result zips into a CSV'
+    )
+    parser.add_argument('results_dir', help='Directory with the .result.zip files')
+    parser.add_argument('output_csv', help='Path of the CSV to write')
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        default=16,
+        help='Number of threads reading zips (default: 16)'
+    )
+    args = parser.parse_args()
+
+    scores_df = score_result_zips(find_result_zips(args.results_dir), args.max_workers)
+    scores_df.to_csv(args.output_csv, index=False)
+    print(f"Scores of {len(scores_df)} designs saved to: {args.output_csv}")
+
+
+if __name__ == "__main__":
+    main()
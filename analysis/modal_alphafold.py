@@ -10,15 +10,38 @@ Limitations:
 - It requires only one entry in a fasta file.
 - If providing a complex, e.g., a binder and target pair,
   Provide the target first, then N binders after, separated by ":"
+
+Many designs can be validated from Python with `predict_batch`, which spreads
+them over at most MAX_CONTAINERS warm `AlphaFold` containers, several designs
+per call. The containers keep their loaded models and target MSAs between calls.
+`predict_queue` does the same from asyncio, retrying failed calls and handing
+back each design as its batch completes.
 """
 
 import os
 from pathlib import Path
 
-from modal import App, Image
+from modal import App, Image, Volume, enter, method
 
 GPU = os.environ.get("GPU", "A10G")
-TIMEOUT = os.environ.get("TIMEOUT", 20)
+TIMEOUT = int(os.environ.get("TIMEOUT", 20))
+# Maximum number of containers predicting the batches of `predict_batch` concurrently
+MAX_CONTAINERS = int(os.environ.get("MAX_CONTAINERS", 10))
+
+# Adaptive validation, see `AlphaFold.validate`: the (models, num_recycles) stages a
+# design is escalated through while its iPAE (Å) stays between accept and reject
+VALIDATION_STAGES = [([1], 1), ([1], 3), ([1, 2, 3], 3)]
+IPAE_ACCEPT = 8.0
+IPAE_REJECT = 20.0
+# ColabFold ranking score (0-100) at which a model stops recycling early
+VALIDATION_STOP_AT_SCORE = 85
+# MSA modes of `AlphaFold` complex predictions, as results_catalog.MSA_MODES:
+# "unpaired+paired" searches paired and unpaired MSAs of all chains on the MSA server,
+# as `modal run modal_alphafold.py` does; "unpaired_target+single_sequence_binders"
+# combines the stored target MSA with single-sequence binders, which skips the MSA
+# server for seen targets but gives different scores
+MSA_MODES = ("unpaired+paired", "unpaired_target+single_sequence_binders")
+DEFAULT_MSA_MODE = MSA_MODES[0]
 
 image = (
     Image.micromamba(python_version="3.11")
@@ -38,18 +61,52 @@ image = (
 
 app = App("alphafold", image=image)
 
+# Content-addressed MSA store shared by all containers, see `MSAStore`
+MSAS_DIR = "/msas"
+msas_volume = Volume.from_name("alphafold-msas", create_if_missing=True)
+
+
+# Interface metric parameters: residues closer than CONTACT_DISTANCE (Å, between
+# CB atoms, CA for glycine) are in contact; ipSAE only counts pairs under PAE_CUTOFF (Å)
+CONTACT_DISTANCE = 8.0
+PAE_CUTOFF = 10.0
+
+
+def read_cb_coords(pdb_str: str):
+    """Reads the CB coordinates (CA for glycine) of each residue of a PDB, in order.
+
+    Returns:
+        np.ndarray: (num_residues, 3) float32 coordinates.
+    """
+    import numpy as np
+
+    coords = {}
+    for line in pdb_str.splitlines():
+        if not line.startswith("ATOM"):
+            continue
+        atom_name = line[12:16].strip()
+        if atom_name == "CB" or (atom_name == "CA" and line[17:20] == "GLY"):
+            residue = (line[21], int(line[22:26]), line[26])
+            coords[residue] = (float(line[30:38]), float(line[38:46]), float(line[46:54]))
+    return np.array(list(coords.values()), dtype=np.float32).reshape(-1, 3)
+
 
 def score_af2m_binding(
-    af2m_dict: dict, target_len: int, binders_len: list[int]
+    af2m_dict: dict, target_len: int, binders_len: list[int], coords=None
 ) -> dict:
     """Calculates binding scores from AlphaFold2 multimer prediction results.
 
     The target is assumed to be the first part of the sequence, followed by one or more binders.
+    PAE is loaded once as a float32 array and the target/binder blocks of all binders are
+    reduced in one pass with `np.add.reduceat` over the chain boundaries.
 
     Args:
         af2m_dict (dict): Dictionary loaded from an AlphaFold2 multimer JSON output file (usually contains 'plddt' and 'pae' keys).
         target_len (int): Length of the target protein sequence.
         binders_len (list[int]): List of lengths for each binder protein sequence.
+        coords (np.ndarray, optional): (target_len + sum(binders_len), 3) CB coordinates of
+                                       the prediction, from `read_cb_coords`. Without them
+                                       the contact-based metrics are None.
 
     Returns:
         dict: A dictionary containing various scores:
@@ -58,79 +115,371 @@ def score_af2m_binding(
             - "pae_binder" (dict[int, float]): Average PAE within each binder, keyed by binder index.
             - "pae_target" (float): Average PAE within the target.
             - "ipae" (dict[int, float]): Average interface PAE between the target and each binder, keyed by binder index.
-            - "ipae_binder" (dict[int, list[float]]): Per-residue interface PAE scores for each binder interacting with the target, keyed by binder index.
+            - "ipsae" (dict[int, float]): ipSAE between the target and each binder, the larger of both directions.
+            - "n_contacts" (dict[int, int | None]): Number of target<>binder residue contacts.
+            - "ipae_contacts" (dict[int, float | None]): Average interface PAE over the contacting residue pairs.
+            - "pdockq" (dict[int, float | None]): pDockQ from the contacts and their average pLDDT.
+            - "ipae_binder" (dict[int, np.ndarray]): Per-residue interface PAE scores for each binder interacting with the target, keyed by binder index.
     """
 
     import numpy as np
 
-    plddt_array = np.array(af2m_dict["plddt"])
-    pae_array = np.array(af2m_dict["pae"])
+    plddt_array = np.asarray(af2m_dict["plddt"], dtype=np.float32)
+    pae_array = np.asarray(af2m_dict["pae"], dtype=np.float32)
 
-    assert len(plddt_array) == len(pae_array) == target_len + sum(binders_len)
+    chain_lens = np.array([target_len, *binders_len])
+    starts = np.concatenate([[0], np.cumsum(chain_lens)[:-1]])
+    assert len(plddt_array) == len(pae_array) == chain_lens.sum()
 
-    plddt_target = np.mean(plddt_array[:target_len])
-    pae_target = np.mean(pae_array[:target_len, :target_len])
+    # --------------------------------------------------------------------------
+    # pLDDT and PAE means of every chain and chain pair
+    #
+    plddt_means = np.add.reduceat(plddt_array, starts) / chain_lens
+    pae_block_means = np.add.reduceat(
+        np.add.reduceat(pae_array, starts, axis=0, dtype=np.float64), starts, axis=1
+    ) / np.outer(chain_lens, chain_lens)
+
+    # --------------------------------------------------------------------------
+    # Per-residue interface PAE; mean target->residue and residue->target
+    #
+    ipae_residues = (
+        pae_array[:target_len].mean(axis=0) + pae_array[:, :target_len].mean(axis=1)
+    ) / 2
+
+    # --------------------------------------------------------------------------
+    # ipSAE; per residue, the PTM-like score over the partner residues with a
+    # confident PAE, with d0 from their number; the maximum over the residues
+    #
+    confident = pae_array < PAE_CUTOFF
+    n_confident = np.add.reduceat(confident, starts, axis=1, dtype=np.int32)
+    d0 = np.maximum(1.24 * np.cbrt(np.maximum(n_confident, 27) - 15.0) - 1.8, 1.0)
+    chain_ids = np.repeat(np.arange(len(chain_lens)), chain_lens)
+    ptm_terms = np.where(
+        confident, 1 / (1 + (pae_array / d0[:, chain_ids]) ** 2), 0
+    )
+    ptm_residues = np.add.reduceat(ptm_terms, starts, axis=1) / np.maximum(n_confident, 1)
+
+    # --------------------------------------------------------------------------
+    # Contacts; CB distances between the target and each binder
+    #
+    if coords is not None:
+        coords = np.asarray(coords, dtype=np.float32)
+        assert len(coords) == len(plddt_array)
+        distances = np.linalg.norm(
+            coords[:target_len, None] - coords[None, target_len:], axis=-1
+        )
+        contacts = distances < CONTACT_DISTANCE
+        pae_pairs = (
+            pae_array[:target_len, target_len:] + pae_array[target_len:, :target_len].T
+        ) / 2
 
     plddt_binder = {}
     pae_binder = {}
     ipae = {}
+    ipsae = {}
+    n_contacts = {}
+    ipae_contacts = {}
+    pdockq = {}
     ipae_binder = {}
 
-    current_pos = target_len
-    for binder_n, binder_len in enumerate(binders_len):
-        binder_start, binder_end = current_pos, current_pos + binder_len
-
-        # --------------------------------------------------------------------------
-        # pLDDT; binder
-        #
+    for binder_n in range(len(binders_len)):
+        chain = binder_n + 1
+        binder_start = starts[chain]
+        binder_end = binder_start + chain_lens[chain]
 
-        plddt_binder[binder_n] = np.mean(plddt_array[binder_start:binder_end])
-
-        # --------------------------------------------------------------------------
-        # PAE; binder vs itself; mean target<>binder; target<>binder separately
-        #
-        pae_binder[binder_n] = np.mean(
-            pae_array[binder_start:binder_end, binder_start:binder_end]
+        plddt_binder[binder_n] = float(plddt_means[chain])
+        pae_binder[binder_n] = float(pae_block_means[chain, chain])
+        ipae[binder_n] = float(
+            (pae_block_means[0, chain] + pae_block_means[chain, 0]) / 2
         )
-        ipae[binder_n] = np.mean(
-            [
-                np.mean(pae_array[:target_len, binder_start:binder_end]),
-                np.mean(pae_array[binder_start:binder_end, :target_len]),
-            ]
+        ipsae[binder_n] = float(
+            max(
+                ptm_residues[:target_len, chain].max(),
+                ptm_residues[binder_start:binder_end, 0].max(),
+            )
         )
+        ipae_binder[binder_n] = ipae_residues[binder_start:binder_end]
 
-        ipae_binder[binder_n] = np.mean(
+        if coords is None:
+            n_contacts[binder_n] = ipae_contacts[binder_n] = pdockq[binder_n] = None
+            continue
+
+        columns = slice(binder_start - target_len, binder_end - target_len)
+        binder_contacts = contacts[:, columns]
+        n_contacts[binder_n] = int(binder_contacts.sum())
+        if n_contacts[binder_n] == 0:
+            ipae_contacts[binder_n] = None
+            pdockq[binder_n] = 0.0
+            continue
+
+        ipae_contacts[binder_n] = float(pae_pairs[:, columns][binder_contacts].mean())
+        # pDockQ (Bryant et al. 2022), from the mean pLDDT of the interface residues
+        interface_plddt = np.concatenate(
             [
-                np.mean(pae_array[:target_len, binder_start:binder_end], axis=0),
-                np.mean(pae_array[binder_start:binder_end, :target_len], axis=1),
-            ],
-            axis=0,
-        )
-        current_pos += binder_len
+                plddt_array[:target_len][binder_contacts.any(axis=1)],
+                plddt_array[binder_start:binder_end][binder_contacts.any(axis=0)],
+            ]
+        ).mean()
+        x = interface_plddt * np.log10(n_contacts[binder_n])
+        pdockq[binder_n] = float(0.724 / (1 + np.exp(-0.052 * (x - 152.611))) + 0.018)
 
     return {
-        "plddt_binder": {k: float(v) for k, v in plddt_binder.items()},
-        "plddt_target": float(plddt_target),
-        "pae_binder": {k: float(v) for k, v in pae_binder.items()},
-        "pae_target": float(pae_target),
-        "ipae": {k: float(v) for k, v in ipae.items()},
-        "ipae_binder": {
-            k: [float(ipae_b) for ipae_b in ipae_binder[k]]
-            for k, v in ipae_binder.items()
-        },
+        "plddt_binder": plddt_binder,
+        "plddt_target": float(plddt_means[0]),
+        "pae_binder": pae_binder,
+        "pae_target": float(pae_block_means[0, 0]),
+        "ipae": ipae,
+        "ipsae": ipsae,
+        "n_contacts": n_contacts,
+        "ipae_contacts": ipae_contacts,
+        "pdockq": pdockq,
+        "ipae_binder": ipae_binder,
     }
 
 
+def check_fasta(fasta_str: str) -> str:
+    """Validates a single-entry FASTA string and returns its sequence.
+
+    Raises:
+        AssertionError: If the header or the amino acids are invalid.
+    """
+    header = fasta_str.splitlines()[0]
+    fasta_seq = "".join(seq.strip() for seq in fasta_str.splitlines()[1:])
+    if header[0] != ">" or any(aa not in "ACDEFGHIKLMNPQRSTVWY:" for aa in fasta_seq):
+        raise AssertionError(f"invalid fasta:\n{fasta_str}")
+    return fasta_seq
+
+
+def add_af2m_scores(result_zip: Path, fasta_seq: str) -> dict | None:
+    """Scores the top ranked multimer prediction of a result zip and stores the scores in it.
+
+    The scalar scores are stored as '<prefix>.af2m_scores.json' and the per-residue
+    interface PAE of each binder as float32 arrays 'ipae_binder_<n>' of
+    '<prefix>.af2m_residues.npz'.
+
+    Args:
+        result_zip (Path): ColabFold result zip of one query.
+        fasta_seq (str): Sequence of the query, target first, binders separated by ":".
+
+    Returns:
+        dict | None: The scalar `score_af2m_binding` scores, or None for a monomer.
+    """
+    import io
+    import json
+    import zipfile
+
+    import numpy as np
+
+    if ":" not in fasta_seq:
+        return None
+
+    target_len = len(fasta_seq.split(":")[0])
+    binders_len = [len(b_seq) for b_seq in fasta_seq.split(":")[1:]]
+
+    with zipfile.ZipFile(result_zip, "a") as zip_ref:
+        members = zip_ref.namelist()
+        json_files = [f for f in members if Path(f).suffix == ".json"]
+
+        for json_file in json_files:
+            json_data = json.loads(zip_ref.read(json_file))
+
+            if "plddt" in json_data and "pae" in json_data:
+                prefix = Path(json_file).with_suffix("")
+
+                # the structure of the scored model, for the contact-based metrics
+                coords = None
+                pdb_file = str(prefix.with_suffix(".pdb")).replace("_scores_", "_unrelaxed_")
+                if pdb_file in members:
+                    coords = read_cb_coords(zip_ref.read(pdb_file).decode())
+                    if len(coords) != len(json_data["plddt"]):
+                        print(f"Unexpected number of residues in {pdb_file}, skipping contacts")
+                        coords = None
+
+                af2m_scores = score_af2m_binding(json_data, target_len, binders_len, coords)
+                residues = io.BytesIO()
+                np.savez_compressed(
+                    residues,
+                    **{
+                        f"ipae_binder_{binder_n}": ipae_binder
+                        for binder_n, ipae_binder in af2m_scores.pop("ipae_binder").items()
+                    },
+                )
+                zip_ref.writestr(f"{prefix}.af2m_residues.npz", residues.getvalue())
+                zip_ref.writestr(f"{prefix}.af2m_scores.json", json.dumps(af2m_scores, indent=2))
+                return af2m_scores
+    return None
+
+
+def run_colabfold(
+    queries: list,
+    is_complex: bool,
+    out_dir: str,
+    models: list[int],
+    num_recycles: int,
+    num_relax: int,
+    use_templates: bool,
+    stop_at_score: float = 100,
+    **run_kwargs,
+):
+    """Predicts all `queries`, as from `get_queries`, in one ColabFold run.
+
+    The default `stop_at_score` of 100 runs all models and recycles.
+    """
+    from colabfold.batch import run
+    from colabfold.download import default_data_dir
+
+    os.environ["XLA_PYTHON_CLIENT_ALLOCATOR"] = "platform"
+
+    run(
+        queries=queries,
+        result_dir=out_dir,
+        use_templates=use_templates,
+        num_relax=num_relax,
+        relax_max_iterations=200,
+        msa_mode="MMseqs2 (UniRef+Environmental)",
+        model_type="auto",
+        num_models=len(models),
+        num_recycles=num_recycles,
+        model_order=models,
+        is_complex=is_complex,
+        data_dir=default_data_dir,
+        keep_existing_results=False,
+        rank_by="auto",
+        pair_mode="unpaired+paired",
+        stop_at_score=stop_at_score,
+        zip_results=True,
+        user_agent="colabfold/google-colab-batch",
+        **run_kwargs,
+    )
+
+
+def complex_a3m(chains: list[str], chain_msas: dict[str, str]) -> str:
+    """Builds the unpaired a3m of a complex from the a3m of each of its chains.
+
+    Uses the format ColabFold serializes complex MSAs in: a "#lengths\tcardinalities"
+    line over the unique chains, the concatenated query, then each chain's MSA
+    padded with gaps to the full complex length.
+
+    Args:
+        chains (list[str]): Sequences of the chains of the complex.
+        chain_msas (dict[str, str]): a3m per unique chain sequence, starting with the query.
+
+    Returns:
+        str: The a3m to pass as the a3m lines of a ColabFold query.
+    """
+    unique_chains = list(dict.fromkeys(chains))
+    lengths = [len(chain) for chain in unique_chains]
+
+    a3m = "#" + ",".join(map(str, lengths)) + "\t"
+    a3m += ",".join(str(chains.count(chain)) for chain in unique_chains) + "\n"
+    a3m += ">" + "\t".join(str(101 + i) for i in range(len(unique_chains))) + "\n"
+    a3m += "".join(unique_chains) + "\n"
+
+    for i, chain in enumerate(unique_chains):
+        before, after = "-" * sum(lengths[:i]), "-" * sum(lengths[i + 1 :])
+        lines = [line for line in chain_msas[chain].splitlines() if line.strip()]
+        for header, seq in zip(lines[::2], lines[1::2]):
+            a3m += f"{header}\n{before}{seq}{after}\n"
+    return a3m
+
+
+class MSAStore:
+    """Content-addressed store of chain MSAs on `msas_volume`.
+
+    Each a3m is stored under the sha256 of its chain sequence, so a target is only
+    ever searched on the MSA server once across all containers and runs. De novo
+    binder chains have no homologs worth searching and use single-sequence MSAs in
+    the "unpaired_target+single_sequence_binders" MSA mode, see MSA_MODES.
+    """
+
+    def __init__(self, root: str = MSAS_DIR):
+        self.root = Path(root)
+        self.msas = {}
+        self.inserted = 0
+
+    @staticmethod
+    def key(seq: str) -> str:
+        """Returns the sha256 of a chain sequence."""
+        import hashlib
+
+        return hashlib.sha256(seq.encode()).hexdigest()
+
+    def path(self, seq: str) -> Path:
+        key = self.key(seq)
+        return self.root / key[:2] / f"{key}.a3m"
+
+    def lookup(self, seq: str) -> str | None:
+        """Returns the stored a3m of a chain, or None if it was never searched."""
+        if seq not in self.msas and self.path(seq).is_file():
+            self.msas[seq] = self.path(seq).read_text()
+        return self.msas.get(seq)
+
+    def insert(self, seq: str, a3m: str):
+        """Stores the a3m of a chain, atomically so concurrent readers never see a partial file."""
+        path = self.path(seq)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(a3m)
+        os.replace(tmp_path, path)
+        self.msas[seq] = a3m
+        self.inserted += 1
+
+    def chain_msa(self, seq: str, single_sequence: bool = False) -> str:
+        """Returns the a3m of a chain, searching and storing it on a miss.
+
+        Args:
+            seq (str): Chain sequence.
+            single_sequence (bool): Return the query alone, e.g. for de novo binders.
+        """
+        if single_sequence:
+            return f">101\n{seq}\n"
+
+        a3m = self.lookup(seq)
+        if a3m is None:
+            from colabfold.colabfold import run_mmseqs2
+
+            key = self.key(seq)
+            print(f"Searching MSA for chain {key[:12]}")
+            a3m = run_mmseqs2(
+                [seq],
+                prefix=f"/tmp/msa_{key}",
+                use_env=True,
+                use_filter=True,
+                user_agent="colabfold/google-colab-batch",
+            )[0]
+            self.insert(seq, a3m)
+        return a3m
+
+    def complex_msa(self, chains: list[str], single_sequence_binders: bool = True) -> str:
+        """Returns the complex a3m of a target (first chain) and its binders.
+
+        The chain MSAs are combined unpaired, see `complex_a3m`.
+        """
+        chain_msas = {
+            chain: self.chain_msa(chain, single_sequence=single_sequence_binders)
+            for chain in chains[1:]
+        }
+        chain_msas[chains[0]] = self.chain_msa(chains[0])
+        return complex_a3m(chains, chain_msas)
+
+    def commit(self):
+        """Persists the inserted MSAs for other containers."""
+        if self.inserted:
+            msas_volume.commit()
+            self.inserted = 0
+
+
 @app.function(
     image=image,
     gpu=GPU,
     timeout=TIMEOUT * 60,
+    volumes={MSAS_DIR: msas_volume},
 )
 def alphafold(
     fasta_name: str,
     fasta_str: str,
     models: list[int] | None = None,
-    num_recycles: int = 3,
+    num_recycles: int = 1,
     num_relax: int = 0,
     use_templates: bool = False,
     use_precomputed_msas: bool = False,
@@ -142,13 +491,14 @@ def alphafold(
         fasta_name (str): Name of the FASTA file (e.g., "protein.fasta").
         fasta_str (str): Content of the FASTA file as a string.
         models (list[int], optional): List of model numbers to run (1-5). Defaults to [1].
-        num_recycles (int, optional): Number of recycles for the model. Defaults to 3.
+        num_recycles (int, optional): Number of recycles for the model. Defaults to 1.
         num_relax (int, optional): Number of relaxation steps (0 means no Amber relaxation,
                                    1 means relax top model). Defaults to 0.
         use_templates (bool, optional): Whether to use PDB templates during prediction. Defaults to False.
-        use_precomputed_msas (bool, optional): If True, attempts to copy MSAs from a mounted
-                                               directory ("/msas") into the output directory to reuse them.
-                                               Defaults to False.
+        use_precomputed_msas (bool, optional): If True, takes the chain MSAs from the MSA store
+                                               on the "/msas" volume, searching and storing only
+                                               unseen chains; binders of a complex are predicted
+                                               in single-sequence mode. Defaults to False.
         return_all_files (bool, optional): If True, returns all generated files. If False,
                                            only returns the main ZIP file containing predictions.
                                            Defaults to False.
@@ -158,11 +508,7 @@ def alphafold(
                                   file path (typically a zip file or specific requested files)
                                   and its byte content.
     """
-    import json
-    import subprocess
-    import zipfile
-    from colabfold.batch import get_queries, run
-    from colabfold.download import default_data_dir
+    from colabfold.batch import get_queries
 
     if models is None:
         models = [1]
@@ -172,65 +518,39 @@ def alphafold(
     Path(in_dir).mkdir(parents=True, exist_ok=True)
     Path(out_dir).mkdir(parents=True, exist_ok=True)
 
-    # saves the colabfold server, speeds things up
-    if use_precomputed_msas:
-        subprocess.run(f"cp -r /msas/* {out_dir}", shell=True)
-
     with open(Path(in_dir) / fasta_name, "w") as f:
         f.write(fasta_str)
 
-    header = fasta_str.splitlines()[0]
-    fasta_seq = "".join(seq.strip() for seq in fasta_str.splitlines()[1:])
-    if header[0] != ">" or any(aa not in "ACDEFGHIKLMNPQRSTVWY:" for aa in fasta_seq):
-        raise AssertionError(f"invalid fasta:\n{fasta_str}")
+    fasta_seq = check_fasta(fasta_str)
 
     queries, is_complex = get_queries(in_dir)
 
-    os.environ["XLA_PYTHON_CLIENT_ALLOCATOR"] = "platform"
+    # saves the colabfold server, speeds things up
+    if use_precomputed_msas:
+        msa_store = MSAStore()
+        queries = [
+            (
+                jobname,
+                query_sequence,
+                [msa_store.complex_msa(query_sequence)]
+                if isinstance(query_sequence, list)
+                else [msa_store.chain_msa(query_sequence)],
+            )
+            for jobname, query_sequence, _ in queries
+        ]
+        msa_store.commit()
 
-    run(
-        queries=queries,
-        result_dir=out_dir,
-        use_templates=use_templates,
-        num_relax=num_relax,
-        relax_max_iterations=200,
-        msa_mode="MMseqs2 (UniRef+Environmental)",
-        model_type="auto",
-        num_models=len(models),
-        num_recycles=num_recycles,
-        model_order=models,
-        is_complex=is_complex,
-        data_dir=default_data_dir,
-        keep_existing_results=False,
-        rank_by="auto",
-        pair_mode="unpaired+paired",
-        stop_at_score=100,
-        zip_results=True,
-        user_agent="colabfold/google-colab-batch",
+    run_colabfold(
+        queries, is_complex, out_dir, models, num_recycles, num_relax, use_templates
     )
 
     # --------------------------------------------------------------------------
     # If binder_len is supplied, evaluate binder-target score using iPAE
     #
     if ":" in fasta_seq:  # then it is a multimer
-        target_len = len(fasta_seq.split(":")[0])
-        binders_len = [len(b_seq) for b_seq in fasta_seq.split(":")[1:]]
-
         results_zip = list(Path(out_dir).glob("**/*.zip"))
         assert len(results_zip) == 1, f"unexpected zip output: {results_zip}"
-
-        with zipfile.ZipFile(results_zip[0], "a") as zip_ref:
-            json_files = [f for f in zip_ref.namelist() if Path(f).suffix == ".json"]
-
-            for json_file in json_files:
-                json_data = json.loads(zip_ref.read(json_file))
-
-                if "plddt" in json_data and "pae" in json_data:
-                    prefix = Path(json_file).with_suffix("")
-                    af2m_scores = score_af2m_binding(json_data, target_len, binders_len)
-                    scores_json = json.dumps(af2m_scores, indent=2)
-                    zip_ref.writestr(f"{prefix}.af2m_scores.json", scores_json)
-                    break
+        add_af2m_scores(results_zip[0], fasta_seq)
 
     return [
         (out_file.relative_to(out_dir), open(out_file, "rb").read())
@@ -240,6 +560,412 @@ def alphafold(
     ]
 
 
+@app.cls(
+    image=image,
+    gpu=GPU,
+    timeout=TIMEOUT * 60,
+    max_containers=MAX_CONTAINERS,
+    scaledown_window=10 * 60,  # stay warm between the batches of a validation run
+    volumes={MSAS_DIR: msas_volume},
+)
+class AlphaFold:
+    """Long-lived ColabFold worker for validating many binder complexes.
+
+    Loaded model parameters are reused across calls, which also keeps the models
+    JAX has compiled for each padded input length. In the
+    "unpaired_target+single_sequence_binders" MSA mode, chain MSAs come from the
+    `MSAStore`, so each target is searched once across all containers and binders are
+    predicted in single-sequence mode; a complex with a seen target then needs no MSA
+    server round trip. The default "unpaired+paired" mode searches each query's MSAs.
+    """
+
+    @enter()
+    def load(self):
+        """Memoizes ColabFold's model loading for the lifetime of the container."""
+        import colabfold.batch
+
+        load_models_and_params = colabfold.batch.load_models_and_params
+        self.models = {}
+
+        def cached_load_models_and_params(*args, **kwargs):
+            key = repr((args, sorted(kwargs.items())))
+            if key not in self.models:
+                self.models[key] = load_models_and_params(*args, **kwargs)
+            return self.models[key]
+
+        colabfold.batch.load_models_and_params = cached_load_models_and_params
+        self.msa_store = MSAStore()
+
+    @method()
+    def predict(
+        self,
+        fastas: list[tuple[str, str]],
+        models: list[int] | None = None,
+        num_recycles: int = 1,
+        num_relax: int = 0,
+        use_templates: bool = False,
+        recompile_padding: int = 10,
+        msa_mode: str = DEFAULT_MSA_MODE,
+    ) -> dict[str, tuple[bytes | None, dict | None]]:
+        """Predicts several single-entry FASTAs in one ColabFold run.
+
+        Args:
+            fastas (list[tuple[str, str]]): (name, FASTA string) of each design. Complexes
+                                            list the target first, binders after ":".
+            models (list[int], optional): List of model numbers to run (1-5). Defaults to [1].
+            num_recycles (int, optional): Number of recycles for the model. Defaults to 1.
+            num_relax (int, optional): Number of relaxation steps. Defaults to 0.
+            use_templates (bool, optional): Whether to use PDB templates. Defaults to False.
+            recompile_padding (int, optional): Residues inputs are padded by, so that
+                                               similar lengths share compiled models.
+                                               Defaults to 10.
+            msa_mode (str, optional): One of MSA_MODES. Defaults to DEFAULT_MSA_MODE.
+
+        Returns:
+            dict[str, tuple[bytes | None, dict | None]]: Per name, the content of its
+                result zip and its `score_af2m_binding` scores (None for monomers or
+                failed queries).
+        """
+        return self._predict(
+            fastas, models, num_recycles, num_relax, use_templates, recompile_padding, msa_mode
+        )
+
+    @method()
+    def validate(
+        self,
+        fastas: list[tuple[str, str]],
+        stages: list[tuple[list[int], int]] | None = None,
+        ipae_accept: float = IPAE_ACCEPT,
+        ipae_reject: float = IPAE_REJECT,
+        stop_at_score: float = VALIDATION_STOP_AT_SCORE,
+        num_relax: int = 0,
+        use_templates: bool = False,
+        recompile_padding: int = 10,
+        msa_mode: str = DEFAULT_MSA_MODE,
+    ) -> dict[str, tuple[bytes | None, dict | None]]:
+        """Predicts several complexes, escalating only the borderline ones to costlier stages.
+
+        All designs are first predicted with the cheapest stage. A design is settled once
+        the iPAE of its worst binder is at most `ipae_accept` or at least `ipae_reject`;
+        the others are predicted again with the next stage, up to the last one. Within a
+        stage, ColabFold stops recycling a model once it reaches `stop_at_score`.
+
+        The compute each design consumed is returned under "validation" in its scores
+        and stored as '<name>.validation.json' in its result zip:
+        - stages: number of stages run, the result zip is of the last one
+        - model_runs: number of models run, over all stages
+        - max_recycles: maximum number of recycles run, over all stages
+        - gpu_seconds: its share of the ColabFold runs, split evenly over each batch
+
+        Args:
+            fastas (list[tuple[str, str]]): (name, FASTA string) of each design.
+            stages (list[tuple[list[int], int]], optional): (models, num_recycles) of each
+                                                           stage, cheapest first.
+                                                           Defaults to VALIDATION_STAGES.
+            ipae_accept (float, optional): iPAE (Å) at or below which a design is settled.
+            ipae_reject (float, optional): iPAE (Å) at or above which a design is settled.
+            stop_at_score (float, optional): ColabFold ranking score (0-100) at which a
+                                             model stops recycling.
+            num_relax (int, optional): Number of relaxation steps. Defaults to 0.
+            use_templates (bool, optional): Whether to use PDB templates. Defaults to False.
+            recompile_padding (int, optional): Residues inputs are padded by. Defaults to 10.
+            msa_mode (str, optional): One of MSA_MODES. Defaults to DEFAULT_MSA_MODE.
+
+        Returns:
+            dict[str, tuple[bytes | None, dict | None]]: As `predict`, from the last stage
+                each design was predicted with.
+        """
+        import io
+        import json
+        import time
+        import zipfile
+
+        if stages is None:
+            stages = VALIDATION_STAGES
+
+        compute = {
+            name: {"stages": 0, "model_runs": 0, "max_recycles": 0, "gpu_seconds": 0.0}
+            for name, _ in fastas
+        }
+        outputs = {}
+        remaining = list(fastas)
+        for models, num_recycles in stages:
+            start = time.perf_counter()
+            stage_outputs = self._predict(
+                remaining,
+                models,
+                num_recycles,
+                num_relax,
+                use_templates,
+                recompile_padding,
+                msa_mode,
+                stop_at_score=stop_at_score,
+            )
+            seconds = (time.perf_counter() - start) / len(remaining)
+
+            borderline = []
+            for name, fasta_str in remaining:
+                compute[name]["stages"] += 1
+                compute[name]["model_runs"] += len(models)
+                compute[name]["max_recycles"] = max(compute[name]["max_recycles"], num_recycles)
+                compute[name]["gpu_seconds"] += seconds
+                outputs[name] = stage_outputs[name]
+
+                # failed queries and monomers have no iPAE to escalate on
+                scores = outputs[name][1]
+                if scores is not None and ipae_accept < max(scores["ipae"].values()) < ipae_reject:
+                    borderline.append((name, fasta_str))
+            print(f"Stage {models=} {num_recycles=}: {len(borderline)}/{len(remaining)} borderline")
+
+            remaining = borderline
+            if not remaining:
+                break
+
+        for name, (zip_content, scores) in outputs.items():
+            if zip_content is None:
+                continue
+            result_zip = io.BytesIO(zip_content)
+            with zipfile.ZipFile(result_zip, "a") as zip_ref:
+                zip_ref.writestr(f"{name}.validation.json", json.dumps(compute[name], indent=2))
+            if scores is not None:
+                scores = {**scores, "validation": compute[name]}
+            outputs[name] = (result_zip.getvalue(), scores)
+        return outputs
+
+    def _predict(
+        self,
+        fastas: list[tuple[str, str]],
+        models: list[int] | None,
+        num_recycles: int,
+        num_relax: int,
+        use_templates: bool,
+        recompile_padding: int,
+        msa_mode: str,
+        stop_at_score: float = 100,
+    ) -> dict[str, tuple[bytes | None, dict | None]]:
+        """Body of `predict`, shared with the stages of `validate`."""
+        import tempfile
+
+        if models is None:
+            models = [1]
+        if msa_mode not in MSA_MODES:
+            raise ValueError(f"Unsupported MSA mode: {msa_mode}")
+
+        out_dir = tempfile.mkdtemp(prefix="out_af")
+
+        fasta_seqs = {}
+        queries = []
+        for name, fasta_str in fastas:
+            fasta_seq = fasta_seqs[name] = check_fasta(fasta_str)
+            chains = fasta_seq.split(":")
+            if msa_mode == "unpaired+paired":
+                # no a3m: ColabFold searches the MSAs of the query on the MSA server
+                queries.append((name, chains if len(chains) > 1 else fasta_seq, None))
+                continue
+            if len(chains) == 1:
+                queries.append((name, fasta_seq, [self.msa_store.chain_msa(fasta_seq)]))
+                continue
+
+            queries.append((name, chains, [self.msa_store.complex_msa(chains)]))
+        self.msa_store.commit()
+
+        run_colabfold(
+            queries,
+            any(":" in fasta_seq for fasta_seq in fasta_seqs.values()),
+            out_dir,
+            models,
+            num_recycles,
+            num_relax,
+            use_templates,
+            stop_at_score=stop_at_score,
+            recompile_padding=recompile_padding,
+        )
+
+        outputs = {}
+        for name, fasta_seq in fasta_seqs.items():
+            result_zip = Path(out_dir) / f"{name}.result.zip"
+            if not result_zip.is_file():
+                print(f"No result zip for {name}")
+                outputs[name] = (None, None)
+                continue
+            scores = add_af2m_scores(result_zip, fasta_seq)
+            outputs[name] = (result_zip.read_bytes(), scores)
+        return outputs
+
+
+async def predict_queue(
+    fastas: list[tuple[str, str]],
+    on_result,
+    on_state=None,
+    batch_size: int = 8,
+    max_in_flight: int = MAX_CONTAINERS,
+    max_attempts: int = 3,
+    retry_delay: float = 30,
+    models: list[int] | None = None,
+    num_recycles: int = 1,
+    num_relax: int = 0,
+    use_templates: bool = False,
+    stages: list[tuple[list[int], int]] | None = None,
+    thresholds: dict | None = None,
+    msa_mode: str = DEFAULT_MSA_MODE,
+):
+    """Validates many designs with one Modal app run, reporting each batch as it completes.
+
+    The designs are split into batches of `batch_size`, each spawned as an
+    `AlphaFold.predict` call, with at most `max_in_flight` calls running at once.
+    A failed call is retried up to `max_attempts` times, waiting `retry_delay`
+    seconds, doubled after each attempt, before spawning it again.
+
+    Args:
+        fastas (list[tuple[str, str]]): (name, FASTA string) of each design.
+        on_result (Callable[[str, bytes, dict | None], None]): Called with the name,
+            result zip content and binding scores of each predicted design.
+        on_state (Callable[[str, str, str | None], None], optional): Called with the
+            name, new state ("running", "done" or "failed") and error of each design.
+        batch_size (int, optional): Number of designs predicted per container call.
+                                    Defaults to 8.
+        max_in_flight (int, optional): Number of calls running at once.
+                                       Defaults to MAX_CONTAINERS.
+        max_attempts (int, optional): Number of attempts per batch. Defaults to 3.
+        retry_delay (float, optional): Seconds before the first retry. Defaults to 30.
+        models (list[int], optional): List of model numbers to run (1-5). Defaults to [1].
+        num_recycles (int, optional): Number of recycles for the model. Defaults to 1.
+        num_relax (int, optional): Number of relaxation steps. Defaults to 0.
+        use_templates (bool, optional): Whether to use PDB templates. Defaults to False.
+        stages (list[tuple[list[int], int]], optional): If given, validates adaptively
+            with `AlphaFold.validate` through these (models, num_recycles) stages,
+            ignoring `models` and `num_recycles`.
+        thresholds (dict, optional): ipae_accept, ipae_reject and stop_at_score of
+            `AlphaFold.validate`, if validating adaptively.
+        msa_mode (str, optional): One of MSA_MODES. Defaults to DEFAULT_MSA_MODE.
+    """
+    import asyncio
+
+    from modal import enable_output
+
+    def set_state(batch, state, error=None):
+        if on_state is not None:
+            for name, _ in batch:
+                on_state(name, state, error)
+
+    async def run_batch(predictor, batch, in_flight):
+        for attempt in range(1, max_attempts + 1):
+            async with in_flight:
+                set_state(batch, "running")
+                try:
+                    if stages is None:
+                        call = await predictor.predict.spawn.aio(
+                            batch,
+                            models=models,
+                            num_recycles=num_recycles,
+                            num_relax=num_relax,
+                            use_templates=use_templates,
+                            msa_mode=msa_mode,
+                        )
+                    else:
+                        call = await predictor.validate.spawn.aio(
+                            batch,
+                            stages=stages,
+                            num_relax=num_relax,
+                            use_templates=use_templates,
+                            msa_mode=msa_mode,
+                            **(thresholds or {}),
+                        )
+                    batch_outputs = await call.get.aio()
+                    break
+                except Exception as e:  # pylint: disable=broad-except
+                    error = f"{type(e).__name__}: {e}"
+            if attempt == max_attempts:
+                print(f"AlphaFold batch failed after {attempt} attempts: {error}")
+                set_state(batch, "failed", error)
+                return
+            delay = retry_delay * 2 ** (attempt - 1)
+            print(f"AlphaFold batch failed ({error}), retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+        for name, (zip_content, scores) in batch_outputs.items():
+            if zip_content is None:
+                set_state([(name, None)], "failed", "no result zip")
+                continue
+            on_result(name, zip_content, scores)
+            set_state([(name, None)], "done")
+
+    batches = [fastas[i : i + batch_size] for i in range(0, len(fastas), batch_size)]
+    if not batches:
+        return
+
+    with enable_output():
+        async with app.run():
+            predictor = AlphaFold()
+            in_flight = asyncio.Semaphore(max_in_flight)
+            await asyncio.gather(*(run_batch(predictor, batch, in_flight) for batch in batches))
+
+
+def predict_batch(
+    fastas: list[tuple[str, str]],
+    batch_size: int = 8,
+    models: list[int] | None = None,
+    num_recycles: int = 1,
+    num_relax: int = 0,
+    use_templates: bool = False,
+    stages: list[tuple[list[int], int]] | None = None,
+    thresholds: dict | None = None,
+    msa_mode: str = DEFAULT_MSA_MODE,
+) -> dict[str, tuple[bytes | None, dict | None]]:
+    """Validates many designs with one Modal app run instead of one `modal run` each.
+
+    The designs are split into batches of `batch_size` that `AlphaFold` workers predict
+    on at most MAX_CONTAINERS containers at once, so the app start, image pull, model
+    compilation and target MSA search are paid per container rather than per design.
+    See `predict_queue` to handle the results as they complete.
+
+    Args:
+        fastas (list[tuple[str, str]]): (name, FASTA string) of each design.
+        batch_size (int, optional): Number of designs predicted per container call.
+                                    Defaults to 8.
+        models (list[int], optional): List of model numbers to run (1-5). Defaults to [1].
+        num_recycles (int, optional): Number of recycles for the model. Defaults to 1.
+        num_relax (int, optional): Number of relaxation steps. Defaults to 0.
+        use_templates (bool, optional): Whether to use PDB templates. Defaults to False.
+        stages (list[tuple[list[int], int]], optional): Validates adaptively through these
+            stages, see `predict_queue`.
+        thresholds (dict, optional): Thresholds of the adaptive validation.
+        msa_mode (str, optional): One of MSA_MODES. Defaults to DEFAULT_MSA_MODE.
+
+    Returns:
+        dict[str, tuple[bytes | None, dict | None]]: Per name, the content of its result
+            zip and its binding scores, as from `AlphaFold.predict`; designs whose batch
+            failed are missing.
+    """
+    import asyncio
+
+    outputs = {}
+
+    def on_result(name, zip_content, scores):
+        outputs[name] = (zip_content, scores)
+
+    def on_state(name, state, error):
+        if state == "failed" and error == "no result zip":
+            outputs[name] = (None, None)
+
+    asyncio.run(
+        predict_queue(
+            fastas,
+            on_result,
+            on_state,
+            batch_size=batch_size,
+            models=models,
+            num_recycles=num_recycles,
+            num_relax=num_relax,
+            use_templates=use_templates,
+            stages=stages,
+            thresholds=thresholds,
+            msa_mode=msa_mode,
+        )
+    )
+    return outputs
+
+
 @app.local_entrypoint()
 def main(
     input_fasta: str,
@@ -5,13 +5,36 @@ This script moves folders (top-level prefixes) from a specified S3 bucket
 to an archive directory within the same bucket if the folder name (assumed
 to start with a four-digit year-month representation like '2412' for Dec 2024)
 is older than or equal to a specified cutoff date.
+
+Each folder is moved with server-side copies, run concurrently, and its source
+keys are deleted in batches only after all copies were verified. The steps are
+recorded in a journal ('archive_journal.jsonl'), and an interrupted move resumes
+by copying only what is missing. Use --dry-run to list what would be moved.
 """
+import argparse
 import json
 # import os # Removed as it's unused
 import sys # For sys.exit()
-import boto3 # type: ignore
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from boto3.s3.transfer import TransferConfig # type: ignore
 from botocore.exceptions import ClientError # type: ignore
 
+import s3_sync
+
+# Number of objects copied concurrently
+MAX_WORKERS = 32
+# Objects over 64 MB are copied server-side in 64 MB parts
+COPY_CONFIG = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=64 * 1024 * 1024,
+    max_concurrency=4,
+)
+# Maximum number of keys of a delete_objects request
+DELETE_BATCH_SIZE = 1000
+# Journal of the folder moves, one JSON line per step
+JOURNAL_PATH = "archive_journal.jsonl"
+
 def get_aws_credentials():
     """Load AWS credentials from config file."""
     try:
@@ -40,92 +63,195 @@ def check_bucket_exists(s3_client, bucket_name):
         raise RuntimeError(f"Error accessing bucket {bucket_name}: {e}") from e
     return False # Should not be reached if exception is raised
 
-# pylint: disable=too-many-locals, too-many-nested-blocks
+def list_archive_folders(s3_client, source_bucket, archive_prefix, cutoff_date):
+    """
+    Lists the top-level folders due for archiving: those whose name starts with a
+    YYMM date less than or equal to the cutoff date.
+    """
+    folders = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=source_bucket, Delimiter='/'):
+        for common_prefix in page.get('CommonPrefixes', []):
+            folder = common_prefix.get('Prefix').strip('/') # Get folder name
+            if folder == archive_prefix:
+                continue
+
+            # Assuming folder name starts with YYMM format e.g., "2412"
+            folder_date_str = folder[:4]
+            if not folder_date_str.isdigit() or len(folder_date_str) != 4:
+                print(f"Skipping folder with non-date prefix: {folder}")
+                continue
+            if int(folder_date_str) <= int(cutoff_date):
+                folders.append(folder)
+    return folders
+
+
+def load_journal(journal_path):
+    """
+    Reads the move journal: the last recorded state of each folder.
+    """
+    states = {}
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                states[entry['folder']] = entry['state']
+    except FileNotFoundError:
+        pass
+    return states
+
+
+def record_journal(journal_path, folder, state, **details):
+    """
+    Appends the state of a folder ("copying", "verified", "deleted") to the move journal.
+    """
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'folder': folder, 'state': state, 'time': time.time(), **details}))
+        f.write('\n')
+
+
+def is_copied(source_obj, archived_obj):
+    """
+    Checks an archived copy against its source: same size, and same ETag unless
+    either was written in parts (multipart ETags depend on the part size).
+    """
+    if archived_obj is None or archived_obj['size'] != source_obj['size']:
+        return False
+    if '-' in source_obj['etag'] or '-' in archived_obj['etag']:
+        return True
+    return archived_obj['etag'] == source_obj['etag']
+
+
+def delete_keys(s3_client, bucket, keys):
+    """
+    Deletes keys in delete_objects batches of DELETE_BATCH_SIZE.
+
+    Returns:
+        list[str]: The keys that could not be deleted.
+    """
+    failed = []
+    for i in range(0, len(keys), DELETE_BATCH_SIZE):
+        response = s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in keys[i:i + DELETE_BATCH_SIZE]],
+                    'Quiet': True},
+        )
+        for error in response.get('Errors', []):
+            print(f"  Error deleting {error['Key']}: {error.get('Message')}")
+            failed.append(error['Key'])
+    return failed
+
+
+# pylint: disable=too-many-arguments, too-many-locals
+def archive_folder(s3_client, source_bucket, folder, archive_prefix, journal_path,
+                   max_workers=MAX_WORKERS, dry_run=False):
+    """
+    Moves one folder under the archive prefix, all or nothing.
+
+    The folder's keys are listed once and copied concurrently, large objects with
+    multipart copies. The source keys are deleted, in batches, only once every copy
+    was verified against a listing of the archive; a folder is never half moved. The
+    steps are recorded in the journal, and a rerun copies only what is missing.
+
+    Directory marker objects are moved too, as the folder would otherwise still be
+    listed, and moved again, after the move.
+
+    Returns:
+        bool: Whether the folder was moved completely (or would be, in a dry run).
+    """
+    source = s3_sync.list_objects(s3_client, source_bucket, f"{folder}/", include_markers=True)
+    if not source:
+        print(f"No objects left in {folder}, skipping it")
+        return False
+    total_bytes = sum(obj['size'] for obj in source.values())
+    if dry_run:
+        print(f"[dry run] Would move {len(source)} objects ({total_bytes / 1e9:.2f} GB) "
+              f"of {folder} to {archive_prefix}/{folder}")
+        return True
+
+    archive_folder_prefix = f"{archive_prefix}/{folder}/"
+    record_journal(journal_path, folder, 'copying', objects=len(source), bytes=total_bytes)
+    archived = s3_sync.list_objects(s3_client, source_bucket, archive_folder_prefix,
+                                    include_markers=True)
+    to_copy = [path for path, obj in source.items() if not is_copied(obj, archived.get(path))]
+    print(f"Moving {folder}: copying {len(to_copy)} of {len(source)} objects "
+          f"({total_bytes / 1e9:.2f} GB)")
+
+    def copy(relative_path):
+        s3_client.copy(
+            {'Bucket': source_bucket, 'Key': source[relative_path]['key']},
+            source_bucket,
+            f"{archive_folder_prefix}{relative_path}",
+            Config=COPY_CONFIG,
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(copy, path): path for path in to_copy}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except ClientError as e_obj:
+                print(f"  Error copying {source[futures[future]]['key']}: {e_obj}")
+
+    # Verify every copy before deleting anything
+    archived = s3_sync.list_objects(s3_client, source_bucket, archive_folder_prefix,
+                                    include_markers=True)
+    missing = [path for path, obj in source.items() if not is_copied(obj, archived.get(path))]
+    if missing:
+        print(f"  {len(missing)} objects of {folder} were not copied, keeping the folder; "
+              "rerun to resume")
+        return False
+    record_journal(journal_path, folder, 'verified')
+
+    failed = delete_keys(s3_client, source_bucket, [obj['key'] for obj in source.values()])
+    if failed:
+        print(f"  {len(failed)} objects of {folder} could not be deleted; rerun to resume")
+        return False
+    record_journal(journal_path, folder, 'deleted')
+    print(f"Successfully moved folder {folder} to {archive_prefix}/{folder}")
+    return True
+
+
 def move_folders_to_archive(source_bucket, archive_prefix="snake-venom-binder",
-                            cutoff_date="2412"):
+                            cutoff_date="2412", journal_path=JOURNAL_PATH,
+                            max_workers=MAX_WORKERS, dry_run=False):
     """
     Move folders to an archive directory within the same S3 bucket.
 
     Folders are identified by top-level prefixes. A folder is moved if its
     name (e.g., '2412_some_name') starts with a date string (YYMM) that is
-    less than or equal to the cutoff_date.
+    less than or equal to the cutoff_date. Folders are moved one at a time,
+    each with `archive_folder`.
     """
     aws_access_key_id, aws_secret_access_key = get_aws_credentials()
 
-    s3_client = boto3.client('s3',
-                             aws_access_key_id=aws_access_key_id,
-                             aws_secret_access_key=aws_secret_access_key)
+    s3_client = s3_sync.make_s3_client(aws_access_key_id, aws_secret_access_key,
+                                       max_workers=max_workers)
 
     check_bucket_exists(s3_client, source_bucket)
 
-    paginator = s3_client.get_paginator('list_objects_v2')
-    processed_folders = set()
+    journal = load_journal(journal_path)
     moved_count = 0
-
-    for page in paginator.paginate(Bucket=source_bucket, Delimiter='/'):
-        # Process common prefixes (folders)
-        for common_prefix in page.get('CommonPrefixes', []):
-            folder = common_prefix.get('Prefix').strip('/') # Get folder name
-
-            if folder in processed_folders or folder == archive_prefix:
-                continue
-
-            try:
-                # Assuming folder name starts with YYMM format e.g., "2412"
-                folder_date_str = folder[:4]
-                if not folder_date_str.isdigit() or len(folder_date_str) != 4:
-                    print(f"Skipping folder with non-date prefix: {folder}")
-                    continue
-                folder_date = int(folder_date_str)
-
-                if folder_date <= int(cutoff_date):
-                    print(f"Preparing to move folder: {folder}")
-
-                    # List all objects in this folder
-                    folder_objects_paginator = s3_client.get_paginator('list_objects_v2')
-                    for objects_page in folder_objects_paginator.paginate(
-                        Bucket=source_bucket, Prefix=f"{folder}/"
-                    ):
-                        for s3_object in objects_page.get('Contents', []):
-                            try:
-                                old_key = s3_object['Key']
-                                new_key = f"{archive_prefix}/{old_key}"
-
-                                print(f"  Copying {old_key} to {new_key}")
-                                s3_client.copy_object(
-                                    CopySource={'Bucket': source_bucket, 'Key': old_key},
-                                    Bucket=source_bucket,
-                                    Key=new_key
-                                )
-
-                                print(f"  Deleting {old_key}")
-                                s3_client.delete_object(
-                                    Bucket=source_bucket,
-                                    Key=old_key
-                                )
-                            except ClientError as e_obj:
-                                print(f"  Error processing object {old_key}: {e_obj}")
-                                # Decide if we should stop or continue with other objects
-                                continue # Continue with the next object in the folder
-                        # After processing all objects in the folder
-                        processed_folders.add(folder)
-                        moved_count += 1
-                        print(f"Successfully moved contents of folder {folder} "
-                              f"to {archive_prefix}/{folder}")
-
-            except ValueError: # Handles int(cutoff_date) or int(folder_date_str) failure
-                print(f"Skipping folder with invalid date format: {folder}")
-            except ClientError as e_folder: # Catch errors during folder processing (e.g. list_objects)
-                print(f"ClientError while processing folder {folder}: {e_folder}")
-            except Exception as e_unexpected: # Catch any other unexpected error
-                err_type = type(e_unexpected).__name__
-                print(f"Unexpected error processing folder {folder}:")
-                print(f"  Type: {err_type}, Error: {e_unexpected}")
-                # Potentially add 'continue' if you want to proceed with other folders
+    for folder in list_archive_folders(s3_client, source_bucket, archive_prefix, cutoff_date):
+        if journal.get(folder) in ('copying', 'verified'):
+            print(f"Resuming the move of folder {folder} ({journal[folder]})")
+        try:
+            if archive_folder(s3_client, source_bucket, folder, archive_prefix, journal_path,
+                              max_workers, dry_run):
+                moved_count += 1
+        except ClientError as e_folder: # Catch errors during folder processing (e.g. list_objects)
+            print(f"ClientError while processing folder {folder}: {e_folder}")
 
     return moved_count
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Archive old folders of an S3 bucket')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only list the folders and objects that would be moved')
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS,
+                        help=f'Number of objects copied concurrently (default: {MAX_WORKERS})')
+    args = parser.parse_args()
+
     SOURCE_BUCKET_NAME = "bindcraft"
     ARCHIVE_PREFIX_PATH = "snake-venom-binder" # Clarified name
     CUTOFF_DATE_STR = "2502" # Clarified name
@@ -134,7 +260,9 @@ if __name__ == "__main__":
         moved_folders_count = move_folders_to_archive(
             SOURCE_BUCKET_NAME,
             ARCHIVE_PREFIX_PATH,
-            CUTOFF_DATE_STR
+            CUTOFF_DATE_STR,
+            max_workers=args.max_workers,
+            dry_run=args.dry_run,
         )
         print(f"Archive process completed. Moved {moved_folders_count} "
               "folders' contents.")
@@ -0,0 +1,182 @@
+"""
+Fast chain sequence extraction from PDB files.
+
+Reads only the SEQRES records of a PDB file, or its ATOM CA records when it has
+none (as BindCraft's designs do), instead of building the full structure with
+Biopython. Files are parsed across a process pool, and the sequences are cached
+by path, modification time and size, so a rerun only parses new or changed files.
+
+Usage:
+    python pdb_sequences.py ./../out/bindcraft/snake-venom-binder
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_PATH = "./pdb_sequences_cache.json"
+
+THREE_TO_ONE = {
+    'ALA': 'A', 'ARG': 'R', 'ASN': 'N', 'ASP': 'D', 'CYS': 'C',
+    'GLN': 'Q', 'GLU': 'E', 'GLY': 'G', 'HIS': 'H', 'ILE': 'I',
+    'LEU': 'L', 'LYS': 'K', 'MET': 'M', 'PHE': 'F', 'PRO': 'P',
+    'SER': 'S', 'THR': 'T', 'TRP': 'W', 'TYR': 'Y', 'VAL': 'V',
+}
+
+
+def parse_chain_sequences(lines):
+    """
+    Parses the sequence of each chain of the first model from the lines of a PDB file.
+
+    Non-standard residues are left out, as Biopython's PPBuilder does.
+
+    Args:
+        lines (Iterable[str]): Lines of the PDB file.
+
+    Returns:
+        dict: Chain ID to its one-letter sequence, in file order.
+    """
+    seqres = {}
+    ca_residues = {}
+    for line in lines:
+        record = line[:6]
+        if record == 'SEQRES':
+            residues = seqres.setdefault(line[11], [])
+            residues += [THREE_TO_ONE.get(name, '') for name in line[19:].split()]
+        elif record == 'ATOM  ' and line[12:16] == ' CA ' and line[16] in ' A':
+            residue = (line[22:26], line[26])
+            ca_residues.setdefault(line[21], {}).setdefault(
+                residue, THREE_TO_ONE.get(line[17:20], '')
+            )
+        elif record == 'ENDMDL':
+            break
+
+    if seqres:
+        return {chain: ''.join(residues) for chain, residues in seqres.items()}
+    return {chain: ''.join(residues.values()) for chain, residues in ca_residues.items()}
+
+
+def read_chain_sequences(pdb_path):
+    """
+    Reads the sequence of each chain of the first model of a PDB file.
+
+    Args:
+        pdb_path (str): Path to the PDB file.
+
+    Returns:
+        dict: Chain ID to its one-letter sequence, in file order.
+    """
+    with open(pdb_path, 'r', encoding='utf-8', errors='replace') as f:
+        return parse_chain_sequences(f)
+
+
+def try_read_chain_sequences(pdb_path):
+    """
+    `read_chain_sequences` for the process pool: prints the error and returns None
+    for a file that cannot be read.
+    """
+    try:
+        return read_chain_sequences(pdb_path)
+    except OSError as e:
+        print(f'Error processing file {pdb_path}: {e}')
+        return None
+
+
+def find_accepted_pdbs(parent_folder):
+    """
+    Finds the PDB files directly in the 'Accepted' folders under a parent folder.
+    """
+    pdb_paths = []
+    for root, _, files in os.walk(parent_folder):
+        if os.path.basename(root) == 'Accepted':
+            pdb_paths += [os.path.join(root, file) for file in sorted(files) if file.endswith('.pdb')]
+    return pdb_paths
+
+
+def load_cache(cache_path):
+    """
+    Reads the sequence cache: absolute path to {"mtime_ns", "size", "chains"}.
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(cache_path, cache):
+    """
+    Writes the sequence cache, atomically.
+    """
+    with open(f"{cache_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(f"{cache_path}.tmp", cache_path)
+
+
+def extract_sequences(pdb_paths, cache_path=CACHE_PATH, max_workers=None):
+    """
+    Reads the chain sequences of many PDB files, parsing only the files not in the cache.
+
+    Args:
+        pdb_paths (Iterable[str]): Paths to the PDB files.
+        cache_path (str, optional): Path of the JSON cache; None disables the cache.
+        max_workers (int, optional): Number of parsing processes. Defaults to the CPU count.
+
+    Returns:
+        dict: Path, as given, to its chain sequences (see `read_chain_sequences`);
+            files that could not be read are left out.
+    """
+    cache = load_cache(cache_path) if cache_path else {}
+    sequences = {}
+    to_parse = []
+    num_cached = 0
+    for pdb_path in pdb_paths:
+        try:
+            stat = os.stat(pdb_path)
+        except OSError as e:
+            print(f'Error processing file {pdb_path}: {e}')
+            continue
+        key = os.path.abspath(pdb_path)
+        entry = cache.get(key)
+        if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            sequences[pdb_path] = entry['chains']
+            num_cached += 1
+        else:
+            to_parse.append((pdb_path, key, stat))
+
+    if to_parse:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parsed = executor.map(
+                try_read_chain_sequences,
+                [pdb_path for pdb_path, _, _ in to_parse],
+                chunksize=max(1, len(to_parse) // (4 * (os.cpu_count() or 1))),
+            )
+            for (pdb_path, key, stat), chains in zip(to_parse, parsed):
+                if chains is None:
+                    continue
+                sequences[pdb_path] = chains
+                cache[key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'chains': chains}
+        if cache_path:
+            save_cache(cache_path, cache)
+
+    print(f"Read the sequences of {len(sequences)} PDB files "
+          f"({len(sequences) - num_cached} parsed, {num_cached} cached)")
+    return sequences
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print the chain sequences of the Accepted PDB files under a folder"
+    )
+    parser.add_argument('parent_folder', help='Folder searched for Accepted folders')
+    parser.add_argument('--cache', default=CACHE_PATH,
+                        help=f'Path of the sequence cache (default: {CACHE_PATH})')
+    args = parser.parse_args()
+
+    for pdb_path, chains in extract_sequences(find_accepted_pdbs(args.parent_folder),
+                                              args.cache).items():
+        print(pdb_path, chains)
+
+
+if __name__ == "__main__":
+    main()
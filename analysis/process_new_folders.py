@@ -3,16 +3,29 @@ This script automates the processing of new data folders from S3.
 It performs the following steps:
 1. Lists folders in a specified S3 bucket and prefix.
 2. Compares this list with a list of already processed folders (from 'final_results.csv').
-3. Downloads any new, unprocessed folders from S3 to a local directory.
-4. Runs a series of analysis scripts (combine_outputs.py, get_ipae_score.py,
-   result_analysis.py) on the data in each newly downloaded folder.
+3. Syncs any new, unprocessed folders from S3 to a local directory,
+   downloading only the objects missing locally (see s3_sync.py).
+4. Combines and scores the newly downloaded folders, and any local folder whose
+   partials are missing or have unscored designs, into per-folder partials,
+   merges the partials of all folders into 'combined_data.csv' and
+   'results_ipae.csv' (see incremental_pipeline.py), and runs result_analysis.py
+   on the merged tables.
+Folders given with --folders are processed again even if already processed.
 """
+import argparse
 import json
 import os
 import subprocess
 import boto3 # type: ignore
 import pandas as pd # type: ignore
 
+import incremental_pipeline
+import s3_sync
+
+# Objects of each run folder to download, see s3_sync.SYNC_PROFILES; "analysis"
+# skips the trajectories, MPNN models, animations and rejected designs
+SYNC_PROFILE = "analysis"
+
 
 # 1. Get S3 folders
 def get_s3_folders(bucket_name, aws_access_key_id, aws_secret_access_key,
@@ -52,42 +65,27 @@ def get_processed_folders():
 # 3. Download new folders from S3
 def download_s3_folder(bucket_name, s3_folder_prefix, local_dir_base, s3_client):
     """
-    Downloads all objects from a specific S3 folder prefix to a local directory.
+    Syncs a specific S3 folder prefix to a local directory, downloading only the
+    objects of SYNC_PROFILE that are missing locally or changed since the last sync.
     """
     # s3_folder_prefix should be the full path like "snake-venom-binder/folder_name/"
     local_folder_path = os.path.join(local_dir_base, os.path.basename(s3_folder_prefix.strip('/')))
-    if not os.path.exists(local_folder_path):
-        os.makedirs(local_folder_path)
-
-    paginator = s3_client.get_paginator('list_objects_v2')
-    for page in paginator.paginate(Bucket=bucket_name, Prefix=s3_folder_prefix):
-        for obj in page.get('Contents', []):
-            s3_key = obj['Key']
-            # Ensure local_file_path is relative to the specific folder being downloaded
-            relative_path = os.path.relpath(s3_key, s3_folder_prefix)
-            local_file_path = os.path.join(local_folder_path, relative_path)
-
-            # Ensure directory for the file exists
-            local_file_dir = os.path.dirname(local_file_path)
-            if not os.path.exists(local_file_dir):
-                os.makedirs(local_file_dir, exist_ok=True)
+    return s3_sync.sync_s3_folder(s3_client, bucket_name, s3_folder_prefix, local_folder_path,
+                                  profile=SYNC_PROFILE)
 
-            # Avoid trying to download directory markers if they appear as objects
-            if not s3_key.endswith('/'):
-                print(f"Downloading {s3_key} to {local_file_path}")
-                s3_client.download_file(bucket_name, s3_key, local_file_path)
-
-
-def check_local_folder(folder_name, base_path='./../out/bindcraft/snake-venom-binder'):
-    """Check if folder exists locally."""
-    folder_path = os.path.join(base_path, folder_name)
-    return os.path.exists(folder_path)
 
 # Main workflow
 def main(): # pylint: disable=too-many-locals
     """
     Main workflow to identify, download, and process new S3 folders.
     """
+    parser = argparse.ArgumentParser(
+        description='Download and process the new BindCraft run folders of S3'
+    )
+    parser.add_argument('--folders', nargs='+', default=[],
+                        help='Folders to process again even if already processed')
+    args = parser.parse_args()
+
     # Load AWS credentials
     try:
         with open('./../config.json', 'r', encoding='utf-8') as f:
@@ -116,51 +114,47 @@ def main(): # pylint: disable=too-many-locals
     processed_folders = get_processed_folders()
     new_folders = set(s3_folders) - processed_folders
 
+    if args.folders:
+        new_folders |= set(args.folders)
+        print(f"Reprocessing requested folder(s): {set(args.folders)}")
+
     if not new_folders:
         print("No new folders to process.")
-        return 
-    else:
-        print(f"Found {len(new_folders)} new folder(s) to process: {new_folders}")
-
-
-    # if not new_folders:
-    #     print("No new folders to process.")
-    #     return
+        return
+    print(f"Found {len(new_folders)} new folder(s) to process: {new_folders}")
 
-    s3_client = boto3.client('s3',
-                             aws_access_key_id=aws_access_key_id,
-                             aws_secret_access_key=aws_secret_access_key)
+    s3_client = s3_sync.make_s3_client(aws_access_key_id, aws_secret_access_key)
 
-    for folder_name in new_folders:
+    synced_folders = []
+    for folder_name in sorted(new_folders):
         print(f"Processing folder: {folder_name}")
 
-        if check_local_folder(folder_name, base_path=local_base_download_dir):
-            print(f"Folder {folder_name} exists locally, skipping download.")
-        else:
-            # Construct the full S3 prefix for the folder to download
-            full_s3_folder_prefix = f"{s3_prefix}{folder_name}/"
-            download_s3_folder(bucket_name, full_s3_folder_prefix,
-                               local_base_download_dir, s3_client)
-
-        # Run the analysis pipeline
-        analysis_scripts = ['combine_outputs.py', 'get_ipae_score.py', 'result_analysis.py']
-        for script_name in analysis_scripts:
-            try:
-                print(f"Running {script_name} for folder {folder_name}...")
-                # Note: These scripts might need to be aware of the specific folder context.
-                # Currently, they seem to operate on fixed file names like 'combined_data.csv'.
-                # This might require the scripts to be run from a specific working directory
-                # or be modified to accept the folder path as an argument.
-                # For now, assuming they are run in a context where they find their inputs.
-                subprocess.run(['python', script_name], check=True, text=True)
-                print(f"Successfully ran {script_name} for folder {folder_name}.")
-            except subprocess.CalledProcessError as e:
-                print(f"Error running {script_name} for folder {folder_name}: {e}")
-                # Decide if we should stop processing this folder or continue
-                break # Stop processing this folder if one script fails
-            except FileNotFoundError:
-                print(f"Error: Script {script_name} not found.")
-                break # Stop processing this folder
+        # Sync even if the folder exists locally, it may be partially downloaded;
+        # only the missing or changed objects are downloaded
+        full_s3_folder_prefix = f"{s3_prefix}{folder_name}/"
+        sync_stats = download_s3_folder(bucket_name, full_s3_folder_prefix,
+                                        local_base_download_dir, s3_client)
+        if sync_stats["failed"]:
+            print(f"{sync_stats['failed']} objects of {folder_name} failed to download, "
+                  "skipping its analysis.")
+            continue
+        synced_folders.append(folder_name)
+
+    # Parse and score only the synced folders, then rebuild combined_data.csv and
+    # results_ipae.csv from the per-folder partials of all folders
+    incremental_pipeline.ingest_folders(synced_folders, local_base_download_dir,
+                                        force=bool(args.folders))
+
+    # Run the analysis of the merged tables once
+    script_name = 'result_analysis.py'
+    try:
+        print(f"Running {script_name}...")
+        subprocess.run(['python', script_name], check=True, text=True)
+        print(f"Successfully ran {script_name}.")
+    except subprocess.CalledProcessError as e:
+        print(f"Error running {script_name}: {e}")
+    except FileNotFoundError:
+        print(f"Error: Script {script_name} not found.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,432 @@
+"""
+Persistent catalog of AlphaFold results, backed by SQLite.
+
+Maps each design name, the hash of its sequence and the prediction settings to
+its '.result.zip' and the af2m binding scores read from it, so scripts look up
+existing results with one indexed query instead of a recursive glob per design.
+The catalog is updated as results are written; `sync` indexes zips that were
+added to the results directory by other means, reading only the new ones. The
+settings of each prediction are also stored in its zip, see `add_zip_settings`,
+so they survive copying the zips or losing the catalog.
+It also records the state of each prediction job, so that an interrupted
+validation run resumes where it stopped.
+
+Usage:
+    python results_catalog.py ./alphafold_results
+"""
+import argparse
+import glob
+import hashlib
+import io
+import json
+import math
+import os
+import sqlite3
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import ipae_scorer
+
+DEFAULT_RESULTS_DIR = "./alphafold_results"
+# States of a prediction job in the jobs table
+JOB_STATES = ("queued", "running", "done", "failed")
+# MSA modes of the predictions, part of their settings, as modal_alphafold.MSA_MODES:
+# paired and unpaired MSAs of all chains, as `modal run modal_alphafold.py` searches
+# them, or the stored target MSA unpaired with single-sequence binders
+MSA_MODES = ("unpaired+paired", "unpaired_target+single_sequence_binders")
+DEFAULT_MSA_MODE = MSA_MODES[0]
+
+
+def sequence_hash(sequence):
+    """
+    Returns the sha256 of a (complex) sequence, e.g. "TARGET:BINDER".
+    """
+    return hashlib.sha256(sequence.encode()).hexdigest()
+
+
+def settings_key(**settings):
+    """
+    Returns a canonical string of prediction settings, e.g. models and num_recycles.
+    """
+    return json.dumps(settings, sort_keys=True)
+
+
+# Settings of the results `modal run modal_alphafold.py` wrote before result zips stored
+# their settings: model 1, 1 recycle and ColabFold's paired and unpaired MSAs
+LEGACY_SETTINGS = settings_key(models=[1], num_recycles=1, msa_mode=DEFAULT_MSA_MODE)
+# Suffix of the result zip member storing the prediction settings
+SETTINGS_SUFFIX = ".settings.json"
+
+
+def add_zip_settings(zip_content, name, settings):
+    """
+    Returns the content of a result zip with its prediction settings stored in it, as
+    the '<name>.settings.json' member `sync` reads back.
+
+    Args:
+        zip_content (bytes): Content of the result zip.
+        name (str): Design name of the result.
+        settings (str): Prediction settings, from `settings_key`.
+    """
+    result_zip = io.BytesIO(zip_content)
+    with zipfile.ZipFile(result_zip, "a") as zip_ref:
+        zip_ref.writestr(f"{name}{SETTINGS_SUFFIX}", settings)
+    return result_zip.getvalue()
+
+
+def read_zip_settings(result_zip):
+    """
+    Returns the prediction settings stored in a result zip, or None for zips written
+    before they were stored.
+    """
+    with zipfile.ZipFile(result_zip) as zip_ref:
+        members = [member for member in zip_ref.namelist() if member.endswith(SETTINGS_SUFFIX)]
+        return zip_ref.read(members[0]).decode() if members else None
+
+
+def job_hash(sequence, settings=None):
+    """
+    Returns the hash of a prediction job: its (complex) sequence and settings.
+    """
+    return hashlib.sha256(f"{sequence}\n{settings or ''}".encode()).hexdigest()
+
+
+def group_jobs(designs, settings=None):
+    """
+    Groups designs that would run the same prediction job.
+
+    Args:
+        designs (Iterable[tuple[str, str]]): (design name, complex sequence) pairs,
+            e.g. "TARGET:BINDER".
+        settings (str, optional): Prediction settings, from `settings_key`.
+
+    Returns:
+        dict: Job hash to the (design name, sequence) pairs of the job, in input order;
+            the first design of each job is the one to predict.
+    """
+    jobs = {}
+    for design, sequence in designs:
+        jobs.setdefault(job_hash(sequence, settings), []).append((design, sequence))
+    return jobs
+
+
+def report_duplicate_jobs(jobs, report_csv=None):
+    """
+    Prints how many predictions the designs sharing a job would have duplicated.
+
+    Args:
+        jobs (dict): Jobs, as from `group_jobs`.
+        report_csv (str, optional): Writes Design, Representative and Job for each
+            design that reuses the prediction of another design.
+
+    Returns:
+        int: Number of duplicated predictions.
+    """
+    duplicates = [
+        {"Design": design, "Representative": job_designs[0][0], "Job": job}
+        for job, job_designs in jobs.items()
+        for design, _ in job_designs[1:]
+    ]
+    num_designs = len(duplicates) + len(jobs)
+    if duplicates:
+        print(
+            f"{num_designs} designs share {len(jobs)} unique prediction jobs; "
+            f"{len(duplicates)} duplicated predictions "
+            f"({len(duplicates) / num_designs:.1%} of the GPU jobs) are skipped"
+        )
+    if report_csv is not None:
+        pd.DataFrame(duplicates, columns=["Design", "Representative", "Job"]).to_csv(
+            report_csv, index=False
+        )
+    return len(duplicates)
+
+
+class ResultsCatalog:
+    """
+    SQLite catalog of result zips and their scores.
+
+    Lookups match the sequence hash and settings exactly. Results indexed by `sync`
+    get the sequence of their predicted structure and the settings passed to it.
+    """
+
+    def __init__(self, results_dir=DEFAULT_RESULTS_DIR, db_path=None):
+        self.results_dir = results_dir
+        os.makedirs(results_dir, exist_ok=True)
+        self.connection = sqlite3.connect(db_path or os.path.join(results_dir, "catalog.sqlite"))
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                design TEXT NOT NULL,
+                sequence_hash TEXT,
+                settings TEXT,
+                result_zip TEXT NOT NULL UNIQUE,
+                ipae REAL,
+                scores TEXT
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_design ON results (design, sequence_hash)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_sequence ON results (sequence_hash)"
+        )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job TEXT PRIMARY KEY,
+                design TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+            """
+        )
+        self.connection.commit()
+
+    def add(self, design, result_zip, sequence=None, settings=None, scores=None, commit=True):
+        """
+        Records a result zip, reading its scores from the zip if not given.
+
+        Args:
+            design (str): Design name.
+            result_zip (str): Path to the result zip.
+            sequence (str, optional): Sequence the design was predicted with.
+            settings (str, optional): Prediction settings, from `settings_key`.
+            scores (dict, optional): Flattened scores, as from `ipae_scorer`.
+            commit (bool, optional): Commit right away; pass False when adding many.
+        """
+        if scores is None:
+            scores = ipae_scorer.score_result_zip(design, result_zip)
+        scores = {k: v for k, v in scores.items() if k not in ("Design", "result_zip")}
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                design,
+                sequence_hash(sequence) if sequence else None,
+                settings,
+                os.path.abspath(result_zip),
+                scores.get("ipae_0"),
+                json.dumps(scores),
+            ),
+        )
+        if commit:
+            self.connection.commit()
+
+    def lookup(self, design, sequence=None, settings=None):
+        """
+        Returns the catalogued result of a design, or None.
+
+        Args:
+            design (str): Design name.
+            sequence (str, optional): Only match results of this sequence.
+            settings (str, optional): Only match results of these settings.
+
+        Returns:
+            dict or None: design, result_zip, ipae and the flattened scores.
+        """
+        query = "SELECT design, result_zip, ipae, scores FROM results WHERE design = ?"
+        params = [design]
+        if sequence is not None:
+            query += " AND sequence_hash = ?"
+            params.append(sequence_hash(sequence))
+        return self._first_existing(query, params, settings)
+
+    def lookup_sequence(self, sequence, settings=None):
+        """
+        Returns a catalogued result of any design predicted with a sequence, or None.
+
+        Used to fan the result of one prediction out to every design sharing its job.
+
+        Args:
+            sequence (str): Complex sequence, e.g. "TARGET:BINDER".
+            settings (str, optional): Only match results of these settings.
+
+        Returns:
+            dict or None: As `lookup`; "design" is the design that was predicted.
+        """
+        query = "SELECT design, result_zip, ipae, scores FROM results WHERE sequence_hash = ?"
+        return self._first_existing(query, [sequence_hash(sequence)], settings)
+
+    def _first_existing(self, query, params, settings=None):
+        """
+        Returns the first row of a query whose result zip still exists, as a dict.
+        """
+        if settings is not None:
+            query += " AND settings = ?"
+            params = [*params, settings]
+
+        for design_name, result_zip, ipae, scores in self.connection.execute(query, params):
+            if os.path.exists(result_zip):
+                return {
+                    "design": design_name,
+                    "result_zip": result_zip,
+                    "ipae": ipae,
+                    "scores": json.loads(scores) if scores else {},
+                }
+        return None
+
+    def sync(self, settings=None, max_workers=16):
+        """
+        Indexes the result zips of the results directory that are not catalogued yet.
+
+        Each zip is recorded with the sequence of its predicted structure and the
+        settings stored in it, so it only matches lookups of that sequence and those
+        settings. Rows catalogued without settings are backfilled the same way.
+
+        Args:
+            settings (str, optional): Settings of the zips that store none, e.g.
+                LEGACY_SETTINGS; without them, those zips match no settings lookup.
+            max_workers (int, optional): Threads reading the zips.
+
+        Returns:
+            int: Number of newly indexed zips.
+        """
+        known = {row[0] for row in self.connection.execute("SELECT result_zip FROM results")}
+        new_zips = {}
+        for result_zip in sorted(glob.glob(f"{self.results_dir}/**/*.result.zip", recursive=True)):
+            if os.path.abspath(result_zip) not in known:
+                name = os.path.basename(result_zip)[:-len(".result.zip")]
+                new_zips.setdefault(name, result_zip)
+        self._backfill(settings, max_workers)
+        if not new_zips:
+            return 0
+
+        scores_df = ipae_scorer.score_result_zips(new_zips, max_workers)
+        with ThreadPoolExecutor(max_workers) as executor:
+            sequences = dict(zip(
+                scores_df["result_zip"],
+                executor.map(ipae_scorer.read_complex_sequence, scores_df["result_zip"]),
+            ))
+            zip_settings = dict(zip(
+                scores_df["result_zip"],
+                executor.map(read_zip_settings, scores_df["result_zip"]),
+            ))
+        for scores in scores_df.to_dict(orient="records"):
+            # drop the columns of fields this zip does not have, e.g. a second binder
+            scores = {
+                k: v for k, v in scores.items() if not (isinstance(v, float) and math.isnan(v))
+            }
+            self.add(
+                scores["Design"], scores["result_zip"], sequences[scores["result_zip"]],
+                zip_settings[scores["result_zip"]] or settings, scores=scores, commit=False,
+            )
+        self.connection.commit()
+        print(f"Indexed {len(new_zips)} new result zips in the catalog")
+        return len(new_zips)
+
+    def _backfill(self, settings, max_workers):
+        """
+        Records the settings, and the sequence if missing, of rows catalogued without settings.
+        """
+        legacy_zips = [
+            result_zip
+            for result_zip, in self.connection.execute(
+                "SELECT result_zip FROM results WHERE settings IS NULL"
+            )
+            if os.path.exists(result_zip)
+        ]
+        if not legacy_zips:
+            return
+        with ThreadPoolExecutor(max_workers) as executor:
+            sequences = executor.map(ipae_scorer.read_complex_sequence, legacy_zips)
+            zip_settings = executor.map(read_zip_settings, legacy_zips)
+            self.connection.executemany(
+                """
+                UPDATE results SET
+                    sequence_hash = COALESCE(sequence_hash, ?),
+                    settings = COALESCE(settings, ?)
+                WHERE result_zip = ?
+                """,
+                [
+                    (
+                        sequence_hash(sequence) if sequence else None,
+                        result_settings or settings,
+                        result_zip,
+                    )
+                    for result_zip, sequence, result_settings in zip(
+                        legacy_zips, sequences, zip_settings
+                    )
+                ],
+            )
+        self.connection.commit()
+        print(f"Backfilled the sequence and settings of {len(legacy_zips)} catalogued result zips")
+
+    def set_job_state(self, job, design, state, error=None):
+        """
+        Records the state of a prediction job, so an interrupted run can be resumed.
+
+        Args:
+            job (str): Job hash, from `job_hash`.
+            design (str): Design the job is predicted under.
+            state (str): One of JOB_STATES; "running" counts an attempt.
+            error (str, optional): Error of a failed job.
+        """
+        assert state in JOB_STATES, f"unknown job state: {state}"
+        self.connection.execute(
+            """
+            INSERT INTO jobs (job, design, state, attempts, error) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (job) DO UPDATE SET
+                design = excluded.design,
+                state = excluded.state,
+                attempts = attempts + excluded.attempts,
+                error = excluded.error
+            """,
+            (job, design, state, int(state == "running"), error),
+        )
+        self.connection.commit()
+
+    def job_states(self):
+        """
+        Returns the recorded state of each prediction job.
+
+        Returns:
+            dict: Job hash to a dict of design, state, attempts and error.
+        """
+        return {
+            job: {"design": design, "state": state, "attempts": attempts, "error": error}
+            for job, design, state, attempts, error in self.connection.execute(
+                "SELECT job, design, state, attempts, error FROM jobs"
+            )
+        }
+
+    def scores(self, designs=None):
+        """
+        Returns the flattened scores of the catalogued designs as a DataFrame.
+
+        Args:
+            designs (Iterable[str], optional): Only these designs.
+        """
+        rows = [
+            {"Design": design, "result_zip": result_zip, **json.loads(scores or "{}")}
+            for design, result_zip, scores in self.connection.execute(
+                "SELECT design, result_zip, scores FROM results"
+            )
+        ]
+        scores_df = pd.DataFrame(rows, columns=None if rows else ["Design", "result_zip"])
+        if designs is not None:
+            scores_df = scores_df[scores_df["Design"].isin(list(designs))]
+        return scores_df
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Index the AlphaFold result zips of a directory into its results catalog'
+    )
+    parser.add_argument(
+        'results_dir',
+        nargs='?',
+        default=DEFAULT_RESULTS_DIR,
+        help=f'Directory with the .result.zip files (default: {DEFAULT_RESULTS_DIR})'
+    )
+    args = parser.parse_args()
+
+    catalog = ResultsCatalog(args.results_dir)
+    catalog.sync(settings=LEGACY_SETTINGS)
+    print(catalog.scores().head())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Syncs S3 folders (prefixes) to local directories, downloading only what changed.
+
+Each prefix is listed once and its keys, sizes and ETags are compared with a
+manifest kept in the local directory ('.s3_manifest.json'). Only missing or
+changed objects are downloaded, across a bounded thread pool sharing one client
+and one multipart transfer config. Files are downloaded to a temporary name and
+renamed when complete, so an interrupted sync never leaves a half-written file
+that a later sync would take as done.
+
+A sync profile (SYNC_PROFILES) selects the objects to download with include and
+exclude globs relative to the folder; "**" matches across directories and "*"
+does not. The "analysis" profile fetches only what the analysis scripts read.
+
+The S3 client is passed in, so a local S3 stand-in (moto, MinIO) can be used by
+creating it with `make_s3_client(..., endpoint_url=...)`.
+
+Usage:
+    python s3_sync.py bindcraft snake-venom-binder/2502152323/ ./out/2502152323
+"""
+import argparse
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import boto3 # type: ignore
+from boto3.exceptions import S3TransferFailedError # type: ignore
+from boto3.s3.transfer import TransferConfig # type: ignore
+from botocore.config import Config # type: ignore
+from botocore.exceptions import ClientError # type: ignore
+
+MANIFEST_NAME = ".s3_manifest.json"
+# Number of objects downloaded concurrently
+MAX_WORKERS = 16
+# Objects over 16 MB are downloaded in 8 MB parts, 4 parts at a time
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+)
+
+# Include/exclude globs of each sync profile, relative to a BindCraft run folder;
+# "analysis" has what combine_outputs.py and result_analysis.py read, including the
+# accepted PDBs of the worker{i} folders of a fan-out run
+SYNC_PROFILES = {
+    "analysis": {
+        "include": ["final_design_stats.csv", "**/Accepted/*.pdb"],
+        "exclude": [],
+    },
+    "full": {
+        "include": ["**"],
+        "exclude": [],
+    },
+}
+
+
+def glob_to_regex(pattern):
+    """
+    Compiles a path glob: "**" matches across directories, "*" and "?" do not.
+    """
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex, i = regex + "(?:.*/)?", i + 3
+        elif pattern.startswith("**", i):
+            regex, i = regex + ".*", i + 2
+        elif pattern[i] == "*":
+            regex, i = regex + "[^/]*", i + 1
+        elif pattern[i] == "?":
+            regex, i = regex + "[^/]", i + 1
+        else:
+            regex, i = regex + re.escape(pattern[i]), i + 1
+    return re.compile(regex + r"\Z")
+
+
+def select_objects(objects, profile):
+    """
+    Splits listed objects into those a sync profile includes and those it does not.
+
+    Args:
+        objects (dict): Relative path to object, as from `list_objects`.
+        profile (str): Name of a profile of SYNC_PROFILES.
+
+    Returns:
+        tuple[dict, dict]: The included and the excluded objects.
+    """
+    include = [glob_to_regex(p) for p in SYNC_PROFILES[profile]["include"]]
+    exclude = [glob_to_regex(p) for p in SYNC_PROFILES[profile]["exclude"]]
+    included, excluded = {}, {}
+    for relative_path, obj in objects.items():
+        relative_posix = relative_path.replace(os.sep, "/")
+        if any(r.match(relative_posix) for r in include) \
+                and not any(r.match(relative_posix) for r in exclude):
+            included[relative_path] = obj
+        else:
+            excluded[relative_path] = obj
+    return included, excluded
+
+
+def make_s3_client(aws_access_key_id=None, aws_secret_access_key=None, endpoint_url=None,
+                   max_workers=MAX_WORKERS):
+    """
+    Creates an S3 client with enough pooled connections for a concurrent sync.
+
+    Args:
+        aws_access_key_id (str, optional): Access key, else boto3's default credentials.
+        aws_secret_access_key (str, optional): Secret key.
+        endpoint_url (str, optional): URL of a local S3 stand-in, e.g. a MinIO or moto server.
+        max_workers (int, optional): Number of objects downloaded concurrently.
+    """
+    return boto3.client(
+        's3',
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        endpoint_url=endpoint_url,
+        config=Config(max_pool_connections=max_workers * TRANSFER_CONFIG.max_concurrency),
+    )
+
+
+def list_objects(s3_client, bucket_name, prefix, include_markers=False):
+    """
+    Lists the objects under a prefix, once.
+
+    Args:
+        include_markers (bool, optional): Also list the directory marker objects, keys
+            ending in "/", under their key relative to the prefix (e.g. "" for the
+            marker of the prefix itself, "Accepted/").
+
+    Returns:
+        dict: Key relative to the prefix to {"key", "size", "etag"}; directory markers
+            are left out unless `include_markers`.
+    """
+    objects = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('/'):
+                if not include_markers:
+                    continue
+                relative_path = obj['Key'][len(prefix):]
+            else:
+                relative_path = os.path.relpath(obj['Key'], prefix)
+            objects[relative_path] = {
+                "key": obj['Key'],
+                "size": obj['Size'],
+                "etag": obj['ETag'].strip('"'),
+            }
+    return objects
+
+
+def load_manifest(local_dir):
+    """
+    Reads the manifest of a synced directory: relative path to {"size", "etag"}.
+    """
+    try:
+        with open(os.path.join(local_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(local_dir, manifest):
+    """
+    Writes the manifest of a synced directory, atomically.
+    """
+    manifest_path = os.path.join(local_dir, MANIFEST_NAME)
+    with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def diff_objects(remote, manifest, local_dir):
+    """
+    Returns the relative paths of the remote objects that need downloading.
+
+    An object is up to date if the manifest has its size and ETag and the local file
+    has its size. Files without a manifest entry, e.g. from before manifests were kept,
+    are adopted if their size matches; `manifest` is updated with them.
+    """
+    to_download = []
+    for relative_path, obj in remote.items():
+        local_path = os.path.join(local_dir, relative_path)
+        try:
+            local_size = os.path.getsize(local_path)
+        except OSError:
+            to_download.append(relative_path)
+            continue
+
+        entry = manifest.get(relative_path)
+        if entry is None and local_size == obj["size"]:
+            manifest[relative_path] = {"size": obj["size"], "etag": obj["etag"]}
+        elif entry != {"size": obj["size"], "etag": obj["etag"]} or local_size != obj["size"]:
+            to_download.append(relative_path)
+    return to_download
+
+
+def sync_s3_folder(s3_client, bucket_name, prefix, local_dir, max_workers=MAX_WORKERS,
+                   transfer_config=TRANSFER_CONFIG, profile="full"):
+    """
+    Downloads the missing or changed objects under an S3 prefix to a local directory.
+
+    Args:
+        s3_client: boto3 S3 client, e.g. from `make_s3_client`.
+        bucket_name (str): Bucket name.
+        prefix (str): Folder prefix, e.g. "snake-venom-binder/2502152323/".
+        local_dir (str): Local directory mirroring the prefix.
+        max_workers (int, optional): Number of objects downloaded concurrently.
+        transfer_config (TransferConfig, optional): Multipart settings of each download.
+        profile (str, optional): Sync profile of SYNC_PROFILES selecting the objects.
+            Defaults to "full".
+
+    Returns:
+        dict: Number of objects listed, excluded by the profile, downloaded, up to date
+            and failed, the bytes downloaded and the bytes the profile avoided.
+    """
+    os.makedirs(local_dir, exist_ok=True)
+    remote, excluded = select_objects(list_objects(s3_client, bucket_name, prefix), profile)
+    manifest = load_manifest(local_dir)
+    to_download = diff_objects(remote, manifest, local_dir)
+    stats = {
+        "listed": len(remote) + len(excluded),
+        "excluded": len(excluded),
+        "downloaded": 0,
+        "up_to_date": len(remote) - len(to_download),
+        "failed": 0,
+        "bytes": 0,
+        "bytes_avoided": sum(obj["size"] for obj in excluded.values()),
+    }
+    print(f"{prefix}: {len(to_download)} of {len(remote)} objects to download, "
+          f"{len(excluded)} excluded by the {profile!r} profile "
+          f"({stats['bytes_avoided'] / 1e6:.1f} MB avoided)")
+
+    manifest_lock = threading.Lock()
+
+    def download(relative_path):
+        obj = remote[relative_path]
+        local_path = os.path.join(local_dir, relative_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        s3_client.download_file(bucket_name, obj["key"], f"{local_path}.part",
+                                Config=transfer_config)
+        os.replace(f"{local_path}.part", local_path)
+        with manifest_lock:
+            manifest[relative_path] = {"size": obj["size"], "etag": obj["etag"]}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(download, path): path for path in to_download}
+            for future in as_completed(futures):
+                relative_path = futures[future]
+                try:
+                    future.result()
+                except (ClientError, S3TransferFailedError, OSError) as e:
+                    print(f"Error downloading {remote[relative_path]['key']}: {e}")
+                    stats["failed"] += 1
+                    continue
+                stats["downloaded"] += 1
+                stats["bytes"] += remote[relative_path]["size"]
+    finally:
+        # also after an interruption, so completed downloads are not fetched again
+        with manifest_lock:
+            save_manifest(local_dir, manifest)
+
+    print(f"{prefix}: downloaded {stats['downloaded']} objects "
+          f"({stats['bytes'] / 1e6:.1f} MB), {stats['up_to_date']} up to date, "
+          f"{stats['failed']} failed")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Download the missing or changed objects of an S3 folder'
+    )
+    parser.add_argument('bucket', help='Bucket name')
+    parser.add_argument('prefix', help='Folder prefix, ending with "/"')
+    parser.add_argument('local_dir', help='Local directory mirroring the prefix')
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        default=MAX_WORKERS,
+        help=f'Number of objects downloaded concurrently (default: {MAX_WORKERS})'
+    )
+    parser.add_argument(
+        '--profile',
+        choices=sorted(SYNC_PROFILES),
+        default='full',
+        help='Sync profile selecting the objects to download (default: full)'
+    )
+    parser.add_argument(
+        '--endpoint-url',
+        help='URL of a local S3 stand-in, e.g. http://localhost:5000 for moto_server'
+    )
+    args = parser.parse_args()
+
+    s3_client = make_s3_client(endpoint_url=args.endpoint_url, max_workers=args.max_workers)
+    sync_s3_folder(s3_client, args.bucket, args.prefix, args.local_dir, args.max_workers,
+                   profile=args.profile)
+
+
+if __name__ == "__main__":
+    main()
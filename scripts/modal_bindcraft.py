@@ -16,14 +16,24 @@ Approximate cost for 3 designs, PDL1.pdb only:
 """
 
 import os
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
-from modal import App, Image
+from modal import App, Dict, Image, Volume
 
 # It is harder to provision GPUs if you set the timeout too high
 GPU = os.environ.get("GPU", "L40S")
 TIMEOUT = int(os.environ.get("TIMEOUT", 300))
-print(f"Using GPU {GPU}; TIMEOUT {TIMEOUT}")
+# CPU cores for the PyRosetta scoring workers that run alongside the GPU
+CPU = float(os.environ.get("CPU", 8))
+print(f"Using GPU {GPU}; TIMEOUT {TIMEOUT}; CPU {CPU}")
+
+PYROSETTA_FLAGS = (
+    "-ignore_unrecognized_res -ignore_zero_occupancy -mute all"
+    " -holes:dalphaball {dalphaball_path} -corrections::beta_nov16 true"
+    " -relax:default_repeats 1"
+)
 
 
 def set_up_pyrosetta():
@@ -51,11 +61,6 @@ image = (
     .run_commands(
         "ln -s /usr/local/lib/python3.*/dist-packages/colabdesign colabdesign && mkdir /params"
     )
-    .run_commands(
-        "aria2c -q -x 16 https://storage.googleapis.com/alphafold/alphafold_params_2022-12-06.tar"
-        " && mkdir -p /root/bindcraft/params"
-        " && tar -xf alphafold_params_2022-12-06.tar -C /root/bindcraft/params"
-    )
     .run_function(set_up_pyrosetta)
     .pip_install(
         "numpy<2.0",  # Re-enforce after pyrosetta (which may upgrade it)
@@ -67,8 +72,859 @@ image = (
 
 app = App("bindcraft", image=image)
 
+# Model weights live on a volume shared with the other apps instead of in the images;
+# populate it once with `modal run scripts/modal_bindcraft.py::populate_weights`
+WEIGHTS_DIR = "/weights"
+weights_volume = Volume.from_name("model-weights", create_if_missing=True)
+AF2_PARAMS_URL = (
+    "https://storage.googleapis.com/alphafold/alphafold_params_2022-12-06.tar"
+)
+AF2_PARAMS_DIR = f"{WEIGHTS_DIR}/af2"
+
+# Time this module was imported, i.e. the container started, for the latency metric
+CONTAINER_START = time.time()
+
+# Budget slots claimed by the workers of fan-out runs, see `SharedBudget`
+counters = Dict.from_name("bindcraft-counters", create_if_missing=True)
+
+# Design outputs are written straight to this volume and committed after every
+# trajectory, so a run that hits the timeout or is preempted keeps every finished
+# trajectory
+RUNS_DIR = "/runs"
+runs_volume = Volume.from_name("bindcraft-runs", create_if_missing=True)
+
+# Heavy folders that are only pulled locally when explicitly requested
+HEAVY_OUTPUT_DIRS = ("Trajectory", "Animation")
+
+# Counters of a run, rewritten after every trajectory so it can be resumed
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+class SharedBudget:
+    """Trajectory and accepted-design budgets shared by the workers of a fan-out run.
+
+    Each budget is split into numbered slots in the `counters` Dict, e.g.
+    "{run_id}/accepted/{n}". A worker claims a slot with one atomic
+    `put(..., skip_if_exists=True)`, so no two workers claim the same slot and the run
+    stops at exactly `number_of_final_designs` accepted designs and `max_trajectories`
+    trajectories. Slots are claimed in order and never released, so the last slot of
+    a budget is taken once the budget is used up.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        worker_id: int,
+        number_of_final_designs: int,
+        max_trajectories: int | None = None,
+    ):
+        self.run_id = run_id
+        self.worker_id = worker_id
+        self.limits = {
+            "trajectories": max_trajectories,
+            "accepted": number_of_final_designs,
+        }
+        # first slot of each budget this worker has not seen taken yet
+        self.next_slots = {"trajectories": 0, "accepted": 0}
+
+    def claim(self, budget: str) -> bool:
+        """Claims one slot of the "trajectories" or "accepted" budget.
+
+        Returns False if all slots of the budget are taken.
+        """
+        limit = self.limits[budget]
+        if limit is None:
+            return True
+        while self.next_slots[budget] < limit:
+            slot = self.next_slots[budget]
+            self.next_slots[budget] += 1
+            if counters.put(
+                f"{self.run_id}/{budget}/{slot}", self.worker_id, skip_if_exists=True
+            ):
+                return True
+        return False
+
+    def restore(self, trajectories: int, accepted: int):
+        """Claims the slots of the trajectories and designs of a resumed worker."""
+        for _ in range(trajectories):
+            self.claim("trajectories")
+        for _ in range(accepted):
+            self.claim("accepted")
+
+    def exhausted(self, budgets: tuple[str, ...] = ("trajectories", "accepted")) -> bool:
+        """True once the run reached its global design target or trajectory budget."""
+        for budget in budgets:
+            limit = self.limits[budget]
+            if limit is not None and counters.contains(
+                f"{self.run_id}/{budget}/{limit - 1}"
+            ):
+                print(f"Global {budget} budget of {limit} reached")
+                return True
+        return False
+
+
+def save_checkpoint(
+    design_path: str,
+    trajectory_n: int,
+    accepted_designs: int,
+    tried_trajectories: set[tuple[int, int]],
+):
+    """Writes the counters of a run to `CHECKPOINT_FILE` in its design directory."""
+    import json
+
+    checkpoint = {
+        "trajectory_n": trajectory_n,
+        "accepted_designs": accepted_designs,
+        "tried_trajectories": sorted(tried_trajectories),
+    }
+    checkpoint_path = os.path.join(design_path, CHECKPOINT_FILE)
+    with open(checkpoint_path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+
+def load_checkpoint(
+    design_path: str, design_paths: dict
+) -> tuple[int, int, set[tuple[int, int]]]:
+    """Restores the counters of a previous run from its design directory.
+
+    Uses `CHECKPOINT_FILE` if present. Otherwise the counters are re-derived from
+    `trajectory_stats.csv`, the trajectory PDBs and the accepted designs on disk.
+
+    Args:
+        design_path (str): Design directory of the run.
+        design_paths (dict): Sub-directories of the run, as from `generate_directories`.
+
+    Returns:
+        tuple[int, int, set[tuple[int, int]]]: The next `trajectory_n`, the number of
+            `accepted_designs` and the set of already tried `(length, seed)` pairs.
+    """
+    import json
+    import re
+
+    import pandas as pd
+
+    checkpoint_path = os.path.join(design_path, CHECKPOINT_FILE)
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        return (
+            checkpoint["trajectory_n"],
+            checkpoint["accepted_designs"],
+            {tuple(pair) for pair in checkpoint["tried_trajectories"]},
+        )
+
+    tried_trajectories = set()
+    trajectory_csv = os.path.join(design_path, "trajectory_stats.csv")
+    if os.path.exists(trajectory_csv):
+        trajectory_df = pd.read_csv(trajectory_csv, usecols=["Length", "Seed"])
+        tried_trajectories.update(
+            zip(trajectory_df["Length"].astype(int), trajectory_df["Seed"].astype(int))
+        )
+
+    # terminated trajectories only leave a PDB behind
+    name_pattern = re.compile(r"_l(\d+)_s(\d+)\.pdb$")
+    for trajectory_dir in [
+        "Trajectory",
+        "Trajectory/Relaxed",
+        "Trajectory/LowConfidence",
+        "Trajectory/Clashing",
+    ]:
+        for f in os.listdir(design_paths[trajectory_dir]):
+            match = name_pattern.search(f)
+            if match:
+                tried_trajectories.add((int(match.group(1)), int(match.group(2))))
+
+    accepted_designs = len(
+        [f for f in os.listdir(design_paths["Accepted"]) if f.endswith(".pdb")]
+    )
+    return len(tried_trajectories) + 1, accepted_designs, tried_trajectories
+
+
+class StatsStore:
+    """Buffers the statistics CSVs of a run in memory and appends them once per trajectory.
+
+    Rows are rendered with `csv.writer` exactly like `insert_data`, so the CSVs on disk
+    are byte-identical to writing each row directly. The MPNN sequences are kept in a
+    set for deduplication, and failure counts are accumulated as deltas that are added
+    to `failure_csv` on flush, on top of the counts BindCraft itself writes there.
+    """
+
+    def __init__(self, mpnn_csv: str, failure_csv: str):
+        import pandas as pd
+
+        self.failure_csv = failure_csv
+        self.buffers = {}
+        self.failures = {}
+        self.mpnn_sequences = set(
+            pd.read_csv(mpnn_csv, usecols=["Sequence"])["Sequence"].values
+        )
+
+    def insert(self, csv_path: str, row: list):
+        """Buffers a row for `csv_path`, as `insert_data` would append it."""
+        import csv
+        import io
+
+        line = io.StringIO()
+        csv.writer(line).writerow(row)
+        self.buffers.setdefault(csv_path, []).append(line.getvalue())
+
+    def insert_mpnn(self, mpnn_csv: str, row: list):
+        """Buffers a row of `mpnn_csv` and records its sequence as sampled."""
+        self.insert(mpnn_csv, row)
+        self.mpnn_sequences.add(row[6])
+
+    def add_failures(self, filter_conditions: list[str]):
+        """Counts the failed filters of a design once per base filter name."""
+        special_prefixes = ("Average_", "1_", "2_", "3_", "4_", "5_")
+        incremented_columns = set()
+        for column in filter_conditions:
+            base_column = column
+            for prefix in special_prefixes:
+                if column.startswith(prefix):
+                    base_column = column.split("_", 1)[1]
+            incremented_columns.add(base_column)
+
+        for base_column in incremented_columns:
+            self.failures[base_column] = self.failures.get(base_column, 0) + 1
+
+    def flush(self):
+        """Appends the buffered rows and adds the failure counts to their CSVs."""
+        import pandas as pd
+
+        for csv_path, lines in self.buffers.items():
+            if lines:
+                with open(csv_path, "a", newline="") as f:
+                    f.writelines(lines)
+        self.buffers = {}
+
+        if self.failures:
+            failure_df = pd.read_csv(self.failure_csv)
+            for column, count in self.failures.items():
+                failure_df[column] = failure_df[column] + count
+            failure_df.to_csv(self.failure_csv, index=False)
+            self.failures = {}
+
+
+class PredictionModelCache:
+    """Per-container LRU cache of compiled AF2 prediction models.
+
+    Models are keyed by (length, protocol, multimer flag, number of recycles), so a
+    trajectory whose binder length was already seen reuses the traced and compiled
+    models instead of building new ones with `mk_afdesign_model` and `prep_inputs`.
+    The cached models must survive the `clear_mem` of each trajectory, see `protect`.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        from collections import OrderedDict
+
+        self.maxsize = maxsize
+        self.models = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def protect(self, function):
+        """Keeps the cached models usable during a call of a BindCraft `function`.
+
+        `binder_hallucination` calls ColabDesign's `clear_mem` before each trajectory,
+        which deletes every live device buffer, including those of the cached models.
+        While models are cached, `clear_mem` is replaced in the module of `function` by
+        a garbage collection, which still frees the buffers no longer referenced, and
+        restored when the block exits.
+        """
+        import gc
+
+        if not self.models:
+            yield
+            return
+
+        namespace = function.__globals__
+        clear_mem = namespace["clear_mem"]
+        namespace["clear_mem"] = gc.collect
+        try:
+            yield
+        finally:
+            namespace["clear_mem"] = clear_mem
+
+    def evict(self):
+        """Drops the least recently used model and frees its device buffers."""
+        import gc
+
+        _, model = self.models.popitem(last=False)
+        del model
+        gc.collect()
+
+    def get(
+        self,
+        length: int,
+        protocol: str,
+        use_multimer: bool,
+        target_settings: dict,
+        advanced_settings: dict,
+    ):
+        """Returns the prepared model for the key, building it on a cache miss.
+
+        Args:
+            length (int): Binder length.
+            protocol (str): "binder" for the complex model or "hallucination" for the
+                            binder monomer model.
+            use_multimer (bool): Whether to use the AF2 multimer weights.
+            target_settings (dict): Target settings of the run.
+            advanced_settings (dict): Advanced settings of the run.
+
+        Returns:
+            The prepared ColabDesign model.
+        """
+        from bindcraft.functions import mk_afdesign_model
+
+        num_recycles = advanced_settings["num_recycles_validation"]
+        key = (int(length), protocol, use_multimer, num_recycles)
+        if key in self.models:
+            self.hits += 1
+            self.models.move_to_end(key)
+            return self.models[key]
+
+        self.misses += 1
+        while self.models and len(self.models) >= max(self.maxsize, 1):
+            self.evict()
+
+        if protocol == "binder":
+            model = mk_afdesign_model(
+                protocol="binder",
+                num_recycles=num_recycles,
+                data_dir=advanced_settings["af_params_dir"],
+                use_multimer=use_multimer,
+            )
+            model.prep_inputs(
+                pdb_filename=target_settings["starting_pdb"],
+                chain=target_settings["chains"],
+                binder_len=length,
+                rm_target_seq=advanced_settings["rm_template_seq_predict"],
+                rm_target_sc=advanced_settings["rm_template_sc_predict"],
+            )
+        elif protocol == "hallucination":
+            model = mk_afdesign_model(
+                protocol="hallucination",
+                use_templates=False,
+                initial_guess=False,
+                use_initial_atom_pos=False,
+                num_recycles=num_recycles,
+                data_dir=advanced_settings["af_params_dir"],
+                use_multimer=use_multimer,
+            )
+            model.prep_inputs(length=length)
+        else:
+            raise ValueError(f"Unsupported prediction protocol: {protocol}")
+
+        if self.maxsize > 0:
+            self.models[key] = model
+        return model
+
+
+def predict_mpnn_chunk(
+    complex_prediction_model,
+    binder_prediction_model,
+    mpnn_sequences: list[dict],
+    mpnn_design_names: list[str],
+    length: int,
+    trajectory_pdb: str,
+    binder_chain: str,
+    prediction_models: list[int],
+    target_settings: dict,
+    advanced_settings: dict,
+    filters: dict,
+    design_paths: dict,
+    failure_csv: str,
+) -> dict:
+    """Predicts a chunk of equal-length MPNN sequences sequentially on the GPU.
+
+    Each sequence is predicted with its own `predict_binder_complex` and
+    `predict_binder_alone` call. All complexes of the chunk are predicted first, then
+    the binders that passed the AF2 filters are predicted alone, so the compiled models
+    are kept busy without interleaving the CPU-bound scoring of each design.
+
+    Args:
+        complex_prediction_model: Compiled complex prediction model for `length`.
+        binder_prediction_model: Compiled binder monomer prediction model for `length`.
+        mpnn_sequences (list[dict]): MPNN sequences with "seq", "score" and "seqid".
+        mpnn_design_names (list[str]): Design name of each sequence.
+        length (int): Binder length shared by all sequences.
+        trajectory_pdb (str): Path to the trajectory PDB the sequences were designed on.
+        binder_chain (str): Binder chain in the predicted complexes.
+        prediction_models (list[int]): AF2 models to predict with.
+        target_settings (dict): Target settings of the run.
+        advanced_settings (dict): Advanced settings of the run.
+        filters (dict): Filter thresholds of the run.
+        design_paths (dict): Output directories of the run.
+        failure_csv (str): Path to the filter failure counts CSV.
+
+    Returns:
+        dict: Per design name, a tuple of the complex statistics, whether the AF2
+              filters passed and the binder statistics (None if the AF2 filters
+              failed).
+    """
+    from bindcraft.functions import predict_binder_alone, predict_binder_complex
+
+    complex_results = [
+        predict_binder_complex(
+            complex_prediction_model,
+            mpnn_sequence["seq"],
+            mpnn_design_name,
+            target_settings["starting_pdb"],
+            target_settings["chains"],
+            length,
+            trajectory_pdb,
+            prediction_models,
+            advanced_settings,
+            filters,
+            design_paths,
+            failure_csv,
+        )
+        for mpnn_sequence, mpnn_design_name in zip(mpnn_sequences, mpnn_design_names)
+    ]
+
+    binder_results = [
+        predict_binder_alone(
+            binder_prediction_model,
+            mpnn_sequence["seq"],
+            mpnn_design_name,
+            length,
+            trajectory_pdb,
+            binder_chain,
+            prediction_models,
+            advanced_settings,
+            design_paths,
+        )
+        if pass_af2_filters
+        else None
+        for mpnn_sequence, mpnn_design_name, (_, pass_af2_filters) in zip(
+            mpnn_sequences, mpnn_design_names, complex_results
+        )
+    ]
+
+    return {
+        mpnn_design_name: (complex_statistics, pass_af2_filters, binder_statistics)
+        for mpnn_design_name, (complex_statistics, pass_af2_filters), binder_statistics in zip(
+            mpnn_design_names, complex_results, binder_results
+        )
+    }
+
+
+# Filter stages in the order of the cost of computing their metrics; the AF2 and binder
+# metrics come with the predictions, the other stages are scored on the CPU for all
+# models before their per-model and average thresholds are checked
+FILTER_STAGES = {
+    "af2": ["pLDDT", "pTM", "i_pTM", "pAE", "i_pAE"],
+    "binder": ["Binder_pLDDT", "Binder_pTM", "Binder_pAE", "Binder_RMSD"],
+    "clashes": ["Unrelaxed_Clashes", "Relaxed_Clashes"],
+    "rmsd": ["Hotspot_RMSD", "Target_RMSD"],
+    "secondary_structure": [
+        "i_pLDDT",
+        "ss_pLDDT",
+        "Interface_Helix%",
+        "Interface_BetaSheet%",
+        "Interface_Loop%",
+        "Binder_Helix%",
+        "Binder_BetaSheet%",
+        "Binder_Loop%",
+    ],
+    "interface": [
+        "Binder_Energy_Score",
+        "Surface_Hydrophobicity",
+        "ShapeComplementarity",
+        "PackStat",
+        "dG",
+        "dSASA",
+        "dG/dSASA",
+        "Interface_SASA_%",
+        "Interface_Hydrophobicity",
+        "n_InterfaceResidues",
+        "n_InterfaceHbonds",
+        "InterfaceHbondsPercentage",
+        "n_InterfaceUnsatHbonds",
+        "InterfaceUnsatHbondsPercentage",
+        "InterfaceAAs",
+    ],
+}
+
+
+def unmet_filters(filters: dict, columns: dict) -> list[str]:
+    """Checks design statistics against the filter thresholds, like `check_filters`.
+
+    Args:
+        filters (dict): Filter thresholds of the run.
+        columns (dict): Statistics by column label, e.g. "Average_pLDDT" or "1_pLDDT".
+                        Columns without a value or without a threshold are skipped.
+
+    Returns:
+        list[str]: The unmet filters, empty if all thresholds are met.
+    """
+    unmet = []
+    for column, value in columns.items():
+        conditions = filters.get(column)
+        if value is None or conditions is None:
+            continue
+
+        # interface amino acid counts have thresholds per amino acid
+        if column.endswith("InterfaceAAs"):
+            checks = [
+                (f"{column}_{aa}", value.get(aa), aa_conditions)
+                for aa, aa_conditions in conditions.items()
+            ]
+        else:
+            checks = [(column, value, conditions)]
+
+        for name, check_value, check_conditions in checks:
+            if check_value is None or check_conditions["threshold"] is None:
+                continue
+            if check_conditions["higher"]:
+                if check_value < check_conditions["threshold"]:
+                    unmet.append(name)
+            elif check_value > check_conditions["threshold"]:
+                unmet.append(name)
+    return unmet
+
+
+def stage_columns(statistics: dict, labels: list[str], prefix: str = "") -> dict:
+    """Returns the average and per-model columns of `labels` from per-model statistics.
+
+    Args:
+        statistics (dict): Statistics per model number, as from `predict_binder_complex`.
+        labels (list[str]): Column labels of a filter stage.
+        prefix (str): Prefix of the column labels that the statistics keys omit,
+                      e.g. "Binder_" for the statistics of `predict_binder_alone`.
+
+    Returns:
+        dict: Statistics by column label, e.g. "Average_pLDDT" and "1_pLDDT".
+    """
+    from bindcraft.functions import calculate_averages
+
+    statistics = {
+        model: {
+            label if label.startswith(prefix) else prefix + label: value
+            for label, value in model_statistics.items()
+        }
+        for model, model_statistics in statistics.items()
+    }
+    averages = calculate_averages(statistics, handle_aa=True)
+
+    columns = {}
+    for label in labels:
+        columns[f"Average_{label}"] = averages.get(label)
+        for model, model_statistics in statistics.items():
+            columns[f"{model}_{label}"] = model_statistics.get(label)
+    return columns
+
+
+def filter_stage(unmet: list[str]) -> str:
+    """Returns the cheapest filter stage of a list of unmet filters."""
+    stages = list(FILTER_STAGES)
+    unmet_stages = set()
+    for column in unmet:
+        label = column.split("_", 1)[1]
+        for stage, labels in FILTER_STAGES.items():
+            if any(label == l or label.startswith(l + "_") for l in labels):
+                unmet_stages.add(stage)
+                break
+        else:
+            unmet_stages.add("other")
+    return min(
+        unmet_stages, key=lambda stage: stages.index(stage) if stage in stages else len(stages)
+    )
+
+
+def init_pyrosetta_worker(dalphaball_path: str):
+    """Initialises PyRosetta once in each scoring worker process."""
+    from bindcraft.functions import pr
+
+    pr.init(PYROSETTA_FLAGS.format(dalphaball_path=dalphaball_path))
+
+
+def score_trajectory(
+    trajectory_pdb: str,
+    trajectory_relaxed: str,
+    starting_pdb: str,
+    chains: str,
+    binder_chain: str,
+    advanced_settings: dict,
+) -> dict:
+    """Relaxes and scores a trajectory on the CPU, in a scoring worker process.
+
+    Args:
+        trajectory_pdb (str): Path to the hallucinated trajectory PDB.
+        trajectory_relaxed (str): Path to write the relaxed trajectory PDB to.
+        starting_pdb (str): Path to the input target PDB.
+        chains (str): Target chain(s) in the input PDB.
+        binder_chain (str): Binder chain in the trajectory PDB.
+        advanced_settings (dict): Advanced settings of the run.
+
+    Returns:
+        dict: Clash counts, secondary structure, interface scores and target RMSD
+              of the trajectory.
+    """
+    from bindcraft.functions import (
+        calc_ss_percentage,
+        calculate_clash_score,
+        pr_relax,
+        score_interface,
+        unaligned_rmsd,
+    )
+
+    # Relax binder to calculate statistics
+    pr_relax(trajectory_pdb, trajectory_relaxed)
+
+    # secondary structure content of starting trajectory binder and interface
+    (
+        alpha,
+        beta,
+        loops,
+        alpha_interface,
+        beta_interface,
+        loops_interface,
+        i_plddt,
+        ss_plddt,
+    ) = calc_ss_percentage(trajectory_pdb, advanced_settings, binder_chain)
+
+    # analyze interface scores for relaxed af2 trajectory
+    interface_scores, interface_AA, interface_residues = score_interface(
+        trajectory_relaxed, binder_chain
+    )
+
+    return {
+        # Calculate clashes before and after relaxation
+        "num_clashes_trajectory": calculate_clash_score(trajectory_pdb),
+        "num_clashes_relaxed": calculate_clash_score(trajectory_relaxed),
+        "alpha": alpha,
+        "beta": beta,
+        "loops": loops,
+        "alpha_interface": alpha_interface,
+        "beta_interface": beta_interface,
+        "loops_interface": loops_interface,
+        "i_plddt": i_plddt,
+        "ss_plddt": ss_plddt,
+        "interface_scores": interface_scores,
+        "interface_AA": interface_AA,
+        "interface_residues": interface_residues,
+        # target structure RMSD compared to input PDB
+        "target_rmsd": unaligned_rmsd(starting_pdb, trajectory_pdb, chains, "A"),
+    }
+
+
+def score_mpnn_stage(
+    stage: str,
+    mpnn_design_pdb: str,
+    mpnn_design_relaxed: str,
+    trajectory_pdb: str,
+    starting_pdb: str,
+    chains: str,
+    binder_chain: str,
+    advanced_settings: dict,
+) -> tuple[dict, str | None]:
+    """Computes the metrics of one CPU filter stage for one predicted model of an MPNN
+    design, in a scoring worker process.
 
-@app.function(image=image, gpu=GPU, timeout=TIMEOUT * 60)
+    Args:
+        stage (str): One of the CPU stages of `FILTER_STAGES`: "clashes", "rmsd",
+                     "secondary_structure" or "interface".
+        mpnn_design_pdb (str): Path to the predicted complex PDB.
+        mpnn_design_relaxed (str): Path to the relaxed predicted complex PDB.
+        trajectory_pdb (str): Path to the trajectory PDB the design was derived from.
+        starting_pdb (str): Path to the input target PDB.
+        chains (str): Target chain(s) in the input PDB.
+        binder_chain (str): Binder chain in the predicted complex.
+        advanced_settings (dict): Advanced settings of the run.
+
+    Returns:
+        tuple[dict, str | None]: The statistics of the stage to add to the model's complex
+            statistics, and the interface residues of the model for the "interface" stage.
+    """
+    from bindcraft.functions import (
+        calc_ss_percentage,
+        calculate_clash_score,
+        score_interface,
+        target_pdb_rmsd,
+        unaligned_rmsd,
+    )
+
+    if stage == "clashes":
+        # Calculate clashes before and after relaxation
+        return {
+            "Unrelaxed_Clashes": calculate_clash_score(mpnn_design_pdb),
+            "Relaxed_Clashes": calculate_clash_score(mpnn_design_relaxed),
+        }, None
+
+    if stage == "rmsd":
+        return {
+            # unaligned RMSD calculate to determine if binder is in the designed binding site
+            "Hotspot_RMSD": unaligned_rmsd(
+                trajectory_pdb, mpnn_design_pdb, binder_chain, binder_chain
+            ),
+            # calculate RMSD of target compared to input PDB
+            "Target_RMSD": target_pdb_rmsd(mpnn_design_pdb, starting_pdb, chains),
+        }, None
+
+    if stage == "secondary_structure":
+        # secondary structure content of starting trajectory binder
+        (
+            alpha,
+            beta,
+            loops,
+            alpha_interface,
+            beta_interface,
+            loops_interface,
+            i_plddt,
+            ss_plddt,
+        ) = calc_ss_percentage(mpnn_design_pdb, advanced_settings, binder_chain)
+        return {
+            "i_pLDDT": i_plddt,
+            "ss_pLDDT": ss_plddt,
+            "Interface_Helix%": alpha_interface,
+            "Interface_BetaSheet%": beta_interface,
+            "Interface_Loop%": loops_interface,
+            "Binder_Helix%": alpha,
+            "Binder_BetaSheet%": beta,
+            "Binder_Loop%": loops,
+        }, None
+
+    if stage == "interface":
+        # analyze interface scores for relaxed af2 trajectory
+        interface_scores, interface_AA, interface_residues = score_interface(
+            mpnn_design_relaxed, binder_chain
+        )
+        return {
+            "Binder_Energy_Score": interface_scores["binder_score"],
+            "Surface_Hydrophobicity": interface_scores["surface_hydrophobicity"],
+            "ShapeComplementarity": interface_scores["interface_sc"],
+            "PackStat": interface_scores["interface_packstat"],
+            "dG": interface_scores["interface_dG"],
+            "dSASA": interface_scores["interface_dSASA"],
+            "dG/dSASA": interface_scores["interface_dG_SASA_ratio"],
+            "Interface_SASA_%": interface_scores["interface_fraction"],
+            "Interface_Hydrophobicity": interface_scores["interface_hydrophobicity"],
+            "n_InterfaceResidues": interface_scores["interface_nres"],
+            "n_InterfaceHbonds": interface_scores["interface_interface_hbonds"],
+            "InterfaceHbondsPercentage": interface_scores["interface_hbond_percentage"],
+            "n_InterfaceUnsatHbonds": interface_scores["interface_delta_unsat_hbonds"],
+            "InterfaceUnsatHbondsPercentage": interface_scores[
+                "interface_delta_unsat_hbonds_percentage"
+            ],
+            "InterfaceAAs": interface_AA,
+        }, interface_residues
+
+    raise ValueError(f"Unsupported scoring stage: {stage}")
+
+
+def score_mpnn_design(
+    scoring_pool,
+    model_pdbs: dict[int, tuple[str, str]],
+    trajectory_pdb: str,
+    starting_pdb: str,
+    chains: str,
+    binder_chain: str,
+    advanced_settings: dict,
+    filters: dict | None = None,
+) -> tuple[dict, str | None, list[str]]:
+    """Scores the CPU filter stages of all predicted models of an MPNN design.
+
+    Runs in a thread next to the design loop, submitting the stages to the scoring
+    pool in the order of `FILTER_STAGES`. With `filters`, each stage is scored for all
+    models before its per-model and `Average_*` thresholds are checked, and the
+    remaining stages are skipped as soon as one is violated. Without `filters`, all
+    stages of all models are submitted at once.
+
+    Args:
+        scoring_pool (ProcessPoolExecutor): Pool of PyRosetta scoring workers.
+        model_pdbs (dict[int, tuple[str, str]]): Per model number, from 1, the paths to
+                                                 the predicted and relaxed complex PDBs.
+        trajectory_pdb (str): Path to the trajectory PDB the design was derived from.
+        starting_pdb (str): Path to the input target PDB.
+        chains (str): Target chain(s) in the input PDB.
+        binder_chain (str): Binder chain in the predicted complexes.
+        advanced_settings (dict): Advanced settings of the run.
+        filters (dict | None): Filter thresholds to exit early on, or None to compute
+                               all statistics.
+
+    Returns:
+        tuple[dict, str | None, list[str]]: Per model number, the statistics to add to its
+            complex statistics; the interface residues of the last model (None if not
+            scored); and the unmet filters of the stage that rejected the design, if any.
+    """
+    stages = [stage for stage in FILTER_STAGES if stage not in ("af2", "binder")]
+
+    def submit(stage):
+        return {
+            model_num: scoring_pool.submit(
+                score_mpnn_stage,
+                stage,
+                mpnn_design_pdb,
+                mpnn_design_relaxed,
+                trajectory_pdb,
+                starting_pdb,
+                chains,
+                binder_chain,
+                advanced_settings,
+            )
+            for model_num, (mpnn_design_pdb, mpnn_design_relaxed) in model_pdbs.items()
+        }
+
+    submitted = [submit(stage) for stage in stages] if filters is None else []
+
+    statistics = {model_num: {} for model_num in model_pdbs}
+    interface_residues = None
+    for i, stage in enumerate(stages):
+        futures = submitted[i] if filters is None else submit(stage)
+        for model_num, future in futures.items():
+            stage_statistics, model_interface_residues = future.result()
+            statistics[model_num].update(stage_statistics)
+            interface_residues = model_interface_residues or interface_residues
+
+        if filters is not None:
+            unmet = unmet_filters(filters, stage_columns(statistics, FILTER_STAGES[stage]))
+            if unmet:
+                return statistics, interface_residues, unmet
+    return statistics, interface_residues, []
+
+
+@app.function(image=image, timeout=60 * 60, volumes={WEIGHTS_DIR: weights_volume})
+def populate_weights(force: bool = False):
+    """Downloads the AF2 parameters into `weights_volume`, once.
+
+    The parameters are extracted next to their final location and renamed into
+    place, so a partially written download is never picked up by a design run.
+
+    Args:
+        force (bool): Download again even if the parameters are present.
+    """
+    import shutil
+    import subprocess
+
+    if os.path.isdir(AF2_PARAMS_DIR) and not force:
+        print(f"AF2 parameters already present in {AF2_PARAMS_DIR}")
+        return
+
+    partial_dir = AF2_PARAMS_DIR + ".partial"
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+    subprocess.run(
+        f"aria2c -q -x 16 -d /tmp -o af2_params.tar {AF2_PARAMS_URL}"
+        f" && tar -xf /tmp/af2_params.tar -C {partial_dir}",
+        shell=True,
+        check=True,
+    )
+    shutil.rmtree(AF2_PARAMS_DIR, ignore_errors=True)
+    os.replace(partial_dir, AF2_PARAMS_DIR)
+    weights_volume.commit()
+    print(f"AF2 parameters written to {AF2_PARAMS_DIR}")
+
+
+@app.function(
+    image=image,
+    gpu=GPU,
+    cpu=CPU,
+    timeout=TIMEOUT * 60,
+    volumes={RUNS_DIR: runs_volume, WEIGHTS_DIR: weights_volume.read_only()},
+)
 def bindcraft(
     design_path,
     binder_name,
@@ -82,11 +938,20 @@ def bindcraft(
     template_protocol="Default",
     filter_option="Default",
     max_trajectories: int | None = None,
+    run_id: str | None = None,
+    worker_id: int = 0,
+    resume: bool = False,
+    mpnn_batch_size: int = 4,
+    model_cache_size: int = 8,
+    length_step: int = 1,
+    cpu_workers: int | None = None,
+    staged_filters: bool = True,
 ):
     """Executes the BindCraft pipeline to design protein binders against a target structure.
 
     Args:
-        design_path (str): Path for design outputs within the container.
+        design_path (str): Path for design outputs within the container. Paths under
+                           `RUNS_DIR` are persisted to the `bindcraft-runs` volume.
         binder_name (str): Name for the binder design project.
         pdb_str (str): PDB file content as a string.
         chains (str): Target chain(s) in the PDB.
@@ -98,48 +963,62 @@ def bindcraft(
         template_protocol (str): Template protocol (e.g., "Default", "Masked").
         filter_option (str): Filter settings to apply (e.g., "Default", "Peptide").
         max_trajectories (int | None): Maximum number of design trajectories to run.
+        run_id (str | None): Identifier of a fan-out launch. If set, `number_of_final_designs`
+                             and `max_trajectories` are budgets shared with the other workers
+                             of the launch through the `counters` Dict, see `SharedBudget`.
+        worker_id (int): Index of this worker within the fan-out run.
+        resume (bool): Continue a previous run whose `design_path` is on the volume,
+                       restoring its counters and skipping already tried trajectories.
+        mpnn_batch_size (int): Maximum number of MPNN sequences of a trajectory predicted
+                               back to back, one call each, ahead of their scoring. Fewer
+                               are predicted when fewer designs may still be accepted for
+                               the trajectory. 1 predicts and scores each sequence in turn.
+        model_cache_size (int): Number of compiled prediction models kept per container.
+                                0 compiles new models for every trajectory.
+        length_step (int): Sample binder lengths on a grid of this step within `lengths`,
+                           which raises the hit rate of the prediction model cache.
+        cpu_workers (int | None): Number of PyRosetta worker processes relaxing and scoring
+                                  structures alongside the GPU. Defaults to CPU - 1.
+        staged_filters (bool): Check the filter thresholds stage by stage, in the order of
+                               `FILTER_STAGES`, and skip the remaining scoring of a design
+                               as soon as one is violated. Each stage is checked against
+                               its per-model and `Average_*` thresholds once it is scored
+                               for all models. The stage rejecting each design is recorded
+                               in filter_stages.csv; failure_csv only counts the unmet
+                               filters of that stage, as the later stages are not scored.
 
     Returns:
-        list[tuple[Path, bytes]]: A list of tuples, where each tuple contains the relative output
-                                  file path from `design_path` and its byte content.
+        dict: Summary of the run with the `design_path`, the number of `trajectories` run
+              and the number of `accepted_designs`. The design files themselves are
+              committed to `runs_volume` as they are scored; see `pull_outputs`.
     """
     import json
+    import multiprocessing
     import os
     import shutil
     import time
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
     from datetime import datetime
 
     import numpy as np
-    import pandas as pd
     from bindcraft.functions import (
         binder_hallucination,
-        calc_ss_percentage,
         calculate_averages,
-        calculate_clash_score,
         check_accepted_designs,
         check_filters,
         check_jax_gpu,
-        check_n_trajectories,
-        clear_mem,
         copy_dict,
         create_dataframe,
         generate_dataframe_labels,
         generate_directories,
         generate_filter_pass_csv,
-        insert_data,
         load_af2_models,
         load_helicity,
         load_json_settings,
-        predict_binder_complex,
-        mk_afdesign_model,
         mpnn_gen_sequence,
         perform_advanced_settings_check,
         pr,
-        pr_relax,
-        predict_binder_alone,
         save_fasta,
-        score_interface,
-        target_pdb_rmsd,
         unaligned_rmsd,
         validate_design_sequence,
     )
@@ -253,6 +1132,13 @@ def bindcraft(
         advanced_settings, bindcraft_folder
     )
 
+    # AF2 parameters are read straight from the weights volume
+    if not os.path.isdir(AF2_PARAMS_DIR):
+        raise RuntimeError(
+            f"No AF2 parameters in {AF2_PARAMS_DIR}, run populate_weights first"
+        )
+    advanced_settings["af_params_dir"] = AF2_PARAMS_DIR
+
     ### generate directories, design path names can be found within the function
     design_paths = generate_directories(target_settings["design_path"])
 
@@ -265,500 +1151,263 @@ def bindcraft(
     mpnn_csv = os.path.join(target_settings["design_path"], "mpnn_design_stats.csv")
     final_csv = os.path.join(target_settings["design_path"], "final_design_stats.csv")
     failure_csv = os.path.join(target_settings["design_path"], "failure_csv.csv")
+    filter_stages_csv = os.path.join(
+        target_settings["design_path"], "filter_stages.csv"
+    )
 
     create_dataframe(trajectory_csv, trajectory_labels)
     create_dataframe(mpnn_csv, design_labels)
     create_dataframe(final_csv, final_labels)
     generate_filter_pass_csv(failure_csv, args["filters"])
+    create_dataframe(filter_stages_csv, ["Design", "Stage", "Unmet_Filters"])
+    stats = StatsStore(mpnn_csv, failure_csv)
 
     currenttime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"Loaded design functions and settings at: {currenttime}")
 
-    pr.init(
-        f"-ignore_unrecognized_res -ignore_zero_occupancy -mute all -holes:dalphaball {advanced_settings['dalphaball_path']} -corrections::beta_nov16 true -relax:default_repeats 1"
+    pr.init(PYROSETTA_FLAGS.format(dalphaball_path=advanced_settings["dalphaball_path"]))
+
+    # PyRosetta workers relax and score structures while the GPU keeps predicting;
+    # spawned rather than forked, as forking a process that initialised JAX is unsafe
+    scoring_pool = ProcessPoolExecutor(
+        max_workers=cpu_workers or max(int(CPU) - 1, 1),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_pyrosetta_worker,
+        initargs=(advanced_settings["dalphaball_path"],),
     )
+    # threads submitting the scoring stages of each MPNN design to the scoring pool
+    design_pool = ThreadPoolExecutor(max_workers=2 * max(mpnn_batch_size, 1))
+
+    # define binder chain, placeholder in case multi-chain parsing in ColabDesign gets changed
+    binder_chain = "B"
 
     ####################################
     ###################### BindCraft Run
     ####################################
     # initialise counters
     script_start_time = time.time()
-    trajectory_n = 1
-    accepted_designs = 0
-
-    ### start design loop
-    while True:
-        ### check if we have the target number of binders
-        final_designs_reached = check_accepted_designs(
-            design_paths,
-            mpnn_csv,
-            final_labels,
-            final_csv,
-            advanced_settings,
-            target_settings,
-            design_labels,
+    # the first input of a container is timed from the container start, later ones
+    # from their call
+    global CONTAINER_START
+    start_time, CONTAINER_START = CONTAINER_START or script_start_time, None
+    start_to_first_trajectory = None
+    model_cache = PredictionModelCache(model_cache_size)
+    if resume:
+        trajectory_n, accepted_designs, tried_trajectories = load_checkpoint(
+            design_path, design_paths
         )
-
-        if final_designs_reached:
-            # stop design loop execution
-            break
-
-        ### check if we reached maximum allowed trajectories
-        # set advanced_settings["max_trajectories"]
-        max_trajectories_reached = check_n_trajectories(design_paths, advanced_settings)
-
-        if max_trajectories_reached:
-            break
-
-        ### Initialise design
-        # measure time to generate design
-        trajectory_start_time = time.time()
-
-        # generate random seed to vary designs
-        seed = int(np.random.randint(0, high=999999, size=1, dtype=int)[0])
-
-        # sample binder design length randomly from defined distribution
-        samples = np.arange(
-            min(target_settings["lengths"]), max(target_settings["lengths"]) + 1
+        print(
+            f"Resuming from trajectory {trajectory_n} with {accepted_designs} accepted designs"
         )
-        length = np.random.choice(samples)
+    elif os.path.exists(os.path.join(design_path, CHECKPOINT_FILE)):
+        raise ValueError(f"{design_path} holds a previous run, pass resume=True")
+    else:
+        trajectory_n = 1
+        accepted_designs = 0
+        tried_trajectories = set()
+
+    budget = (
+        SharedBudget(run_id, worker_id, number_of_final_designs, max_trajectories)
+        if run_id is not None
+        else None
+    )
+    if budget is not None:
+        budget.restore(trajectory_n - 1, accepted_designs)
 
-        # load desired helicity value to sample different secondary structure contents
-        helicity_value = load_helicity(advanced_settings)
+    def design_target_reached() -> bool:
+        """Whether this worker, or all workers of a fan-out run, accepted enough designs."""
+        return accepted_designs >= target_settings["number_of_final_designs"] or (
+            budget is not None and budget.exhausted(("accepted",))
+        )
 
-        # generate design name and check if same trajectory was already run
-        design_name = (
-            target_settings["binder_name"] + "_l" + str(length) + "_s" + str(seed)
+    def finish_trajectory(pending: dict) -> bool:
+        """Writes the statistics of a scored trajectory and runs its MPNN designs.
+
+        The MPNN designs are skipped once the design target is reached, as happens for
+        the trajectory still in flight when the design loop stops.
+
+        Returns False if the acceptance rate dropped below the configured threshold.
+        """
+        nonlocal accepted_designs
+
+        design_name = pending["design_name"]
+        length = pending["length"]
+        seed = pending["seed"]
+        helicity_value = pending["helicity_value"]
+        trajectory_pdb = pending["trajectory_pdb"]
+        trajectory_metrics = pending["trajectory_metrics"]
+        trajectory_sequence = pending["trajectory_sequence"]
+
+        # wait for the CPU scoring of the trajectory
+        trajectory_scores = pending["scores"].result()
+        trajectory_interface_scores = trajectory_scores["interface_scores"]
+        trajectory_interface_residues = trajectory_scores["interface_residues"]
+
+        # analyze sequence
+        traj_seq_notes = validate_design_sequence(
+            trajectory_sequence,
+            trajectory_scores["num_clashes_relaxed"],
+            advanced_settings,
         )
-        trajectory_dirs = [
-            "Trajectory",
-            "Trajectory/Relaxed",
-            "Trajectory/LowConfidence",
-            "Trajectory/Clashing",
+
+        # save trajectory statistics into CSV
+        trajectory_data = [
+            design_name,
+            advanced_settings["design_algorithm"],
+            length,
+            seed,
+            helicity_value,
+            target_settings["target_hotspot_residues"],
+            trajectory_sequence,
+            trajectory_interface_residues,
+            trajectory_metrics["plddt"],
+            trajectory_metrics["ptm"],
+            trajectory_metrics["i_ptm"],
+            trajectory_metrics["pae"],
+            trajectory_metrics["i_pae"],
+            trajectory_scores["i_plddt"],
+            trajectory_scores["ss_plddt"],
+            trajectory_scores["num_clashes_trajectory"],
+            trajectory_scores["num_clashes_relaxed"],
+            trajectory_interface_scores["binder_score"],
+            trajectory_interface_scores["surface_hydrophobicity"],
+            trajectory_interface_scores["interface_sc"],
+            trajectory_interface_scores["interface_packstat"],
+            trajectory_interface_scores["interface_dG"],
+            trajectory_interface_scores["interface_dSASA"],
+            trajectory_interface_scores["interface_dG_SASA_ratio"],
+            trajectory_interface_scores["interface_fraction"],
+            trajectory_interface_scores["interface_hydrophobicity"],
+            trajectory_interface_scores["interface_nres"],
+            trajectory_interface_scores["interface_interface_hbonds"],
+            trajectory_interface_scores["interface_hbond_percentage"],
+            trajectory_interface_scores["interface_delta_unsat_hbonds"],
+            trajectory_interface_scores["interface_delta_unsat_hbonds_percentage"],
+            trajectory_scores["alpha_interface"],
+            trajectory_scores["beta_interface"],
+            trajectory_scores["loops_interface"],
+            trajectory_scores["alpha"],
+            trajectory_scores["beta"],
+            trajectory_scores["loops"],
+            trajectory_scores["interface_AA"],
+            trajectory_scores["target_rmsd"],
+            pending["trajectory_time_text"],
+            traj_seq_notes,
+            settings_file,
+            filters_file,
+            advanced_file,
         ]
-        trajectory_exists = any(
-            os.path.exists(
-                os.path.join(design_paths[trajectory_dir], design_name + ".pdb")
+        stats.insert(trajectory_csv, trajectory_data)
+
+        if advanced_settings["enable_mpnn"] and design_target_reached():
+            print(f"Design target reached, skipping the MPNN designs of {design_name}")
+        elif advanced_settings["enable_mpnn"]:
+            # initialise MPNN counters
+            mpnn_n = 1
+            accepted_mpnn = 0
+            mpnn_dict = {}
+            design_start_time = time.time()
+
+            ### MPNN redesign of starting binder
+            mpnn_trajectories = mpnn_gen_sequence(
+                trajectory_pdb,
+                binder_chain,
+                trajectory_interface_residues,
+                advanced_settings,
             )
-            for trajectory_dir in trajectory_dirs
-        )
 
-        if not trajectory_exists:
-            print("Starting trajectory: " + design_name)
-
-            ### Begin binder hallucination
-            trajectory = binder_hallucination(
-                design_name,
-                target_settings["starting_pdb"],
-                target_settings["chains"],
-                target_settings["target_hotspot_residues"],
-                length,
-                seed,
-                helicity_value,
-                design_models,
-                advanced_settings,
-                design_paths,
-                failure_csv,
+            # create set of MPNN sequences with allowed amino acid composition
+            restricted_AAs = (
+                set(aa.strip().upper() for aa in advanced_settings["omit_AAs"].split(","))
+                if advanced_settings["force_reject_AA"]
+                else set()
             )
-            trajectory_metrics = copy_dict(
-                trajectory.aux["log"]
-            )  # contains plddt, ptm, i_ptm, pae, i_pae
-            trajectory_pdb = os.path.join(
-                design_paths["Trajectory"], design_name + ".pdb"
+
+            mpnn_sequences = sorted(
+                {
+                    mpnn_trajectories["seq"][n][-length:]: {
+                        "seq": mpnn_trajectories["seq"][n][-length:],
+                        "score": mpnn_trajectories["score"][n],
+                        "seqid": mpnn_trajectories["seqid"][n],
+                    }
+                    for n in range(advanced_settings["num_seqs"])
+                    if (
+                        not restricted_AAs
+                        or not any(
+                            aa in mpnn_trajectories["seq"][n][-length:].upper()
+                            for aa in restricted_AAs
+                        )
+                    )
+                    and mpnn_trajectories["seq"][n][-length:]
+                    not in stats.mpnn_sequences
+                }.values(),
+                key=lambda x: x["score"],
             )
 
-            # round the metrics to two decimal places
-            trajectory_metrics = {
-                k: round(v, 2) if isinstance(v, float) else v
-                for k, v in trajectory_metrics.items()
-            }
-
-            # time trajectory
-            trajectory_time = time.time() - trajectory_start_time
-            trajectory_time_text = f"{'%d hours, %d minutes, %d seconds' % (int(trajectory_time // 3600), int((trajectory_time % 3600) // 60), int(trajectory_time % 60))}"
-            print("Starting trajectory took: " + trajectory_time_text)
-            print("")
-
-            # Proceed if there is no trajectory termination signal
-            if trajectory_metrics["terminate"] == "":
-                # Relax binder to calculate statistics
-                trajectory_relaxed = os.path.join(
-                    design_paths["Trajectory/Relaxed"], design_name + ".pdb"
-                )
-                pr_relax(trajectory_pdb, trajectory_relaxed)
-
-                # define binder chain, placeholder in case multi-chain parsing in ColabDesign gets changed
-                binder_chain = "B"
-
-                # Calculate clashes before and after relaxation
-                num_clashes_trajectory = calculate_clash_score(trajectory_pdb)
-                num_clashes_relaxed = calculate_clash_score(trajectory_relaxed)
-
-                # secondary structure content of starting trajectory binder and interface
-                (
-                    trajectory_alpha,
-                    trajectory_beta,
-                    trajectory_loops,
-                    trajectory_alpha_interface,
-                    trajectory_beta_interface,
-                    trajectory_loops_interface,
-                    trajectory_i_plddt,
-                    trajectory_ss_plddt,
-                ) = calc_ss_percentage(trajectory_pdb, advanced_settings, binder_chain)
-
-                # analyze interface scores for relaxed af2 trajectory
-                (
-                    trajectory_interface_scores,
-                    trajectory_interface_AA,
-                    trajectory_interface_residues,
-                ) = score_interface(trajectory_relaxed, binder_chain)
-
-                # starting binder sequence
-                trajectory_sequence = trajectory.get_seq(get_best=True)[0]
-
-                # analyze sequence
-                traj_seq_notes = validate_design_sequence(
-                    trajectory_sequence, num_clashes_relaxed, advanced_settings
-                )
+            # check whether any sequences are left after amino acid rejection and duplication check, and if yes proceed with prediction
+            if mpnn_sequences:
+                # add optimisation for increasing recycles if trajectory is beta sheeted
+                if (
+                    advanced_settings["optimise_beta"]
+                    and float(trajectory_scores["beta"]) > 15
+                ):
+                    advanced_settings["num_recycles_validation"] = advanced_settings[
+                        "optimise_beta_recycles_valid"
+                    ]
 
-                # target structure RMSD compared to input PDB
-                trajectory_target_rmsd = unaligned_rmsd(
-                    target_settings["starting_pdb"],
-                    trajectory_pdb,
-                    target_settings["chains"],
-                    "A",
+                ### Reuse or compile prediction models for faster prediction of MPNN sequences
+                complex_prediction_model = model_cache.get(
+                    length,
+                    "binder",
+                    multimer_validation,
+                    target_settings,
+                    advanced_settings,
                 )
-
-                # save trajectory statistics into CSV
-                trajectory_data = [
-                    design_name,
-                    advanced_settings["design_algorithm"],
+                binder_prediction_model = model_cache.get(
                     length,
-                    seed,
-                    helicity_value,
-                    target_settings["target_hotspot_residues"],
-                    trajectory_sequence,
-                    trajectory_interface_residues,
-                    trajectory_metrics["plddt"],
-                    trajectory_metrics["ptm"],
-                    trajectory_metrics["i_ptm"],
-                    trajectory_metrics["pae"],
-                    trajectory_metrics["i_pae"],
-                    trajectory_i_plddt,
-                    trajectory_ss_plddt,
-                    num_clashes_trajectory,
-                    num_clashes_relaxed,
-                    trajectory_interface_scores["binder_score"],
-                    trajectory_interface_scores["surface_hydrophobicity"],
-                    trajectory_interface_scores["interface_sc"],
-                    trajectory_interface_scores["interface_packstat"],
-                    trajectory_interface_scores["interface_dG"],
-                    trajectory_interface_scores["interface_dSASA"],
-                    trajectory_interface_scores["interface_dG_SASA_ratio"],
-                    trajectory_interface_scores["interface_fraction"],
-                    trajectory_interface_scores["interface_hydrophobicity"],
-                    trajectory_interface_scores["interface_nres"],
-                    trajectory_interface_scores["interface_interface_hbonds"],
-                    trajectory_interface_scores["interface_hbond_percentage"],
-                    trajectory_interface_scores["interface_delta_unsat_hbonds"],
-                    trajectory_interface_scores[
-                        "interface_delta_unsat_hbonds_percentage"
-                    ],
-                    trajectory_alpha_interface,
-                    trajectory_beta_interface,
-                    trajectory_loops_interface,
-                    trajectory_alpha,
-                    trajectory_beta,
-                    trajectory_loops,
-                    trajectory_interface_AA,
-                    trajectory_target_rmsd,
-                    trajectory_time_text,
-                    traj_seq_notes,
-                    settings_file,
-                    filters_file,
-                    advanced_file,
-                ]
-                insert_data(trajectory_csv, trajectory_data)
-
-                if advanced_settings["enable_mpnn"]:
-                    # initialise MPNN counters
-                    mpnn_n = 1
-                    accepted_mpnn = 0
-                    mpnn_dict = {}
-                    design_start_time = time.time()
-
-                    ### MPNN redesign of starting binder
-                    mpnn_trajectories = mpnn_gen_sequence(
+                    "hallucination",
+                    multimer_validation,
+                    target_settings,
+                    advanced_settings,
+                )
+
+                mpnn_batch = {}
+                predicted_n = 0
+
+                def predict_chunk(size: int):
+                    """Predicts the next `size` sequences and queues their CPU scoring."""
+                    nonlocal predicted_n
+
+                    start = predicted_n
+                    chunk = mpnn_sequences[start : start + max(size, 0)]
+                    if not chunk:
+                        return
+                    predicted_n += len(chunk)
+                    chunk_names = [
+                        design_name + "_mpnn" + str(start + 1 + i)
+                        for i in range(len(chunk))
+                    ]
+                    batch = predict_mpnn_chunk(
+                        complex_prediction_model,
+                        binder_prediction_model,
+                        chunk,
+                        chunk_names,
+                        length,
                         trajectory_pdb,
                         binder_chain,
-                        trajectory_interface_residues,
+                        prediction_models,
+                        target_settings,
                         advanced_settings,
+                        filters,
+                        design_paths,
+                        failure_csv,
                     )
-                    existing_mpnn_sequences = set(
-                        pd.read_csv(mpnn_csv, usecols=["Sequence"])["Sequence"].values
-                    )
-
-                    # create set of MPNN sequences with allowed amino acid composition
-                    restricted_AAs = (
-                        set(
-                            aa.strip().upper()
-                            for aa in advanced_settings["omit_AAs"].split(",")
-                        )
-                        if advanced_settings["force_reject_AA"]
-                        else set()
-                    )
-
-                    mpnn_sequences = sorted(
-                        {
-                            mpnn_trajectories["seq"][n][-length:]: {
-                                "seq": mpnn_trajectories["seq"][n][-length:],
-                                "score": mpnn_trajectories["score"][n],
-                                "seqid": mpnn_trajectories["seqid"][n],
-                            }
-                            for n in range(advanced_settings["num_seqs"])
-                            if (
-                                not restricted_AAs
-                                or not any(
-                                    aa in mpnn_trajectories["seq"][n][-length:].upper()
-                                    for aa in restricted_AAs
-                                )
-                            )
-                            and mpnn_trajectories["seq"][n][-length:]
-                            not in existing_mpnn_sequences
-                        }.values(),
-                        key=lambda x: x["score"],
-                    )
-
-                    del existing_mpnn_sequences
-
-                    # check whether any sequences are left after amino acid rejection and duplication check, and if yes proceed with prediction
-                    if mpnn_sequences:
-                        # add optimisation for increasing recycles if trajectory is beta sheeted
-                        if (
-                            advanced_settings["optimise_beta"]
-                            and float(trajectory_beta) > 15
-                        ):
-                            advanced_settings["num_recycles_validation"] = (
-                                advanced_settings["optimise_beta_recycles_valid"]
-                            )
-
-                        ### Compile prediction models once for faster prediction of MPNN sequences
-                        clear_mem()
-                        # compile complex prediction model
-                        complex_prediction_model = mk_afdesign_model(
-                            protocol="binder",
-                            num_recycles=advanced_settings["num_recycles_validation"],
-                            data_dir=advanced_settings["af_params_dir"],
-                            use_multimer=multimer_validation,
-                        )
-                        complex_prediction_model.prep_inputs(
-                            pdb_filename=target_settings["starting_pdb"],
-                            chain=target_settings["chains"],
-                            binder_len=length,
-                            rm_target_seq=advanced_settings["rm_template_seq_predict"],
-                            rm_target_sc=advanced_settings["rm_template_sc_predict"],
-                        )
-
-                        # compile binder monomer prediction model
-                        binder_prediction_model = mk_afdesign_model(
-                            protocol="hallucination",
-                            use_templates=False,
-                            initial_guess=False,
-                            use_initial_atom_pos=False,
-                            num_recycles=advanced_settings["num_recycles_validation"],
-                            data_dir=advanced_settings["af_params_dir"],
-                            use_multimer=multimer_validation,
-                        )
-                        binder_prediction_model.prep_inputs(length=length)
-
-                        # iterate over designed sequences
-                        for mpnn_sequence in mpnn_sequences:
-                            mpnn_time = time.time()
-
-                            # generate mpnn design name numbering
-                            mpnn_design_name = design_name + "_mpnn" + str(mpnn_n)
-                            mpnn_score = round(mpnn_sequence["score"], 2)
-                            mpnn_seqid = round(mpnn_sequence["seqid"], 2)
-
-                            # add design to dictionary
-                            mpnn_dict[mpnn_design_name] = {
-                                "seq": mpnn_sequence["seq"],
-                                "score": mpnn_score,
-                                "seqid": mpnn_seqid,
-                            }
-
-                            # save fasta sequence
-                            if advanced_settings["save_mpnn_fasta"] is True:
-                                save_fasta(
-                                    mpnn_design_name, mpnn_sequence["seq"], design_paths
-                                )
-
-                            ### Predict mpnn redesigned binder complex using masked templates
-                            (
-                                mpnn_complex_statistics,
-                                pass_af2_filters,
-                            ) = predict_binder_complex(
-                                complex_prediction_model,
-                                mpnn_sequence["seq"],
-                                mpnn_design_name,
-                                target_settings["starting_pdb"],
-                                target_settings["chains"],
-                                length,
-                                trajectory_pdb,
-                                prediction_models,
-                                advanced_settings,
-                                filters,
-                                design_paths,
-                                failure_csv,
-                            )
-
-                            # if AF2 filters are not passed then skip the scoring
-                            if not pass_af2_filters:
-                                print(
-                                    f"Base AF2 filters not passed for {mpnn_design_name}, skipping interface scoring"
-                                )
-                                mpnn_n += 1
-                                continue
-
-                            # calculate statistics for each model individually
-                            for model_num in prediction_models:
-                                mpnn_design_pdb = os.path.join(
-                                    design_paths["MPNN"],
-                                    f"{mpnn_design_name}_model{model_num + 1}.pdb",
-                                )
-                                mpnn_design_relaxed = os.path.join(
-                                    design_paths["MPNN/Relaxed"],
-                                    f"{mpnn_design_name}_model{model_num + 1}.pdb",
-                                )
-
-                                if os.path.exists(mpnn_design_pdb):
-                                    # Calculate clashes before and after relaxation
-                                    num_clashes_mpnn = calculate_clash_score(
-                                        mpnn_design_pdb
-                                    )
-                                    num_clashes_mpnn_relaxed = calculate_clash_score(
-                                        mpnn_design_relaxed
-                                    )
-
-                                    # analyze interface scores for relaxed af2 trajectory
-                                    (
-                                        mpnn_interface_scores,
-                                        mpnn_interface_AA,
-                                        mpnn_interface_residues,
-                                    ) = score_interface(
-                                        mpnn_design_relaxed, binder_chain
-                                    )
-
-                                    # secondary structure content of starting trajectory binder
-                                    (
-                                        mpnn_alpha,
-                                        mpnn_beta,
-                                        mpnn_loops,
-                                        mpnn_alpha_interface,
-                                        mpnn_beta_interface,
-                                        mpnn_loops_interface,
-                                        mpnn_i_plddt,
-                                        mpnn_ss_plddt,
-                                    ) = calc_ss_percentage(
-                                        mpnn_design_pdb, advanced_settings, binder_chain
-                                    )
-
-                                    # unaligned RMSD calculate to determine if binder is in the designed binding site
-                                    rmsd_site = unaligned_rmsd(
-                                        trajectory_pdb,
-                                        mpnn_design_pdb,
-                                        binder_chain,
-                                        binder_chain,
-                                    )
-
-                                    # calculate RMSD of target compared to input PDB
-                                    target_rmsd = target_pdb_rmsd(
-                                        mpnn_design_pdb,
-                                        target_settings["starting_pdb"],
-                                        target_settings["chains"],
-                                    )
-
-                                    # add the additional statistics to the mpnn_complex_statistics dictionary
-                                    mpnn_complex_statistics[model_num + 1].update(
-                                        {
-                                            "i_pLDDT": mpnn_i_plddt,
-                                            "ss_pLDDT": mpnn_ss_plddt,
-                                            "Unrelaxed_Clashes": num_clashes_mpnn,
-                                            "Relaxed_Clashes": num_clashes_mpnn_relaxed,
-                                            "Binder_Energy_Score": mpnn_interface_scores[
-                                                "binder_score"
-                                            ],
-                                            "Surface_Hydrophobicity": mpnn_interface_scores[
-                                                "surface_hydrophobicity"
-                                            ],
-                                            "ShapeComplementarity": mpnn_interface_scores[
-                                                "interface_sc"
-                                            ],
-                                            "PackStat": mpnn_interface_scores[
-                                                "interface_packstat"
-                                            ],
-                                            "dG": mpnn_interface_scores["interface_dG"],
-                                            "dSASA": mpnn_interface_scores[
-                                                "interface_dSASA"
-                                            ],
-                                            "dG/dSASA": mpnn_interface_scores[
-                                                "interface_dG_SASA_ratio"
-                                            ],
-                                            "Interface_SASA_%": mpnn_interface_scores[
-                                                "interface_fraction"
-                                            ],
-                                            "Interface_Hydrophobicity": mpnn_interface_scores[
-                                                "interface_hydrophobicity"
-                                            ],
-                                            "n_InterfaceResidues": mpnn_interface_scores[
-                                                "interface_nres"
-                                            ],
-                                            "n_InterfaceHbonds": mpnn_interface_scores[
-                                                "interface_interface_hbonds"
-                                            ],
-                                            "InterfaceHbondsPercentage": mpnn_interface_scores[
-                                                "interface_hbond_percentage"
-                                            ],
-                                            "n_InterfaceUnsatHbonds": mpnn_interface_scores[
-                                                "interface_delta_unsat_hbonds"
-                                            ],
-                                            "InterfaceUnsatHbondsPercentage": mpnn_interface_scores[
-                                                "interface_delta_unsat_hbonds_percentage"
-                                            ],
-                                            "InterfaceAAs": mpnn_interface_AA,
-                                            "Interface_Helix%": mpnn_alpha_interface,
-                                            "Interface_BetaSheet%": mpnn_beta_interface,
-                                            "Interface_Loop%": mpnn_loops_interface,
-                                            "Binder_Helix%": mpnn_alpha,
-                                            "Binder_BetaSheet%": mpnn_beta,
-                                            "Binder_Loop%": mpnn_loops,
-                                            "Hotspot_RMSD": rmsd_site,
-                                            "Target_RMSD": target_rmsd,
-                                        }
-                                    )
-
-                                    # save space by removing unrelaxed predicted mpnn complex pdb?
-                                    if advanced_settings["remove_unrelaxed_complex"]:
-                                        os.remove(mpnn_design_pdb)
-
-                            # calculate complex averages
-                            mpnn_complex_averages = calculate_averages(
-                                mpnn_complex_statistics, handle_aa=True
-                            )
-
-                            ### Predict binder alone in single sequence mode
-                            binder_statistics = predict_binder_alone(
-                                binder_prediction_model,
-                                mpnn_sequence["seq"],
-                                mpnn_design_name,
-                                length,
-                                trajectory_pdb,
-                                binder_chain,
-                                prediction_models,
-                                advanced_settings,
-                                design_paths,
-                            )
-
+                    for mpnn_design_name in chunk_names:
+                        complex_statistics, pass_af2_filters, binder_statistics = batch[
+                            mpnn_design_name
+                        ]
+                        unmet = []
+                        if pass_af2_filters:
                             # extract RMSDs of binder to the original trajectory
                             for model_num in prediction_models:
                                 mpnn_binder_pdb = os.path.join(
@@ -779,261 +1428,573 @@ def bindcraft(
                                     {"Binder_RMSD": rmsd_binder}
                                 )
 
-                                # save space by removing binder monomer models?
-                                if advanced_settings["remove_binder_monomer"]:
-                                    os.remove(mpnn_binder_pdb)
-
-                            # calculate binder averages
-                            binder_averages = calculate_averages(binder_statistics)
+                            # the AF2 and binder metrics are known before any CPU scoring
+                            if staged_filters:
+                                unmet = unmet_filters(
+                                    filters,
+                                    stage_columns(
+                                        complex_statistics, FILTER_STAGES["af2"]
+                                    )
+                                    | stage_columns(
+                                        binder_statistics,
+                                        FILTER_STAGES["binder"],
+                                        prefix="Binder_",
+                                    ),
+                                )
 
-                            # analyze sequence to make sure there are no cysteins and it contains residues that absorb UV for detection
-                            seq_notes = validate_design_sequence(
-                                mpnn_sequence["seq"],
-                                mpnn_complex_averages.get("Relaxed_Clashes", None),
+                        model_pdbs = {
+                            model_num + 1: (
+                                os.path.join(
+                                    design_paths["MPNN"],
+                                    f"{mpnn_design_name}_model{model_num + 1}.pdb",
+                                ),
+                                os.path.join(
+                                    design_paths["MPNN/Relaxed"],
+                                    f"{mpnn_design_name}_model{model_num + 1}.pdb",
+                                ),
+                            )
+                            for model_num in prediction_models
+                        }
+                        model_pdbs = {
+                            model_num: pdbs
+                            for model_num, pdbs in model_pdbs.items()
+                            if os.path.exists(pdbs[0])
+                        }
+                        design_score = None
+                        if pass_af2_filters and not unmet and model_pdbs:
+                            design_score = design_pool.submit(
+                                score_mpnn_design,
+                                scoring_pool,
+                                model_pdbs,
+                                trajectory_pdb,
+                                target_settings["starting_pdb"],
+                                target_settings["chains"],
+                                binder_chain,
                                 advanced_settings,
+                                filters if staged_filters else None,
                             )
+                        mpnn_batch[mpnn_design_name] = (
+                            complex_statistics,
+                            pass_af2_filters,
+                            binder_statistics,
+                            design_score,
+                            unmet,
+                        )
 
-                            # measure time to generate design
-                            mpnn_end_time = time.time() - mpnn_time
-                            elapsed_mpnn_text = f"{'%d hours, %d minutes, %d seconds' % (int(mpnn_end_time // 3600), int((mpnn_end_time % 3600) // 60), int(mpnn_end_time % 60))}"
-
-                            # Insert statistics about MPNN design into CSV, will return None if corresponding model does note exist
-                            model_numbers = range(1, 6)
-                            statistics_labels = [
-                                "pLDDT",
-                                "pTM",
-                                "i_pTM",
-                                "pAE",
-                                "i_pAE",
-                                "i_pLDDT",
-                                "ss_pLDDT",
-                                "Unrelaxed_Clashes",
-                                "Relaxed_Clashes",
-                                "Binder_Energy_Score",
-                                "Surface_Hydrophobicity",
-                                "ShapeComplementarity",
-                                "PackStat",
-                                "dG",
-                                "dSASA",
-                                "dG/dSASA",
-                                "Interface_SASA_%",
-                                "Interface_Hydrophobicity",
-                                "n_InterfaceResidues",
-                                "n_InterfaceHbonds",
-                                "InterfaceHbondsPercentage",
-                                "n_InterfaceUnsatHbonds",
-                                "InterfaceUnsatHbondsPercentage",
-                                "Interface_Helix%",
-                                "Interface_BetaSheet%",
-                                "Interface_Loop%",
-                                "Binder_Helix%",
-                                "Binder_BetaSheet%",
-                                "Binder_Loop%",
-                                "InterfaceAAs",
-                                "Hotspot_RMSD",
-                                "Target_RMSD",
-                            ]
-
-                            # Initialize mpnn_data with the non-statistical data
-                            mpnn_data = [
-                                mpnn_design_name,
-                                advanced_settings["design_algorithm"],
-                                length,
-                                seed,
-                                helicity_value,
-                                target_settings["target_hotspot_residues"],
-                                mpnn_sequence["seq"],
-                                mpnn_interface_residues,
-                                mpnn_score,
-                                mpnn_seqid,
-                            ]
-
-                            # Add the statistical data for mpnn_complex
-                            for label in statistics_labels:
-                                mpnn_data.append(mpnn_complex_averages.get(label, None))
-                                for model in model_numbers:
-                                    mpnn_data.append(
-                                        mpnn_complex_statistics.get(model, {}).get(
-                                            label, None
-                                        )
-                                    )
+                # iterate over designed sequences, predicted in chunks
+                for mpnn_sequence in mpnn_sequences:
+                    mpnn_time = time.time()
+
+                    # generate mpnn design name numbering
+                    mpnn_design_name = design_name + "_mpnn" + str(mpnn_n)
+                    mpnn_score = round(mpnn_sequence["score"], 2)
+                    mpnn_seqid = round(mpnn_sequence["seqid"], 2)
+
+                    # add design to dictionary
+                    mpnn_dict[mpnn_design_name] = {
+                        "seq": mpnn_sequence["seq"],
+                        "score": mpnn_score,
+                        "seqid": mpnn_seqid,
+                    }
+
+                    # save fasta sequence
+                    if advanced_settings["save_mpnn_fasta"] is True:
+                        save_fasta(mpnn_design_name, mpnn_sequence["seq"], design_paths)
+
+                    ### Predict mpnn redesigned binder complexes using masked templates, in
+                    ### chunks and ahead of the scoring, so the GPU predicts while the current
+                    ### design is scored. No more designs are in flight than may still be
+                    ### accepted, so the loop never stops with predicted designs left over
+                    remaining = min(
+                        advanced_settings["max_mpnn_sequences"] - accepted_mpnn,
+                        target_settings["number_of_final_designs"] - accepted_designs,
+                    )
+                    if mpnn_design_name not in mpnn_batch:
+                        predict_chunk(min(mpnn_batch_size, remaining))
+                    predict_chunk(min(mpnn_batch_size, remaining - len(mpnn_batch)))
+
+                    (
+                        mpnn_complex_statistics,
+                        pass_af2_filters,
+                        binder_statistics,
+                        design_score,
+                        unmet,
+                    ) = mpnn_batch.pop(mpnn_design_name)
+
+                    # if AF2 filters are not passed then skip the scoring
+                    if not pass_af2_filters:
+                        print(
+                            f"Base AF2 filters not passed for {mpnn_design_name}, skipping interface scoring"
+                        )
+                        stats.insert(filter_stages_csv, [mpnn_design_name, "af2", ""])
+                        mpnn_n += 1
+                        continue
+
+                    # collect the statistics of each model, scored stage by stage in the
+                    # scoring pool
+                    mpnn_interface_residues = None
+                    if design_score is not None:
+                        (
+                            model_statistics,
+                            mpnn_interface_residues,
+                            stage_unmet,
+                        ) = design_score.result()
+                        unmet += stage_unmet
+                        for model_num, statistics in model_statistics.items():
+                            # add the additional statistics to the mpnn_complex_statistics dictionary
+                            mpnn_complex_statistics[model_num].update(statistics)
+
+                    # save space by removing unrelaxed predicted mpnn complex pdb?, also
+                    # for the models of designs a stage rejected before their CPU scoring
+                    if advanced_settings["remove_unrelaxed_complex"]:
+                        for model_num in prediction_models:
+                            unrelaxed_pdb = os.path.join(
+                                design_paths["MPNN"],
+                                f"{mpnn_design_name}_model{model_num + 1}.pdb",
+                            )
+                            if os.path.exists(unrelaxed_pdb):
+                                os.remove(unrelaxed_pdb)
 
-                            # Add the statistical data for binder
-                            for label in [
-                                "pLDDT",
-                                "pTM",
-                                "pAE",
-                                "Binder_RMSD",
-                            ]:  # These are the labels for binder alone
-                                mpnn_data.append(binder_averages.get(label, None))
-                                for model in model_numbers:
-                                    mpnn_data.append(
-                                        binder_statistics.get(model, {}).get(
-                                            label, None
-                                        )
-                                    )
+                    # calculate complex averages
+                    mpnn_complex_averages = calculate_averages(
+                        mpnn_complex_statistics, handle_aa=True
+                    )
 
-                            # Add the remaining non-statistical data
-                            mpnn_data.extend(
-                                [
-                                    elapsed_mpnn_text,
-                                    seq_notes,
-                                    settings_file,
-                                    filters_file,
-                                    advanced_file,
-                                ]
+                    # save space by removing binder monomer models?
+                    if advanced_settings["remove_binder_monomer"]:
+                        for model_num in prediction_models:
+                            os.remove(
+                                os.path.join(
+                                    design_paths["MPNN/Binder"],
+                                    f"{mpnn_design_name}_model{model_num + 1}.pdb",
+                                )
                             )
 
-                            # insert data into csv
-                            insert_data(mpnn_csv, mpnn_data)
+                    # calculate binder averages
+                    binder_averages = calculate_averages(binder_statistics)
 
-                            # find best model number by pLDDT
-                            plddt_values = {
-                                i: mpnn_data[i]
-                                for i in range(11, 15)
-                                if mpnn_data[i] is not None
-                            }
+                    # analyze sequence to make sure there are no cysteins and it contains residues that absorb UV for detection
+                    seq_notes = validate_design_sequence(
+                        mpnn_sequence["seq"],
+                        # designs rejected before the clash stage count as clash-free
+                        mpnn_complex_averages.get("Relaxed_Clashes", 0),
+                        advanced_settings,
+                    )
 
-                            # Find the key with the highest value
-                            highest_plddt_key = int(
-                                max(plddt_values, key=plddt_values.get)
+                    # measure time to generate design
+                    mpnn_end_time = time.time() - mpnn_time
+                    elapsed_mpnn_text = f"{'%d hours, %d minutes, %d seconds' % (int(mpnn_end_time // 3600), int((mpnn_end_time % 3600) // 60), int(mpnn_end_time % 60))}"
+
+                    # Insert statistics about MPNN design into CSV, will return None if corresponding model does note exist
+                    model_numbers = range(1, 6)
+                    statistics_labels = [
+                        "pLDDT",
+                        "pTM",
+                        "i_pTM",
+                        "pAE",
+                        "i_pAE",
+                        "i_pLDDT",
+                        "ss_pLDDT",
+                        "Unrelaxed_Clashes",
+                        "Relaxed_Clashes",
+                        "Binder_Energy_Score",
+                        "Surface_Hydrophobicity",
+                        "ShapeComplementarity",
+                        "PackStat",
+                        "dG",
+                        "dSASA",
+                        "dG/dSASA",
+                        "Interface_SASA_%",
+                        "Interface_Hydrophobicity",
+                        "n_InterfaceResidues",
+                        "n_InterfaceHbonds",
+                        "InterfaceHbondsPercentage",
+                        "n_InterfaceUnsatHbonds",
+                        "InterfaceUnsatHbondsPercentage",
+                        "Interface_Helix%",
+                        "Interface_BetaSheet%",
+                        "Interface_Loop%",
+                        "Binder_Helix%",
+                        "Binder_BetaSheet%",
+                        "Binder_Loop%",
+                        "InterfaceAAs",
+                        "Hotspot_RMSD",
+                        "Target_RMSD",
+                    ]
+
+                    # Initialize mpnn_data with the non-statistical data
+                    mpnn_data = [
+                        mpnn_design_name,
+                        advanced_settings["design_algorithm"],
+                        length,
+                        seed,
+                        helicity_value,
+                        target_settings["target_hotspot_residues"],
+                        mpnn_sequence["seq"],
+                        mpnn_interface_residues,
+                        mpnn_score,
+                        mpnn_seqid,
+                    ]
+
+                    # Add the statistical data for mpnn_complex
+                    for label in statistics_labels:
+                        mpnn_data.append(mpnn_complex_averages.get(label, None))
+                        for model in model_numbers:
+                            mpnn_data.append(
+                                mpnn_complex_statistics.get(model, {}).get(label, None)
                             )
 
-                            # Output the number part of the key
-                            best_model_number = highest_plddt_key - 10
-                            best_model_pdb = os.path.join(
-                                design_paths["MPNN/Relaxed"],
-                                f"{mpnn_design_name}_model{best_model_number}.pdb",
+                    # Add the statistical data for binder
+                    for label in [
+                        "pLDDT",
+                        "pTM",
+                        "pAE",
+                        "Binder_RMSD",
+                    ]:  # These are the labels for binder alone
+                        mpnn_data.append(binder_averages.get(label, None))
+                        for model in model_numbers:
+                            mpnn_data.append(
+                                binder_statistics.get(model, {}).get(label, None)
                             )
 
-                            # run design data against filter thresholds
-                            filter_conditions = check_filters(
-                                mpnn_data, design_labels, filters
+                    # Add the remaining non-statistical data
+                    mpnn_data.extend(
+                        [
+                            elapsed_mpnn_text,
+                            seq_notes,
+                            settings_file,
+                            filters_file,
+                            advanced_file,
+                        ]
+                    )
+
+                    # insert data into csv
+                    stats.insert_mpnn(mpnn_csv, mpnn_data)
+
+                    # find best model number by pLDDT
+                    plddt_values = {
+                        i: mpnn_data[i] for i in range(11, 15) if mpnn_data[i] is not None
+                    }
+
+                    # Find the key with the highest value
+                    highest_plddt_key = int(max(plddt_values, key=plddt_values.get))
+
+                    # Output the number part of the key
+                    best_model_number = highest_plddt_key - 10
+                    best_model_pdb = os.path.join(
+                        design_paths["MPNN/Relaxed"],
+                        f"{mpnn_design_name}_model{best_model_number}.pdb",
+                    )
+
+                    # run design data against filter thresholds, unless a stage already rejected it
+                    filter_conditions = unmet or check_filters(
+                        mpnn_data, design_labels, filters
+                    )
+                    if filter_conditions is True and (
+                        accepted_designs >= target_settings["number_of_final_designs"]
+                        if budget is None
+                        else not budget.claim("accepted")
+                    ):
+                        # this trajectory or another worker accepted the last design first
+                        print(
+                            f"{mpnn_design_name} passed all filters, but the design target is reached"
+                        )
+                        break
+                    if filter_conditions is True:
+                        print(mpnn_design_name + " passed all filters")
+                        accepted_mpnn += 1
+                        accepted_designs += 1
+
+                        # copy designs to accepted folder
+                        shutil.copy(best_model_pdb, design_paths["Accepted"])
+
+                        # insert data into final csv
+                        final_data = [""] + mpnn_data
+                        stats.insert(final_csv, final_data)
+
+                        # copy animation from accepted trajectory
+                        if advanced_settings["save_design_animations"]:
+                            accepted_animation = os.path.join(
+                                design_paths["Accepted/Animation"],
+                                f"{design_name}.html",
                             )
-                            if filter_conditions is True:
-                                print(mpnn_design_name + " passed all filters")
-                                accepted_mpnn += 1
-                                accepted_designs += 1
-
-                                # copy designs to accepted folder
-                                shutil.copy(best_model_pdb, design_paths["Accepted"])
-
-                                # insert data into final csv
-                                final_data = [""] + mpnn_data
-                                insert_data(final_csv, final_data)
-
-                                # copy animation from accepted trajectory
-                                if advanced_settings["save_design_animations"]:
-                                    accepted_animation = os.path.join(
-                                        design_paths["Accepted/Animation"],
+                            if not os.path.exists(accepted_animation):
+                                shutil.copy(
+                                    os.path.join(
+                                        design_paths["Trajectory/Animation"],
                                         f"{design_name}.html",
-                                    )
-                                    if not os.path.exists(accepted_animation):
-                                        shutil.copy(
-                                            os.path.join(
-                                                design_paths["Trajectory/Animation"],
-                                                f"{design_name}.html",
-                                            ),
-                                            accepted_animation,
-                                        )
-
-                                # copy plots of accepted trajectory
-                                plot_files = os.listdir(
-                                    design_paths["Trajectory/Plots"]
+                                    ),
+                                    accepted_animation,
                                 )
-                                plots_to_copy = [
-                                    f
-                                    for f in plot_files
-                                    if f.startswith(design_name) and f.endswith(".png")
-                                ]
-                                for accepted_plot in plots_to_copy:
-                                    source_plot = os.path.join(
-                                        design_paths["Trajectory/Plots"], accepted_plot
-                                    )
-                                    target_plot = os.path.join(
-                                        design_paths["Accepted/Plots"], accepted_plot
-                                    )
-                                    if not os.path.exists(target_plot):
-                                        shutil.copy(source_plot, target_plot)
-
-                            else:
-                                print(f"Unmet filter conditions for {mpnn_design_name}")
-                                failure_df = pd.read_csv(failure_csv)
-                                special_prefixes = (
-                                    "Average_",
-                                    "1_",
-                                    "2_",
-                                    "3_",
-                                    "4_",
-                                    "5_",
-                                )
-                                incremented_columns = set()
-
-                                for column in filter_conditions:
-                                    base_column = column
-                                    for prefix in special_prefixes:
-                                        if column.startswith(prefix):
-                                            base_column = column.split("_", 1)[1]
-
-                                    if base_column not in incremented_columns:
-                                        failure_df[base_column] = (
-                                            failure_df[base_column] + 1
-                                        )
-                                        incremented_columns.add(base_column)
-
-                                failure_df.to_csv(failure_csv, index=False)
-                                shutil.copy(best_model_pdb, design_paths["Rejected"])
-
-                            # increase MPNN design number
-                            mpnn_n += 1
-
-                            # if enough mpnn sequences of the same trajectory pass filters then stop
-                            if accepted_mpnn >= advanced_settings["max_mpnn_sequences"]:
-                                break
-
-                        if accepted_mpnn >= 1:
-                            print(
-                                "Found "
-                                + str(accepted_mpnn)
-                                + " MPNN designs passing filters"
+
+                        # copy plots of accepted trajectory
+                        plot_files = os.listdir(design_paths["Trajectory/Plots"])
+                        plots_to_copy = [
+                            f
+                            for f in plot_files
+                            if f.startswith(design_name) and f.endswith(".png")
+                        ]
+                        for accepted_plot in plots_to_copy:
+                            source_plot = os.path.join(
+                                design_paths["Trajectory/Plots"], accepted_plot
+                            )
+                            target_plot = os.path.join(
+                                design_paths["Accepted/Plots"], accepted_plot
                             )
-                        else:
-                            print("No accepted MPNN designs found for this trajectory.")
+                            if not os.path.exists(target_plot):
+                                shutil.copy(source_plot, target_plot)
 
                     else:
-                        print(
-                            "Duplicate MPNN designs sampled with different trajectory, skipping current trajectory optimisation"
+                        print(f"Unmet filter conditions for {mpnn_design_name}")
+                        stats.add_failures(filter_conditions)
+                        stats.insert(
+                            filter_stages_csv,
+                            [
+                                mpnn_design_name,
+                                filter_stage(filter_conditions),
+                                ";".join(filter_conditions),
+                            ],
                         )
+                        shutil.copy(best_model_pdb, design_paths["Rejected"])
 
-                    # save space by removing unrelaxed design trajectory PDB
-                    if advanced_settings["remove_unrelaxed_trajectory"]:
-                        os.remove(trajectory_pdb)
+                    # increase MPNN design number
+                    mpnn_n += 1
 
-                    # measure time it took to generate designs for one trajectory
-                    design_time = time.time() - design_start_time
-                    design_time_text = f"{'%d hours, %d minutes, %d seconds' % (int(design_time // 3600), int((design_time % 3600) // 60), int(design_time % 60))}"
-                    print(
-                        "Design and validation of trajectory "
-                        + design_name
-                        + " took: "
-                        + design_time_text
+                    # if enough mpnn sequences of the same trajectory pass filters then stop
+                    if accepted_mpnn >= advanced_settings["max_mpnn_sequences"]:
+                        break
+
+                # designs are only left over when the global target of a fan-out run was
+                # reached; drop their scoring and predicted models
+                for mpnn_design_name, (*_, design_score, _) in mpnn_batch.items():
+                    if design_score is not None:
+                        design_score.cancel()
+                    for model_dir in ["MPNN", "MPNN/Relaxed", "MPNN/Binder"]:
+                        for model_num in prediction_models:
+                            model_pdb = os.path.join(
+                                design_paths[model_dir],
+                                f"{mpnn_design_name}_model{model_num + 1}.pdb",
+                            )
+                            if os.path.exists(model_pdb):
+                                os.remove(model_pdb)
+
+                if accepted_mpnn >= 1:
+                    print("Found " + str(accepted_mpnn) + " MPNN designs passing filters")
+                else:
+                    print("No accepted MPNN designs found for this trajectory.")
+
+            else:
+                print(
+                    "Duplicate MPNN designs sampled with different trajectory, skipping current trajectory optimisation"
+                )
+
+            # save space by removing unrelaxed design trajectory PDB
+            if advanced_settings["remove_unrelaxed_trajectory"]:
+                os.remove(trajectory_pdb)
+
+            # measure time it took to generate designs for one trajectory
+            design_time = time.time() - design_start_time
+            design_time_text = f"{'%d hours, %d minutes, %d seconds' % (int(design_time // 3600), int((design_time % 3600) // 60), int(design_time % 60))}"
+            print(
+                "Design and validation of trajectory "
+                + design_name
+                + " took: "
+                + design_time_text
+            )
+
+        # analyse the rejection rate of trajectories to see if we need to readjust the design weights
+        if (
+            pending["trajectory_n"] >= advanced_settings["start_monitoring"]
+            and advanced_settings["enable_rejection_check"]
+        ):
+            acceptance = accepted_designs / pending["trajectory_n"]
+            if not acceptance >= advanced_settings["acceptance_rate"]:
+                print(
+                    "The ratio of successful designs is lower than defined acceptance rate! Consider changing your design settings!"
+                )
+                print("Script execution stopping...")
+                return False
+
+        return True
+
+    ### start design loop; each trajectory is scored in the scoring pool while the
+    ### next one is hallucinated, and finished (MPNN designs) one iteration later
+    try:
+        pending_trajectory = None
+        while True:
+            ### check if the workers of a fan-out run reached the global budgets
+            if budget is not None and budget.exhausted():
+                break
+
+            ### check if we have the target number of binders, which ranks the designs of mpnn_csv
+            if accepted_designs >= target_settings["number_of_final_designs"]:
+                stats.flush()
+            final_designs_reached = check_accepted_designs(
+                design_paths,
+                mpnn_csv,
+                final_labels,
+                final_csv,
+                advanced_settings,
+                target_settings,
+                design_labels,
+            )
+
+            if final_designs_reached:
+                # stop design loop execution
+                break
+
+            ### check if we reached maximum allowed trajectories; counted from trajectory_n,
+            ### as Trajectory/Relaxed misses the trajectory still being scored
+            if (
+                advanced_settings["max_trajectories"] is not False
+                and trajectory_n - 1 >= advanced_settings["max_trajectories"]
+            ):
+                print(
+                    f"Target number of {trajectory_n - 1} trajectories reached, stopping execution..."
+                )
+                break
+
+            ### Initialise design
+            # measure time to generate design
+            trajectory_start_time = time.time()
+
+            # generate random seed to vary designs
+            seed = int(np.random.randint(0, high=999999, size=1, dtype=int)[0])
+
+            # sample binder design length randomly from defined distribution, on a grid of
+            # length_step so that fewer distinct lengths need compiled prediction models
+            samples = np.arange(
+                min(target_settings["lengths"]),
+                max(target_settings["lengths"]) + 1,
+                max(length_step, 1),
+            )
+            length = np.random.choice(samples)
+
+            # load desired helicity value to sample different secondary structure contents
+            helicity_value = load_helicity(advanced_settings)
+
+            # generate design name and check if same trajectory was already run
+            design_name = (
+                target_settings["binder_name"] + "_l" + str(length) + "_s" + str(seed)
+            )
+            trajectory_dirs = [
+                "Trajectory",
+                "Trajectory/Relaxed",
+                "Trajectory/LowConfidence",
+                "Trajectory/Clashing",
+            ]
+            trajectory_exists = (int(length), seed) in tried_trajectories or any(
+                os.path.exists(
+                    os.path.join(design_paths[trajectory_dir], design_name + ".pdb")
+                )
+                for trajectory_dir in trajectory_dirs
+            )
+
+            if not trajectory_exists:
+                if budget is not None and not budget.claim("trajectories"):
+                    break
+                print("Starting trajectory: " + design_name)
+
+                ### Begin binder hallucination
+                with model_cache.protect(binder_hallucination):
+                    trajectory = binder_hallucination(
+                        design_name,
+                        target_settings["starting_pdb"],
+                        target_settings["chains"],
+                        target_settings["target_hotspot_residues"],
+                        length,
+                        seed,
+                        helicity_value,
+                        design_models,
+                        advanced_settings,
+                        design_paths,
+                        failure_csv,
                     )
+                trajectory_metrics = copy_dict(
+                    trajectory.aux["log"]
+                )  # contains plddt, ptm, i_ptm, pae, i_pae
+                trajectory_pdb = os.path.join(
+                    design_paths["Trajectory"], design_name + ".pdb"
+                )
 
-                # analyse the rejection rate of trajectories to see if we need to readjust the design weights
-                if (
-                    trajectory_n >= advanced_settings["start_monitoring"]
-                    and advanced_settings["enable_rejection_check"]
-                ):
-                    acceptance = accepted_designs / trajectory_n
-                    if not acceptance >= advanced_settings["acceptance_rate"]:
-                        print(
-                            "The ratio of successful designs is lower than defined acceptance rate! Consider changing your design settings!"
-                        )
-                        print("Script execution stopping...")
-                        break
+                # round the metrics to two decimal places
+                trajectory_metrics = {
+                    k: round(v, 2) if isinstance(v, float) else v
+                    for k, v in trajectory_metrics.items()
+                }
 
-            # increase trajectory number
-            trajectory_n += 1
+                # time trajectory
+                trajectory_time = time.time() - trajectory_start_time
+                trajectory_time_text = f"{'%d hours, %d minutes, %d seconds' % (int(trajectory_time // 3600), int((trajectory_time % 3600) // 60), int(trajectory_time % 60))}"
+                print("Starting trajectory took: " + trajectory_time_text)
+                if start_to_first_trajectory is None:
+                    start_to_first_trajectory = round(time.time() - start_time, 1)
+                    print(
+                        f"Start to first trajectory latency: {start_to_first_trajectory}s"
+                    )
+                print("")
+
+                # Proceed if there is no trajectory termination signal
+                next_trajectory = None
+                if trajectory_metrics["terminate"] == "":
+                    # Relax and score the trajectory in the scoring pool
+                    trajectory_relaxed = os.path.join(
+                        design_paths["Trajectory/Relaxed"], design_name + ".pdb"
+                    )
+                    next_trajectory = {
+                        "trajectory_n": trajectory_n,
+                        "design_name": design_name,
+                        "length": length,
+                        "seed": seed,
+                        "helicity_value": helicity_value,
+                        "trajectory_pdb": trajectory_pdb,
+                        "trajectory_metrics": trajectory_metrics,
+                        # starting binder sequence
+                        "trajectory_sequence": trajectory.get_seq(get_best=True)[0],
+                        "trajectory_time_text": trajectory_time_text,
+                        "scores": scoring_pool.submit(
+                            score_trajectory,
+                            trajectory_pdb,
+                            trajectory_relaxed,
+                            target_settings["starting_pdb"],
+                            target_settings["chains"],
+                            binder_chain,
+                            advanced_settings,
+                        ),
+                    }
+
+                # increase trajectory number
+                trajectory_n += 1
+                tried_trajectories.add((int(length), seed))
+
+                # finish the previous trajectory while this one is being scored
+                keep_running = True
+                if pending_trajectory is not None:
+                    keep_running = finish_trajectory(pending_trajectory)
+                pending_trajectory = next_trajectory
+
+                # persist the finished trajectory, so a preempted run loses at most the
+                # trajectory still being scored
+                stats.flush()
+                save_checkpoint(
+                    design_path, trajectory_n, accepted_designs, tried_trajectories
+                )
+                runs_volume.commit()
+
+                if not keep_running:
+                    pending_trajectory = None
+                    break
+
+        # finish the last trajectory still in flight
+        if pending_trajectory is not None:
+            finish_trajectory(pending_trajectory)
+    finally:
+        scoring_pool.shutdown(cancel_futures=True)
+        design_pool.shutdown(cancel_futures=True)
+        # write out the buffered statistics, also when the run fails
+        stats.flush()
+        save_checkpoint(design_path, trajectory_n, accepted_designs, tried_trajectories)
+        runs_volume.commit()
 
     ### Script finished
     elapsed_time = time.time() - script_start_time
@@ -1044,54 +2005,177 @@ def bindcraft(
         + " trajectories took: "
         + elapsed_text
     )
+    print(
+        f"Prediction model cache: {model_cache.hits} hits, {model_cache.misses} misses"
+    )
 
     # Consolidate & Rank Designs
-    accepted_binders = [
-        f for f in os.listdir(design_paths["Accepted"]) if f.endswith(".pdb")
-    ]
+    rank_accepted_designs(
+        [design_paths["Accepted"]],
+        [mpnn_csv],
+        design_paths["Accepted/Ranked"],
+        final_csv,
+        design_labels,
+    )
+    runs_volume.commit()
+
+    return {
+        "design_path": design_path,
+        "trajectories": trajectory_n - 1,
+        "accepted_designs": accepted_designs,
+        "start_to_first_trajectory": start_to_first_trajectory,
+    }
+
+
+def rank_accepted_designs(
+    accepted_dirs: list[str],
+    mpnn_csvs: list[str],
+    ranked_dir: str,
+    final_csv: str,
+    design_labels: list[str],
+    max_workers: int = 16,
+) -> int:
+    """Ranks the accepted designs by Average_i_pTM into `final_csv` and `ranked_dir`.
+
+    The accepted PDB names are parsed once and joined on `Design` with the sorted
+    MPNN statistics, so ranking stays cheap with tens of thousands of MPNN rows.
+    Several runs, e.g. the workers of a fan-out run, are ranked together in one pass.
+
+    Args:
+        accepted_dirs (list[str]): Accepted directories of the runs.
+        mpnn_csvs (list[str]): MPNN design statistics CSVs of the runs.
+        ranked_dir (str): Directory to copy the ranked PDBs to, emptied first.
+        final_csv (str): Path to write the ranked statistics to.
+        design_labels (list[str]): Column labels of the MPNN CSVs.
+        max_workers (int): Number of threads copying the ranked PDBs.
+
+    Returns:
+        int: Number of ranked designs.
+    """
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
 
-    for f in os.listdir(design_paths["Accepted/Ranked"]):
-        os.remove(os.path.join(design_paths["Accepted/Ranked"], str(f)))
+    import numpy as np
+    import pandas as pd
 
-    # load dataframe of designed binders
-    design_df = pd.read_csv(mpnn_csv)
+    for f in os.listdir(ranked_dir):
+        os.remove(os.path.join(ranked_dir, str(f)))
+
+    # accepted PDBs are named {design}_model{n}.pdb, only the first model of a design is ranked
+    accepted_df = pd.DataFrame(
+        [
+            (accepted_dir, f, *f.rsplit("_model", 1))
+            for accepted_dir in accepted_dirs
+            for f in sorted(os.listdir(accepted_dir))
+            if f.endswith(".pdb")
+        ],
+        columns=["Dir", "File", "Design", "Model"],
+    ).drop_duplicates("Design")
+
+    # load dataframe of designed binders, the join keeps the Average_i_pTM order
+    design_df = pd.concat([pd.read_csv(mpnn_csv) for mpnn_csv in mpnn_csvs])
     design_df = design_df.sort_values("Average_i_pTM", ascending=False)
+    ranked_df = design_df.drop_duplicates("Design").merge(accepted_df, on="Design", how="inner")
+    ranked_df.insert(0, "Rank", np.arange(1, len(ranked_df) + 1))
+
+    # copy them with new ranked IDs to the folder
+    copies = [
+        (
+            os.path.join(row.Dir, row.File),
+            os.path.join(
+                ranked_dir,
+                f"{row.Rank}_{row.Design}_model{row.Model.rsplit('.', 1)[0]}.pdb",
+            ),
+        )
+        for row in ranked_df[["Rank", "Design", "Model", "Dir", "File"]].itertuples()
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda paths: shutil.copyfile(*paths), copies))
 
-    # create final csv dataframe to copy matched rows, initialize with the column labels
-    final_df = pd.DataFrame(columns=final_labels)
-
-    # check the ranking of the designs and copy them with new ranked IDs to the folder
-    rank = 1
-    for _, row in design_df.iterrows():
-        for binder in accepted_binders:
-            target_settings["binder_name"], model = binder.rsplit("_model", 1)
-            if target_settings["binder_name"] == row["Design"]:
-                # rank and copy into ranked folder
-                row_data = {
-                    "Rank": rank,
-                    **{label: row[label] for label in design_labels},
-                }
-                final_df = pd.concat(
-                    [final_df, pd.DataFrame([row_data])], ignore_index=True
-                )
-                old_path = os.path.join(design_paths["Accepted"], binder)
-                new_path = os.path.join(
-                    design_paths["Accepted/Ranked"],
-                    f"{rank}_{target_settings['binder_name']}_model{model.rsplit('.', 1)[0]}.pdb",
-                )
-                shutil.copyfile(old_path, new_path)
+    ranked_df[["Rank"] + design_labels].to_csv(final_csv, index=False)
+    return len(ranked_df)
 
-                rank += 1
-                break
 
-    # save the final_df to final_csv
-    final_df.to_csv(final_csv, index=False)
+@app.function(image=image, timeout=30 * 60, volumes={RUNS_DIR: runs_volume})
+def rank_fan_out(run_path: str, n_workers: int):
+    """Ranks the accepted designs of all workers of a fan-out run in one pass.
+
+    Writes `final_design_stats.csv` and Accepted/Ranked at the root of the run, next
+    to the `worker{i}` directories, as a run on a single container would.
 
-    out_dir = design_path
-    return [
-        (out_file.relative_to(out_dir), open(out_file, "rb").read())
-        for out_file in Path(out_dir).glob("**/*.*")
+    Args:
+        run_path (str): Path of the run directory relative to the volume root.
+        n_workers (int): Number of workers of the run.
+    """
+    from bindcraft.functions import generate_dataframe_labels
+
+    runs_volume.reload()
+    run_dir = os.path.join(RUNS_DIR, run_path)
+    worker_dirs = [
+        worker_dir
+        for worker_dir in (os.path.join(run_dir, f"worker{i}") for i in range(n_workers))
+        if os.path.exists(os.path.join(worker_dir, "mpnn_design_stats.csv"))
     ]
+    ranked_dir = os.path.join(run_dir, "Accepted", "Ranked")
+    os.makedirs(ranked_dir, exist_ok=True)
+
+    _, design_labels, _ = generate_dataframe_labels()
+    n_ranked = rank_accepted_designs(
+        [os.path.join(worker_dir, "Accepted") for worker_dir in worker_dirs],
+        [os.path.join(worker_dir, "mpnn_design_stats.csv") for worker_dir in worker_dirs],
+        ranked_dir,
+        os.path.join(run_dir, "final_design_stats.csv"),
+        design_labels,
+    )
+    runs_volume.commit()
+    print(f"Ranked {n_ranked} accepted designs of {len(worker_dirs)} workers")
+
+
+def pull_outputs(run_path: str, local_dir: str, include_trajectories: bool = False):
+    """Downloads the files of a run from `runs_volume` that are missing locally.
+
+    Files that already exist locally with the same size and modification time are
+    skipped, so calling this repeatedly on a running or finished run only transfers
+    the deltas. Downloaded files get the modification time of their volume copy.
+
+    Args:
+        run_path (str): Path of the run directory relative to the volume root.
+        local_dir (str): Local directory mirroring `run_path`.
+        include_trajectories (bool, optional): Whether to also pull the heavy
+            Trajectory and Animation folders. Defaults to False.
+
+    Returns:
+        int: Number of files downloaded.
+    """
+    from modal.volume import FileEntryType
+
+    n_downloaded = 0
+    for entry in runs_volume.listdir(run_path, recursive=True):
+        if entry.type != FileEntryType.FILE:
+            continue
+
+        rel_path = Path(entry.path).relative_to(run_path)
+        if not include_trajectories and any(
+            part in HEAVY_OUTPUT_DIRS for part in rel_path.parts
+        ):
+            continue
+
+        output_path = Path(local_dir) / rel_path
+        if output_path.exists():
+            stat = output_path.stat()
+            if stat.st_size == entry.size and int(stat.st_mtime) == entry.mtime:
+                continue
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "wb") as out:
+            for chunk in runs_volume.read_file(entry.path):
+                out.write(chunk)
+        # files rewritten in place at the same size, e.g. checkpoint.json, differ in mtime
+        os.utime(output_path, (entry.mtime, entry.mtime))
+        n_downloaded += 1
+
+    print(f"Pulled {n_downloaded} new or changed files from {run_path}")
+    return n_downloaded
 
 
 @app.local_entrypoint()
@@ -1105,6 +2189,14 @@ def main(
     binder_name: str | None = None,
     out_dir: str = "./out/bindcraft",
     run_name: str | None = None,
+    workers: int = 1,
+    include_trajectories: bool = False,
+    resume: bool = False,
+    mpnn_batch_size: int = 4,
+    model_cache_size: int = 8,
+    length_step: int = 1,
+    cpu_workers: int | None = None,
+    staged_filters: bool = True,
 ):
     """Local entrypoint to run BindCraft binder design.
 
@@ -1126,21 +2218,49 @@ def main(
         run_name (str | None, optional): Optional name for the run, used to create a subdirectory
                                          in `out_dir`. If None, a timestamp-based name is used.
                                          Defaults to None.
+        workers (int, optional): Number of GPU containers to fan the trajectories out over.
+                                 The workers share `number_of_final_designs` and `max_trajectories`
+                                 as global budgets, and each worker's outputs are saved in a
+                                 `worker{i}` subdirectory; the accepted designs of all workers
+                                 are then ranked together at the root of the run.
+                                 Defaults to 1.
+        include_trajectories (bool, optional): Whether to also pull the heavy Trajectory and
+                                               Animation folders. Defaults to False.
+        resume (bool, optional): Continue the run `run_name` from its checkpointed counters
+                                 on the volume instead of starting from scratch.
+                                 Defaults to False.
+        mpnn_batch_size (int, optional): Maximum number of MPNN sequences predicted back to back
+                                         on the GPU ahead of their scoring. Defaults to 4.
+        model_cache_size (int, optional): Number of compiled AF2 prediction models kept per
+                                          container. Defaults to 8.
+        length_step (int, optional): Sample binder lengths on a grid of this step, so fewer
+                                     prediction models need compiling. Defaults to 1.
+        cpu_workers (int | None, optional): Number of PyRosetta processes relaxing and scoring
+                                            structures while the GPU predicts. Defaults to
+                                            one less than the container's CPUs.
+        staged_filters (bool, optional): Skip the remaining scoring of a design as soon as
+                                         a cheaper filter stage rejects it. failure_csv then
+                                         only counts the filters of the rejecting stage.
+                                         Defaults to True.
 
     Returns:
         None
     """
+    import uuid
     from datetime import datetime
 
+    if resume and run_name is None:
+        raise ValueError("--resume requires the --run-name of the run to continue")
+
     today = datetime.now().strftime("%Y%m%d%H%M")[2:]
 
     pdb_str = open(input_pdb).read()
     binder_name = binder_name or Path(input_pdb).stem
-    design_path = f"/tmp/BindCraft/{binder_name}/"
+    run_path = f"{binder_name}/{run_name or today}"
+    local_dir = Path(out_dir) / (run_name or today)
     lengths_list = [int(i) for i in lengths.split(",")]
 
-    outputs = bindcraft.remote(
-        design_path=design_path,
+    kwargs = dict(
         binder_name=binder_name,
         pdb_str=pdb_str,
         chains=target_chains,
@@ -1148,10 +2268,71 @@ def main(
         lengths=lengths_list,
         number_of_final_designs=number_of_final_designs,
         max_trajectories=max_trajectories,
+        resume=resume,
+        mpnn_batch_size=mpnn_batch_size,
+        model_cache_size=model_cache_size,
+        length_step=length_step,
+        cpu_workers=cpu_workers,
+        staged_filters=staged_filters,
     )
 
-    for out_file, out_content in outputs:
-        output_path = Path(out_dir) / (run_name or today) / out_file
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "wb") as out:
-            out.write(out_content)
+    try:
+        if workers <= 1:
+            result = bindcraft.remote(design_path=f"{RUNS_DIR}/{run_path}/", **kwargs)
+            print(
+                f"Start to first trajectory latency: {result['start_to_first_trajectory']}s"
+            )
+            return
+
+        # fan trajectories out over several containers sharing the design budgets; the
+        # budget slots of each launch are fresh, a resumed worker claims its own again
+        run_id = f"{run_path}/{uuid.uuid4().hex[:8]}"
+        calls = [
+            bindcraft.spawn(
+                design_path=f"{RUNS_DIR}/{run_path}/worker{i}/",
+                **kwargs,
+                run_id=run_id,
+                worker_id=i,
+            )
+            for i in range(workers)
+        ]
+        for i, call in enumerate(calls):
+            result = call.get()
+            print(
+                f"Worker {i} start to first trajectory latency: "
+                f"{result['start_to_first_trajectory']}s"
+            )
+
+        # rank the accepted designs of all workers together
+        rank_fan_out.remote(run_path, workers)
+    finally:
+        # also pull whatever was committed if a run failed or timed out, without
+        # masking the error of the run
+        try:
+            pull_outputs(run_path, str(local_dir), include_trajectories)
+        except Exception as e:
+            print(f"Failed to pull the outputs of {run_path}: {e}")
+
+
+@app.local_entrypoint()
+def pull(
+    binder_name: str,
+    run_name: str,
+    out_dir: str = "./out/bindcraft",
+    include_trajectories: bool = False,
+):
+    """Local entrypoint to pull the outputs of a running or finished run from the volume.
+
+    Args:
+        binder_name (str): Name of the binder design project.
+        run_name (str): Name of the run, as passed to (or generated by) `main`.
+        out_dir (str, optional): Directory to save the output files. Defaults to "./out/bindcraft".
+        include_trajectories (bool, optional): Whether to also pull the heavy Trajectory and
+                                               Animation folders. Defaults to False.
+
+    Returns:
+        None
+    """
+    pull_outputs(
+        f"{binder_name}/{run_name}", str(Path(out_dir) / run_name), include_trajectories
+    )
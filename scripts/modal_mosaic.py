@@ -1,5 +1,18 @@
+import os
+import time
+
 import modal
 
+# Model weights live on a volume shared with the other apps instead of in the image;
+# Boltz2 caches its weights in ~/.boltz, which is linked into the volume.
+# Populate it once with `modal run scripts/modal_mosaic.py::populate_weights`
+WEIGHTS_DIR = "/weights"
+weights_volume = modal.Volume.from_name("model-weights", create_if_missing=True)
+BOLTZ_DIR = f"{WEIGHTS_DIR}/boltz"
+
+# Time this module was imported, i.e. the container started, for the latency metric
+CONTAINER_START = time.time()
+
 
 def download_boltz2():
     from mosaic.models.boltz2 import Boltz2
@@ -7,7 +20,7 @@ def download_boltz2():
     Boltz2()
 
 
-### Build modal image: install mosaic + deps and download boltz2 model.
+### Build modal image: install mosaic + deps, the boltz2 weights come from the weights volume.
 image = (
     modal.Image.debian_slim(python_version="3.12")
     .apt_install("git")
@@ -16,10 +29,8 @@ image = (
     .run_commands("uv pip install --system -r pyproject.toml")
     .run_commands("uv pip install --system jax[cuda]")
     .run_commands("uv pip install --system .")
-    .run_function(
-        download_boltz2
-    )  # I'm told it's better to put this on a volume, but this is easy.
     .run_commands("uv pip install --system equinox")
+    .run_commands(f"ln -s {BOLTZ_DIR} /root/.boltz")
     .env(
         {"XLA_PYTHON_CLIENT_MEM_FRACTION": "0.95"}
     )  # this is a very large binder + target
@@ -31,11 +42,25 @@ BINDER_LENGTH = 72
 TARGET_SEQUENCE = "SLLEFGKMILEETGKLAIPSYSSYGCYCGWGGKGTPKDATDRCCFVHDCCYGNLPDCNPKSDRYKYKRVNGAIVCEKGTSCENRICECDKAAAICFRQNLNTYSKKYMLYPDFLCKGELKC"
 
 
+@app.function(timeout=60 * 60, volumes={WEIGHTS_DIR: weights_volume})
+def populate_weights(force: bool = False):
+    """Downloads the Boltz2 weights into `weights_volume`, once."""
+    if os.path.isdir(BOLTZ_DIR) and os.listdir(BOLTZ_DIR) and not force:
+        print(f"Boltz2 weights already present in {BOLTZ_DIR}")
+        return
+
+    os.makedirs(BOLTZ_DIR, exist_ok=True)
+    download_boltz2()
+    weights_volume.commit()
+    print(f"Boltz2 weights written to {BOLTZ_DIR}")
+
+
 @app.function(
     gpu="B200",
     timeout=int(10 * 60 * 60),
     volumes={
-        "/structures": modal.Volume.from_name("nipah-binders", create_if_missing=True)
+        "/structures": modal.Volume.from_name("nipah-binders", create_if_missing=True),
+        WEIGHTS_DIR: weights_volume.read_only(),
     },
 )
 def design(max_runtime_seconds: int):
@@ -56,6 +81,13 @@ def design(max_runtime_seconds: int):
     from mosaic.structure_prediction import TargetChain
     from mosaic.optimizers import simplex_APGM
 
+    if not os.path.isdir(BOLTZ_DIR):
+        raise RuntimeError(f"No Boltz2 weights in {BOLTZ_DIR}, run populate_weights first")
+
+    # the first input of a container is timed from the container start
+    global CONTAINER_START
+    start_time, CONTAINER_START = CONTAINER_START or time.time(), None
+
     worker_id = str(uuid.uuid4())[:8]
     # load models
     folder = Boltz2()
@@ -168,10 +200,12 @@ def design(max_runtime_seconds: int):
 
         return (seq_str, loss_value.item())
 
-    start_time = time.time()
+    design_start_time = time.time()
     results = []
-    while time.time() - start_time < max_runtime_seconds:
+    while time.time() - design_start_time < max_runtime_seconds:
         seq, loss_value = design()
+        if not results:
+            print(f"Start to first design latency: {time.time() - start_time:.1f}s")
         with open(
             f"/structures/designs_{worker_id}.txt", "a"
         ) as f:  # in case the run dies
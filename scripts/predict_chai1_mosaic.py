@@ -15,14 +15,19 @@ Usage:
 
     # Use different algorithm
     python predict_chai1_mosaic.py --input designs.txt --algorithm boltz2
+
+    # Several algorithms in one pass, 8 designs at a time, with a consensus CSV
+    python predict_chai1_mosaic.py --input designs.txt --algorithm chai1,boltz2,protenix --jobs 8
 """
 from __future__ import annotations
 
 import argparse
 import csv
 import json
+import statistics
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
 
@@ -32,6 +37,8 @@ DEFAULT_TARGET = "MICYNQQSSQPPTTKTCSETSCYKKTWRDHRGTIIERGCGCPKVKPGIKLHCCRTDKCNN"
 # Path to foldism script
 FOLDISM_SCRIPT = Path(__file__).parent / "foldism" / "foldism.py"
 
+ALGORITHMS = ["chai1", "boltz2", "protenix", "protenix-mini", "alphafold2"]
+
 
 # =============================================================================
 # Data Structures
@@ -124,6 +131,15 @@ def check_cached_results(results_dir: Path, design_name: str, algorithm: str) ->
     return False
 
 
+def primary_score_key(algorithm: str) -> str:
+    """Name of the overall confidence score of an algorithm."""
+    if algorithm == "chai1":
+        return "aggregate_score"
+    if algorithm == "boltz2":
+        return "confidence_score"
+    return "ranking_score"
+
+
 def extract_scores_from_results(results_dir: Path, design_name: str, algorithm: str) -> dict:
     """Extract scores from foldism output."""
     scores = {}
@@ -175,8 +191,10 @@ def extract_scores_from_results(results_dir: Path, design_name: str, algorithm:
 # =============================================================================
 
 
-def run_foldism(fasta_path: Path, output_dir: Path, algorithm: str, use_msa: bool = True) -> bool:
-    """Run foldism.py on a FASTA file."""
+def run_foldism(
+    fasta_path: Path, output_dir: Path, algorithms: list[str], use_msa: bool = True
+) -> bool:
+    """Run foldism.py on a FASTA file, with all `algorithms` in one Modal run."""
     foldism_script = FOLDISM_SCRIPT.resolve()
     foldism_dir = foldism_script.parent
 
@@ -191,7 +209,7 @@ def run_foldism(fasta_path: Path, output_dir: Path, algorithm: str, use_msa: boo
     cmd = [
         "uv", "run", "modal", "run", "foldism.py",
         "--input-faa", str(fasta_abs),
-        "--algorithms", algorithm,
+        "--algorithms", ",".join(algorithms),
         "--out-dir", str(output_abs),
     ]
 
@@ -226,19 +244,29 @@ Examples:
     python predict_chai1_mosaic.py --input out/mosaic/20260201/designs.txt
     python predict_chai1_mosaic.py --input designs.txt --algorithm boltz2
     python predict_chai1_mosaic.py --input designs.txt --limit 5 --no-msa
+    python predict_chai1_mosaic.py --input designs.txt --algorithm chai1,boltz2 --jobs 8
         """,
     )
     parser.add_argument("--input", "-i", required=True, help="Mosaic designs.txt file")
     parser.add_argument("--target", default=DEFAULT_TARGET, help="Target protein sequence")
     parser.add_argument("--output-dir", "-o", help="Output directory (default: <input_dir>/predictions)")
     parser.add_argument("--algorithm", "-a", default="chai1",
-                        choices=["chai1", "boltz2", "protenix", "protenix-mini", "alphafold2"],
-                        help="Folding algorithm (default: chai1)")
+                        help="Folding algorithm, or several separated by commas, e.g. "
+                             f"chai1,boltz2,protenix (choices: {', '.join(ALGORITHMS)}; "
+                             "default: chai1)")
+    parser.add_argument("--jobs", "-j", type=int, default=4,
+                        help="Number of designs predicted concurrently (default: 4)")
     parser.add_argument("--limit", "-n", type=int, help="Limit number of designs")
     parser.add_argument("--no-msa", action="store_true", help="Disable MSA (faster but less accurate)")
 
     args = parser.parse_args()
 
+    algorithms = [a.strip() for a in args.algorithm.split(",") if a.strip()]
+    unknown = [a for a in algorithms if a not in ALGORITHMS]
+    if not algorithms or unknown:
+        parser.error(f"invalid algorithm(s): {', '.join(unknown) or args.algorithm!r} "
+                     f"(choose from {', '.join(ALGORITHMS)})")
+
     # Validate input
     input_path = Path(args.input)
     if not input_path.exists():
@@ -270,85 +298,117 @@ Examples:
         fasta_files.append((d, fasta_path))
         print(f"  {fasta_path.name}")
 
-    # Run predictions
-    print(f"\nRunning {args.algorithm} predictions via foldism")
+    # Run predictions; each design runs its uncached algorithms in one foldism
+    # call, and up to --jobs designs run at once
+    print(f"\nRunning {', '.join(algorithms)} predictions via foldism ({args.jobs} at a time)")
     print(f"{'='*60}")
 
-    all_results = []
+    def predict_design(design: Design, fasta_path: Path) -> tuple[dict[str, bool], list[str]]:
+        cached = [a for a in algorithms if check_cached_results(results_dir, design.name, a)]
+        missing = [a for a in algorithms if a not in cached]
+        success = {a: True for a in cached}
+        if missing:
+            ran = run_foldism(fasta_path, results_dir, missing, use_msa=not args.no_msa)
+            success.update({a: ran for a in missing})
+        return success, cached
+
+    outcomes = {}
     cached_count = 0
-    for design, fasta_path in fasta_files:
-        print(f"\n[{design.name}]")
-
-        # Check if results already cached locally
-        if check_cached_results(results_dir, design.name, args.algorithm):
-            print(f"  Using cached results")
-            success = True
-            cached_count += 1
-        else:
-            success = run_foldism(fasta_path, results_dir, args.algorithm, use_msa=not args.no_msa)
-
-        # Extract scores
-        scores = {}
-        if success:
-            scores = extract_scores_from_results(results_dir, design.name, args.algorithm)
-
-        result = {
-            "design_name": design.name,
-            "binder_sequence": design.sequence,
-            "loss_value": design.loss_value,
-            "binder_length": len(design.sequence),
-            "algorithm": args.algorithm,
-            "success": success,
-            **scores,
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        futures = {
+            executor.submit(predict_design, design, fasta_path): design
+            for design, fasta_path in fasta_files
         }
-        all_results.append(result)
-
-        # Print score summary
-        if scores:
-            score_key = "aggregate_score" if args.algorithm == "chai1" else "confidence_score" if args.algorithm == "boltz2" else "ranking_score"
-            score_val = scores.get(score_key)
-            if score_val is not None:
-                print(f"  {score_key}: {score_val:.4f}")
-
-    # Write results CSV
-    csv_path = base_dir / f"results_{args.algorithm}.csv"
-
-    # Determine fieldnames based on algorithm
+        for future in as_completed(futures):
+            design = futures[future]
+            outcomes[design.name], cached = future.result()
+            cached_count += len(cached)
+            failed = [a for a, ok in outcomes[design.name].items() if not ok]
+            print(f"[{design.name}] done"
+                  + (f", cached: {', '.join(cached)}" if cached else "")
+                  + (f", failed: {', '.join(failed)}" if failed else ""))
+
+    # Extract scores, in the order of the designs
+    results_by_algorithm = {algorithm: [] for algorithm in algorithms}
+    for design, _ in fasta_files:
+        for algorithm in algorithms:
+            success = outcomes[design.name][algorithm]
+            scores = {}
+            if success:
+                scores = extract_scores_from_results(results_dir, design.name, algorithm)
+            results_by_algorithm[algorithm].append({
+                "design_name": design.name,
+                "binder_sequence": design.sequence,
+                "loss_value": design.loss_value,
+                "binder_length": len(design.sequence),
+                "algorithm": algorithm,
+                "success": success,
+                **scores,
+            })
+
+    # Write results CSV and full results JSON of each algorithm
     base_fields = ["design_name", "loss_value", "binder_length", "success"]
-    if args.algorithm == "chai1":
-        score_fields = ["aggregate_score", "ptm", "iptm"]
-    elif args.algorithm == "boltz2":
-        score_fields = ["confidence_score", "ptm", "iptm"]
-    else:
-        score_fields = ["ranking_score", "ptm", "iptm"]
-
-    fieldnames = base_fields + score_fields
-
-    with open(csv_path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
-        writer.writeheader()
-        writer.writerows(all_results)
-
-    # Write full results JSON
-    json_path = base_dir / f"results_{args.algorithm}_full.json"
-    with open(json_path, "w") as f:
-        json.dump(all_results, f, indent=2)
+    output_paths = []
+    for algorithm, all_results in results_by_algorithm.items():
+        csv_path = base_dir / f"results_{algorithm}.csv"
+        fieldnames = base_fields + [primary_score_key(algorithm), "ptm", "iptm"]
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(all_results)
+
+        json_path = base_dir / f"results_{algorithm}_full.json"
+        with open(json_path, "w") as f:
+            json.dump(all_results, f, indent=2)
+        output_paths += [csv_path, json_path]
+
+    # Write the wide consensus CSV: one row per design, the scores of each
+    # algorithm side by side and their agreement on ipTM
+    consensus = []
+    if len(algorithms) > 1:
+        for i, (design, _) in enumerate(fasta_files):
+            row = {
+                "design_name": design.name,
+                "loss_value": design.loss_value,
+                "binder_length": len(design.sequence),
+            }
+            for algorithm in algorithms:
+                result = results_by_algorithm[algorithm][i]
+                for key in [primary_score_key(algorithm), "ptm", "iptm"]:
+                    row[f"{algorithm}_{key}"] = result.get(key)
+            iptms = [row[f"{a}_iptm"] for a in algorithms if row[f"{a}_iptm"] is not None]
+            row["n_algorithms"] = len(iptms)
+            row["iptm_mean"] = statistics.mean(iptms) if iptms else None
+            row["iptm_min"] = min(iptms) if iptms else None
+            row["iptm_spread"] = max(iptms) - min(iptms) if iptms else None
+            consensus.append(row)
+
+        consensus_path = base_dir / "results_consensus.csv"
+        with open(consensus_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(consensus[0]) if consensus else ["design_name"])
+            writer.writeheader()
+            writer.writerows(consensus)
+        output_paths.append(consensus_path)
 
     # Print summary
     print(f"\n{'='*60}")
     print("Summary")
     print(f"{'='*60}")
-    print(f"Algorithm: {args.algorithm}")
+    print(f"Algorithms: {', '.join(algorithms)}")
     print(f"Total designs: {len(designs)}")
-    print(f"Successful: {sum(1 for r in all_results if r.get('success'))}")
+    for algorithm, all_results in results_by_algorithm.items():
+        print(f"Successful ({algorithm}): {sum(1 for r in all_results if r.get('success'))}")
     if cached_count > 0:
         print(f"From cache: {cached_count}")
-    print(f"Results CSV: {csv_path}")
-    print(f"Full results: {json_path}")
+    for path in output_paths:
+        print(f"Results: {path}")
 
     # Print top designs
-    score_key = "aggregate_score" if args.algorithm == "chai1" else "confidence_score" if args.algorithm == "boltz2" else "ranking_score"
-    successful = [r for r in all_results if r.get(score_key) is not None]
+    if consensus:
+        score_key, ranked = "iptm_mean", consensus
+    else:
+        score_key, ranked = primary_score_key(algorithms[0]), results_by_algorithm[algorithms[0]]
+    successful = [r for r in ranked if r.get(score_key) is not None]
     if successful:
         successful.sort(key=lambda x: x[score_key], reverse=True)
         print(f"\nTop 5 designs by {score_key} (higher is better):")